@@ -0,0 +1,100 @@
+# browser_pool.py
+#
+# Keeps one Playwright instance and Chromium browser alive across jobs in the long-lived
+# runtime. Each county gets its own browser context (cookies, session) that is closed when
+# the county finishes; the browser is relaunched if it crashes or disconnects. recycle()
+# (called by the watchdog when the browser grows past its memory cap) sends new counties to
+# a fresh browser and closes the old one once its last context is closed.
+
+import asyncio
+import time
+from contextlib import asynccontextmanager
+
+from playwright.async_api import async_playwright
+
+from logger import get_logger
+
+logger = get_logger()
+
+USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+
+
+class BrowserPool:
+    def __init__(self, launch_options=None):
+        self.launch_options = launch_options or {}
+        self._playwright = None
+        self._browser = None
+        self._lock = asyncio.Lock()
+        self.launches = 0
+        # Open contexts per browser, and browsers waiting for their contexts to close
+        self._open_contexts = {}
+        self._retired = set()
+        self.launched_at = None
+        self.recycles = 0
+
+    async def _get_browser(self):
+        async with self._lock:
+            if self._browser is not None and self._browser.is_connected():
+                return self._browser
+            if self._playwright is None:
+                self._playwright = await async_playwright().start()
+            if self._browser is not None:
+                logger.warning("Browser disconnected, relaunching")
+            self._browser = await self._playwright.chromium.launch(headless=True, **self.launch_options)
+            self.launched_at = time.time()
+            self.launches += 1
+            return self._browser
+
+    async def recycle(self):
+        # The running counties keep their contexts; the next county gets a new browser
+        async with self._lock:
+            browser = self._browser
+            if browser is None:
+                return False
+            self._browser = None
+            self.recycles += 1
+            logger.warning("Recycling browser")
+            if self._open_contexts.get(browser):
+                self._retired.add(browser)
+                return True
+        await self._close_browser(browser)
+        return True
+
+    async def _close_browser(self, browser):
+        self._open_contexts.pop(browser, None)
+        try:
+            await browser.close()
+        except Exception as e:
+            logger.warning(f"Failed to close browser: {str(e)}")
+
+    @asynccontextmanager
+    async def page(self):
+        browser = await self._get_browser()
+        self._open_contexts[browser] = self._open_contexts.get(browser, 0) + 1
+        try:
+            context = await browser.new_context(user_agent=USER_AGENT)
+            try:
+                yield await context.new_page()
+            finally:
+                try:
+                    await context.close()
+                except Exception as e:
+                    logger.warning(f"Failed to close browser context: {str(e)}")
+        finally:
+            if browser in self._open_contexts:
+                self._open_contexts[browser] -= 1
+            if browser in self._retired and not self._open_contexts.get(browser):
+                self._retired.discard(browser)
+                await self._close_browser(browser)
+
+    async def close(self):
+        async with self._lock:
+            for browser in list(self._retired):
+                await self._close_browser(browser)
+            self._retired.clear()
+            if self._browser is not None:
+                await self._close_browser(self._browser)
+                self._browser = None
+            if self._playwright is not None:
+                await self._playwright.stop()
+                self._playwright = None
@@ -0,0 +1,196 @@
+# clean_batch.py
+#
+# Columnar version of clean_and_filter_auction_data for bulk backfills. Merged pages are
+# turned into columns once, then the 3rd-party filter, currency parsing and Excess Amount
+# computation run over whole columns. clean_auctions_batch returns rows identical to calling
+# clean_auction_row on every 3rd-party auction; clean_auctions_columns keeps them columnar
+# for writers that don't need one dict per row.
+
+from itertools import chain
+
+import numpy as np
+
+from parsing import COLUMN_NAMES, FLOAT_FIELDS, clean_auction_row, parse_float
+
+THIRD_PARTY_BIDDER = '3rd Party Bidder'
+
+# Where each output column comes from in a merged auction (_extract_row reads them in this order)
+COLUMN_SOURCES = {
+    'Auction Type': ('details', 'auctionType'),
+    'Sold Amount': ('amount', 'value'),
+    'Opening Bid': ('details', 'openingBid'),
+    'Case #': ('details', 'caseNumber'),
+    'Parcel ID': ('details', 'parcelId'),
+    'Property Address': ('details', 'propertyAddress'),
+    'Property City': ('details', 'propertyCity'),
+    'Property State': ('details', 'propertyState'),
+    'Property Zip': ('details', 'propertyZip'),
+    'Assessed Value': ('details', 'assessedValue'),
+    'Auction Status': ('status', 'message'),
+    'Certificate #': ('details', 'certificateNumber'),
+    'Sold Date': ('status', 'timestamp'),
+    'Sold To': ('soldTo', 'value'),
+    'Final Judgment Amount': ('details', 'finalJudgmentAmount'),
+    'Plaintiff Max Bid': ('details', 'plaintiffMaxBid'),
+    'Lenders Starting Bid Amount': ('details', 'lendersStartingBidAmount'),
+}
+
+
+def _is_regular(columns):
+    # Columns the vectorized path can handle: string Case #, amounts that are strings or falsy
+    if not set(map(type, columns['Case #'])) <= {str}:
+        return False
+    for field in FLOAT_FIELDS:
+        if not set(map(type, columns[field])) <= {str, type(None)}:
+            return False
+    return True
+
+
+def _extract_row(auction):
+    details = auction['details']
+    status = auction['status']
+    return (
+        details.get('auctionType', ''), auction['amount']['value'], details.get('openingBid', ''),
+        details.get('caseNumber', ''), details.get('parcelId', ''), details.get('propertyAddress', ''),
+        details.get('propertyCity', ''), details.get('propertyState', ''), details.get('propertyZip', ''),
+        details.get('assessedValue', ''), status.get('message', ''), details.get('certificateNumber', ''),
+        status.get('timestamp', ''), auction['soldTo'].get('value', ''),
+        details.get('finalJudgmentAmount', ''), details.get('plaintiffMaxBid', ''),
+        details.get('lendersStartingBidAmount', ''),
+    )
+
+
+def _extract_columns(auctions):
+    # Returns the columns for rows with the expected shape, plus the indices of rows that
+    # need the per-row path (missing sections, non-string amounts, ...)
+    try:
+        # One pass over the rows, then a transpose into columns
+        rows = [_extract_row(auction) for auction in auctions]
+        columns = {column: [row[position] for row in rows] for position, column in enumerate(COLUMN_SOURCES)}
+        if _is_regular(columns):
+            return columns, list(range(len(auctions))), []
+    except (KeyError, TypeError, AttributeError):
+        pass
+
+    # Slow path: classify row by row
+    columns = {column: [] for column in COLUMN_SOURCES}
+    regular = []
+    irregular = []
+    for index, auction in enumerate(auctions):
+        try:
+            # 'amount' is indexed directly in clean_auction_row, the other sections use .get
+            values = [auction[section][key] if section == 'amount' else auction[section].get(key, '')
+                      for section, key in COLUMN_SOURCES.values()]
+        except (KeyError, TypeError, AttributeError):
+            irregular.append(index)
+            continue
+        row = dict(zip(COLUMN_SOURCES, values))
+        if not isinstance(row['Case #'], str) or any(
+                row[field] and not isinstance(row[field], str) for field in FLOAT_FIELDS):
+            irregular.append(index)
+            continue
+        regular.append(index)
+        for column, value in row.items():
+            columns[column].append(value)
+    return columns, regular, irregular
+
+
+def _is_plain_decimal(text):
+    digits = text.replace('.', '', 1).lstrip('+-')
+    return digits.isascii() and digits.isdecimal()
+
+
+def parse_float_column(values):
+    # Vectorized parse_float: returns (float64 values, bool mask of non-None results)
+    has_value = np.array(values, dtype=object).astype(bool)
+    present = np.flatnonzero(has_value)
+    numbers = np.zeros(len(values), dtype=np.float64)
+    if len(present) == 0:
+        return numbers, has_value
+
+    stripped = [values[index].replace('$', '').replace(',', '') for index in present.tolist()]
+    try:
+        numbers[present] = np.fromiter(map(float, stripped), dtype=np.float64, count=len(stripped))
+        return numbers, has_value
+    except ValueError:
+        pass
+
+    # Some values are not numbers (e.g. "Hidden"): convert the plain decimals in bulk and
+    # send the rest through parse_float, which keeps its exact behavior and warning
+    valid = np.fromiter(map(_is_plain_decimal, stripped), dtype=bool, count=len(stripped))
+    numbers[present[valid]] = np.fromiter(
+        map(float, (text for text, ok in zip(stripped, valid.tolist()) if ok)),
+        dtype=np.float64, count=int(valid.sum())
+    )
+    for index in present[~valid].tolist():
+        value = parse_float(values[index])
+        if value is None:
+            has_value[index] = False
+        else:
+            numbers[index] = value
+    return numbers, has_value
+
+
+def _to_optional_list(numbers, has_value):
+    return [value if ok else None for value, ok in zip(numbers.tolist(), has_value.tolist())]
+
+
+def clean_auctions_columns(auctions, auction_date, county_name):
+    # Returns {column: list} for the rows the vectorized path handles, their indices among the
+    # 3rd-party auctions, and the 3rd-party auctions that need clean_auction_row
+    sold_to = np.array([auction['soldTo']['value'] for auction in auctions], dtype=object)
+    selected = np.flatnonzero(sold_to == THIRD_PARTY_BIDDER)
+    third_party = [auctions[index] for index in selected.tolist()]
+
+    columns, regular, irregular = _extract_columns(third_party)
+    count = len(regular)
+    output = {
+        'Auction Date': [auction_date] * count,
+        'County': [county_name] * count,
+    }
+
+    parsed = {field: parse_float_column(columns[field]) for field in FLOAT_FIELDS}
+    for column, values in columns.items():
+        if column in parsed:
+            output[column] = _to_optional_list(*parsed[column])
+        elif column == 'Case #':
+            output[column] = [value.strip() for value in values]
+        else:
+            output[column] = values
+
+    # Excess Amount = Sold Amount - (Final Judgment Amount for FORECLOSURE, Opening Bid otherwise)
+    sold, sold_ok = parsed['Sold Amount']
+    foreclosure = np.array(columns['Auction Type'], dtype=object) == 'FORECLOSURE'
+    judgment, judgment_ok = parsed['Final Judgment Amount']
+    opening, opening_ok = parsed['Opening Bid']
+    base = np.where(foreclosure, judgment, opening)
+    base_ok = np.where(foreclosure, judgment_ok, opening_ok)
+    output['Excess Amount'] = _to_optional_list(sold - base, sold_ok & base_ok)
+
+    return {column: output[column] for column in COLUMN_NAMES}, regular, [third_party[index] for index in irregular], irregular
+
+
+def clean_auctions_batch(auctions, auction_date, county_name):
+    # Same rows, in the same order, as clean_auction_row over every 3rd-party auction
+    if not auctions:
+        return []
+
+    columns, regular, irregular_auctions, irregular = clean_auctions_columns(auctions, auction_date, county_name)
+    rows = [dict(zip(COLUMN_NAMES, values)) for values in zip(*columns.values())]
+    if not irregular:
+        return rows
+
+    # Merge the per-row fallbacks back in their original order
+    by_index = dict(zip(regular, rows))
+    for index, auction in zip(irregular, irregular_auctions):
+        try:
+            by_index[index] = clean_auction_row(auction, auction_date, county_name)
+        except Exception as e:
+            print(f"Error processing auction: {e}")
+    return [by_index[index] for index in sorted(by_index)]
+
+
+def clean_merged_pages_batch(merged_pages, auction_date, county_name):
+    # Accepts the merged pages produced by merge_auction_and_page_data
+    auctions = list(chain.from_iterable(page['auctions'] for page in merged_pages))
+    return clean_auctions_batch(auctions, auction_date, county_name)
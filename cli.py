@@ -0,0 +1,205 @@
+# cli.py
+#
+# Single entry point: python cli.py <scrape|backfill|monitor|discover|probe|compact|serve|counties|bench>.
+# Only the standard library is imported at module level; every subcommand imports what it
+# needs when it runs, so "counties" or "--help" start without loading Playwright, Flask,
+# bs4 or numpy. `bench --imports` and test_cli_imports.py guard that.
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime
+
+COUNTIES_FILE = 'counties_websites_list.json'
+# Modules that must not be loaded just by importing the CLI and parsing arguments
+HEAVY_MODULES = ('playwright', 'aiohttp', 'bs4', 'aiofiles', 'requests', 'pytz', 'dotenv', 'flask', 'numpy', 'psutil')
+# Import cost of cli.py allowed on top of a bare interpreter start
+IMPORT_BUDGET_MS = float(os.getenv('CLI_IMPORT_BUDGET_MS', 100))
+
+
+def cmd_scrape(args):
+    import asyncio
+    from new_scraper import run_all_counties
+    asyncio.run(run_all_counties(args.counties_file, concurrency=args.concurrency, websites=args.websites or None,
+                                 profile_counties=args.profile, profile=args.profile_modes))
+
+
+def cmd_backfill(args):
+    import asyncio
+    from new_scraper import run_all_counties
+    auction_date = datetime.strptime(args.date, '%Y-%m-%d').date()
+    asyncio.run(run_all_counties(args.counties_file, concurrency=args.concurrency, websites=args.websites or None,
+                                 run_label=f"backfill-{auction_date:%Y%m%d}", auction_date=auction_date))
+
+
+def cmd_monitor(args):
+    import asyncio
+    from monitor import monitor_all_counties
+    asyncio.run(monitor_all_counties(args.counties_file, args.concurrency, websites=args.websites or None))
+
+
+def cmd_discover(args):
+    import asyncio
+    from scrape_counties_websites_list import make_requests_async, update_counties_list
+    responses = asyncio.run(make_requests_async(concurrency=args.concurrency, use_cache=not args.no_cache))
+    failed = [response for response in responses if 'error' in response]
+    print(f"{len(responses) - len(failed)} vendors answered, {len(failed)} failed")
+    update_counties_list(responses, path=args.counties_file, dry_run=args.dry_run)
+
+
+def cmd_probe(args):
+    import asyncio
+    from health_probe import format_table, load_websites, probe_all
+    results = asyncio.run(probe_all(args.websites or load_websites(args.counties_file), args.concurrency,
+                                    record=not args.no_record))
+    print(format_table(results))
+
+
+def cmd_compact(args):
+    from compaction import compact
+    # Unset options keep compaction.py's COMPACT_AFTER_DAYS / RAW_RETENTION_DAYS settings
+    options = {key: value for key, value in (('after_days', args.after_days), ('retention_days', args.retention_days))
+               if value is not None}
+    stats = compact(dry_run=args.dry_run, **options)
+    print(f"{stats['archived']} files archived, {stats['expired']} raw dumps expired, {stats['archives']} archives written")
+
+
+def cmd_serve(args):
+    import asyncio
+    import main
+    asyncio.run(main.main())
+
+
+def cmd_counties(args):
+    import county_registry
+    county_registry.load_registry(args.counties_file)
+    for entry in county_registry.list_counties():
+        print(f"{entry['website']:40} {entry['kind']:14} {entry['state']:3} {entry['timezone']:20} "
+              f"avg={entry['avg_duration']} last_success={entry['last_success']}")
+
+
+def _time_python(code, runs):
+    timings = []
+    output = ''
+    for _ in range(runs):
+        started = time.perf_counter()
+        result = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__)))
+        timings.append((time.perf_counter() - started) * 1000)
+        if result.returncode != 0:
+            raise RuntimeError(result.stderr)
+        output = result.stdout.strip()
+    return statistics.median(timings), output
+
+
+def measure_imports(runs=7):
+    # Fresh interpreters: a bare start vs. importing the CLI and building its parser.
+    # Returns (bare start ms, cli import ms on top of it, heavy modules that got loaded)
+    baseline, _ = _time_python('pass', runs)
+    code = ("import sys, cli; cli.build_parser().parse_args(['counties']); "
+            "print(','.join(name for name in cli.HEAVY_MODULES if name in sys.modules))")
+    elapsed, loaded = _time_python(code, runs)
+    return baseline, elapsed - baseline, [name for name in loaded.split(',') if name]
+
+
+def bench_imports(runs=7, budget_ms=IMPORT_BUDGET_MS):
+    baseline, cost, loaded = measure_imports(runs)
+    print(f"interpreter start {baseline:.1f} ms, cli import {cost:.1f} ms (budget {budget_ms:.0f} ms)")
+    ok = True
+    if loaded:
+        print(f"FAIL: heavy modules imported at startup: {', '.join(loaded)}")
+        ok = False
+    if cost > budget_ms:
+        print("FAIL: cli import is over budget")
+        ok = False
+    for module in ('new_scraper', 'log_viewer'):
+        module_time, _ = _time_python(f'import {module}', 1)
+        print(f"for reference: import {module} {module_time - baseline:.0f} ms")
+    return ok
+
+
+def cmd_bench(args):
+    if args.imports:
+        sys.exit(0 if bench_imports(args.runs, args.budget_ms) else 1)
+    if args.clean:
+        import json
+        from clean_batch import clean_merged_pages_batch
+        from parsing import clean_auction_page
+        with open(args.clean) as f:
+            merged = json.load(f)
+        pages = merged if isinstance(merged, list) else [merged]
+        started = time.perf_counter()
+        rows = [row for page in pages for row in clean_auction_page(page['auctions'], 'bench', 'Bench')]
+        per_row = time.perf_counter() - started
+        started = time.perf_counter()
+        batch_rows = clean_merged_pages_batch(pages, 'bench', 'Bench')
+        batch = time.perf_counter() - started
+        print(f"{len(rows)} rows: per-row {per_row * 1000:.1f} ms, columnar {batch * 1000:.1f} ms, "
+              f"identical={rows == batch_rows}")
+        return
+    print("Nothing to benchmark: pass --imports or --clean FILE")
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog='cli.py', description="RealForeclose auction scraper")
+    parser.add_argument('--counties-file', default=COUNTIES_FILE)
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    scrape = subparsers.add_parser('scrape', help="Scrape today's auction results")
+    scrape.add_argument('websites', nargs='*', help="Only these counties (default: all)")
+    scrape.add_argument('--concurrency', type=int)
+    scrape.add_argument('--profile', nargs='+', metavar='WEBSITE', default=[])
+    scrape.add_argument('--profile-modes', default='cpu,sample', help="Any of cpu,sample,memory or all")
+    scrape.set_defaults(func=cmd_scrape)
+
+    backfill = subparsers.add_parser('backfill', help="Scrape the results of a past auction date")
+    backfill.add_argument('date', help="YYYY-MM-DD")
+    backfill.add_argument('websites', nargs='*')
+    backfill.add_argument('--concurrency', type=int)
+    backfill.set_defaults(func=cmd_backfill)
+
+    monitor = subparsers.add_parser('monitor', help="Watch today's auctions for 3rd party sales")
+    monitor.add_argument('websites', nargs='*')
+    monitor.add_argument('--concurrency', type=int, help="Loads/polls in flight at once (default: MONITOR_CONCURRENCY)")
+    monitor.set_defaults(func=cmd_monitor)
+
+    discover = subparsers.add_parser('discover', help="Refresh the counties list from the vendor endpoint")
+    discover.add_argument('--concurrency', type=int, default=10)
+    discover.add_argument('--no-cache', action='store_true')
+    discover.add_argument('--dry-run', action='store_true')
+    discover.set_defaults(func=cmd_discover)
+
+    probe = subparsers.add_parser('probe', help="Check every county site with a plain HTTP request")
+    probe.add_argument('websites', nargs='*')
+    probe.add_argument('--concurrency', type=int, default=20)
+    probe.add_argument('--no-record', action='store_true', help="Don't write the results to run_history.db")
+    probe.set_defaults(func=cmd_probe)
+
+    compact = subparsers.add_parser('compact', help="Archive old per-county result files by month")
+    compact.add_argument('--after-days', type=int, help="Default: COMPACT_AFTER_DAYS (7)")
+    compact.add_argument('--retention-days', type=int,
+                         help="Days to keep raw _final.json dumps, 0 = forever (default: RAW_RETENTION_DAYS, 90)")
+    compact.add_argument('--dry-run', action='store_true')
+    compact.set_defaults(func=cmd_compact)
+
+    serve = subparsers.add_parser('serve', help="Run the scheduler and log viewer")
+    serve.set_defaults(func=cmd_serve)
+
+    counties = subparsers.add_parser('counties', help="List the counties with their registry data")
+    counties.set_defaults(func=cmd_counties)
+
+    bench = subparsers.add_parser('bench', help="Benchmarks")
+    bench.add_argument('--imports', action='store_true', help="Check CLI startup time and lazy imports")
+    bench.add_argument('--runs', type=int, default=7)
+    bench.add_argument('--budget-ms', type=float, default=IMPORT_BUDGET_MS)
+    bench.add_argument('--clean', metavar='MERGED_JSON', help="Compare the per-row and columnar cleaners")
+    bench.set_defaults(func=cmd_bench)
+    return parser
+
+
+if __name__ == "__main__":
+    args = build_parser().parse_args()
+    args.func(args)
@@ -0,0 +1,215 @@
+# compaction.py
+#
+# Keeps results/ small: the dated per-county files (<prefix>_<MM-DD-YYYY>.csv, _final.json
+# and _events.ndjson) older than COMPACT_AFTER_DAYS are moved into one compressed archive per
+# month, results/archive/<YYYY-MM>.zip, and listed in results/archive/manifest.json so a
+# county/day can be found without opening the archives. Raw _final.json dumps older than
+# RAW_RETENTION_DAYS are deleted, loose or archived. Archives and the manifest are written
+# as .part files and renamed into place before any original file is removed. Incremental
+# scrape state files (results/state/) are deleted once their date is archived.
+
+import argparse
+import json
+import os
+import re
+import shutil
+import zipfile
+from datetime import date, datetime, timedelta
+
+from incremental import prune_states
+from logger import get_logger
+
+logger = get_logger()
+
+RESULTS_DIR = 'results'
+ARCHIVE_DIR = os.getenv('ARCHIVE_DIR', os.path.join(RESULTS_DIR, 'archive'))
+MANIFEST_FILE = 'manifest.json'
+# Days after the auction date before a day's files are archived
+COMPACT_AFTER_DAYS = int(os.getenv('COMPACT_AFTER_DAYS', 7))
+# Days to keep raw _final.json dumps (0 = forever); CSVs and events are kept
+RAW_RETENTION_DAYS = int(os.getenv('RAW_RETENTION_DAYS', 90))
+# Cron expression (US/Eastern) for the compaction job in main.py
+COMPACT_CRON = os.getenv('COMPACT_CRON', '30 3 * * *')
+
+DAILY_FILE = re.compile(r'^(?P<prefix>.+)_(?P<date>\d{2}-\d{2}-\d{4})(?P<kind>\.csv|_final\.json|_events\.ndjson)$')
+KINDS = {'.csv': 'csv', '_final.json': 'final', '_events.ndjson': 'events'}
+
+
+def parse_daily_file(filename):
+    # -> (county prefix, auction date, kind) or None for files that aren't per county and day
+    match = DAILY_FILE.match(filename)
+    if match is None:
+        return None
+    try:
+        auction_date = datetime.strptime(match['date'], '%m-%d-%Y').date()
+    except ValueError:
+        return None
+    return match['prefix'], auction_date, KINDS[match['kind']]
+
+
+def load_manifest(archive_dir=ARCHIVE_DIR):
+    path = os.path.join(archive_dir, MANIFEST_FILE)
+    if not os.path.exists(path):
+        return {}
+    with open(path, 'r') as f:
+        return json.load(f)
+
+
+def save_manifest(manifest, archive_dir=ARCHIVE_DIR):
+    path = os.path.join(archive_dir, MANIFEST_FILE)
+    with open(path + '.part', 'w') as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    os.replace(path + '.part', path)
+
+
+def _manifest_entry(prefix, auction_date, kind, info):
+    return {'county': prefix, 'date': auction_date.isoformat(), 'kind': kind,
+            'size': info.file_size, 'compressed_size': info.compress_size}
+
+
+def write_archive(archive_path, add_paths=(), drop_names=()):
+    # Adds files to (and drops members from) a monthly archive via a .part copy. Appending
+    # keeps the existing members' compressed bytes; a drop or a replaced member means a rewrite.
+    part_path = archive_path + '.part'
+    add_names = {os.path.basename(path) for path in add_paths}
+    existing = set()
+    if os.path.exists(archive_path):
+        with zipfile.ZipFile(archive_path) as archive:
+            existing = set(archive.namelist())
+    removed = (set(drop_names) | add_names) & existing
+
+    if removed:
+        with zipfile.ZipFile(archive_path) as source, \
+                zipfile.ZipFile(part_path, 'w', zipfile.ZIP_DEFLATED, compresslevel=9) as target:
+            for info in source.infolist():
+                if info.filename not in removed:
+                    target.writestr(info, source.read(info), zipfile.ZIP_DEFLATED, compresslevel=9)
+    elif existing:
+        shutil.copyfile(archive_path, part_path)
+    mode = 'a' if removed or existing else 'w'
+    with zipfile.ZipFile(part_path, mode, zipfile.ZIP_DEFLATED, compresslevel=9) as archive:
+        for path in add_paths:
+            archive.write(path, os.path.basename(path))
+        infos = {info.filename: info for info in archive.infolist()}
+
+    if infos:
+        os.replace(part_path, archive_path)
+    else:
+        os.remove(part_path)
+        if os.path.exists(archive_path):
+            os.remove(archive_path)
+    return infos
+
+
+def compact(results_dir=RESULTS_DIR, archive_dir=ARCHIVE_DIR, after_days=COMPACT_AFTER_DAYS,
+            retention_days=RAW_RETENTION_DAYS, today=None, dry_run=False):
+    today = today or date.today()
+    compact_before = today - timedelta(days=after_days)
+    expire_before = today - timedelta(days=retention_days) if retention_days else None
+    manifest = load_manifest(archive_dir)
+    stats = {'archived': 0, 'expired': 0, 'bytes_before': 0, 'archives': 0}
+    if not os.path.isdir(results_dir):
+        return stats
+    if not dry_run:
+        os.makedirs(archive_dir, exist_ok=True)
+
+    # Loose files: expired raw dumps are deleted, the rest grouped by month
+    months = {}
+    expired_paths = []
+    for filename in sorted(os.listdir(results_dir)):
+        parsed = parse_daily_file(filename)
+        path = os.path.join(results_dir, filename)
+        if parsed is None or not os.path.isfile(path):
+            continue
+        prefix, auction_date, kind = parsed
+        if kind == 'final' and expire_before is not None and auction_date < expire_before:
+            expired_paths.append(path)
+        elif auction_date < compact_before:
+            months.setdefault(auction_date.strftime('%Y-%m'), []).append(path)
+
+    # Archived raw dumps past retention, per month
+    expired_members = {}
+    if expire_before is not None:
+        for month, members in manifest.items():
+            for name, entry in members.items():
+                if entry['kind'] == 'final' and date.fromisoformat(entry['date']) < expire_before:
+                    expired_members.setdefault(month, []).append(name)
+
+    for month in sorted(set(months) | set(expired_members)):
+        paths = months.get(month, [])
+        drops = expired_members.get(month, [])
+        stats['archived'] += len(paths)
+        stats['expired'] += len(drops)
+        stats['bytes_before'] += sum(os.path.getsize(path) for path in paths)
+        if dry_run:
+            print(f"{month}: would archive {len(paths)} files, expire {len(drops)} archived raw dumps")
+            continue
+        archive_path = os.path.join(archive_dir, f"{month}.zip")
+        infos = write_archive(archive_path, paths, drops)
+        members = {}
+        for name, info in infos.items():
+            parsed = parse_daily_file(name)
+            if parsed is not None:
+                members[name] = _manifest_entry(*parsed, info)
+        if members:
+            manifest[month] = members
+        else:
+            manifest.pop(month, None)
+        # The originals go only after the archive and the manifest listing them are in place
+        save_manifest(manifest, archive_dir)
+        for path in paths:
+            os.remove(path)
+        stats['archives'] += 1
+        logger.info(f"Compacted {month}: {len(paths)} files archived, {len(drops)} raw dumps expired")
+
+    stats['expired'] += len(expired_paths)
+    for path in expired_paths:
+        if dry_run:
+            print(f"would delete {path}")
+        else:
+            os.remove(path)
+    if not dry_run:
+        stats['states_pruned'] = prune_states(compact_before)
+    return stats
+
+
+def find_files(county_prefix=None, auction_date=None, kind=None, results_dir=RESULTS_DIR, archive_dir=ARCHIVE_DIR):
+    # Where each matching file lives: {'name', 'archive' (None = loose in results/), ...}
+    found = []
+    for month, members in sorted(load_manifest(archive_dir).items()):
+        for name, entry in sorted(members.items()):
+            if ((county_prefix is None or entry['county'] == county_prefix)
+                    and (auction_date is None or entry['date'] == auction_date.isoformat())
+                    and (kind is None or entry['kind'] == kind)):
+                found.append({'name': name, 'archive': os.path.join(archive_dir, f"{month}.zip"), **entry})
+    for filename in sorted(os.listdir(results_dir)) if os.path.isdir(results_dir) else []:
+        parsed = parse_daily_file(filename)
+        if parsed is None:
+            continue
+        prefix, file_date, file_kind = parsed
+        if ((county_prefix is None or prefix == county_prefix) and (auction_date is None or file_date == auction_date)
+                and (kind is None or file_kind == kind)):
+            found.append({'name': filename, 'archive': None, 'county': prefix, 'date': file_date.isoformat(),
+                          'kind': file_kind, 'size': os.path.getsize(os.path.join(results_dir, filename))})
+    return found
+
+
+def read_file(entry, results_dir=RESULTS_DIR):
+    # Contents of a find_files() entry, from its archive or from results/
+    if entry['archive'] is None:
+        with open(os.path.join(results_dir, entry['name']), 'rb') as f:
+            return f.read()
+    with zipfile.ZipFile(entry['archive']) as archive:
+        return archive.read(entry['name'])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Archive old per-county result files by month")
+    parser.add_argument('--after-days', type=int, default=COMPACT_AFTER_DAYS)
+    parser.add_argument('--retention-days', type=int, default=RAW_RETENTION_DAYS,
+                        help="Days to keep raw _final.json dumps (0 = forever)")
+    parser.add_argument('--dry-run', action='store_true')
+    args = parser.parse_args()
+    stats = compact(after_days=args.after_days, retention_days=args.retention_days, dry_run=args.dry_run)
+    print(f"{stats['archived']} files archived ({stats['bytes_before'] / 1e6:.1f} MB before compression), "
+          f"{stats['expired']} raw dumps expired, {stats['archives']} archives written")
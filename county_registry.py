@@ -0,0 +1,179 @@
+# county_registry.py
+#
+# In-memory index of the county sites with per-site metadata used for planning: site
+# kind, state, timezone and learned run statistics (typical page count, last success,
+# average duration). Static metadata is derived from the hostname; learned statistics
+# are persisted in county_registry.json and updated after every county run.
+
+import json
+import os
+import threading
+from datetime import datetime
+from functools import lru_cache
+
+COUNTIES_FILE = 'counties_websites_list.json'
+REGISTRY_FILE = os.getenv('COUNTY_REGISTRY_FILE', 'county_registry.json')
+
+# Weight of the newest run in the moving averages
+STATS_ALPHA = 0.3
+
+# Sites outside Florida, by hostname prefix
+COUNTY_STATES = {
+    'apache': 'AZ', 'coconino': 'AZ', 'mohave': 'AZ',
+    'denver': 'CO', 'eagle': 'CO', 'elpasoco': 'CO', 'larimer': 'CO', 'mesa': 'CO', 'summit': 'CO',
+    'hardystonnj': 'NJ', 'newarknj': 'NJ',
+}
+DEFAULT_STATE = 'FL'
+
+STATE_TIMEZONES = {
+    'AZ': 'America/Phoenix',
+    'CO': 'America/Denver',
+    'FL': 'America/New_York',
+    'NJ': 'America/New_York',
+    'OH': 'America/New_York',
+}
+# Local time the day's auctions are normally over; override per county in the registry file
+DEFAULT_CLOSE_TIME = os.getenv('COUNTY_CLOSE_TIME', '15:00')
+
+# Florida panhandle counties on Central time
+CENTRAL_FLORIDA_COUNTIES = {'bay', 'calhoun', 'escambia', 'holmes', 'jackson', 'okaloosa', 'santarosa', 'walton', 'washington'}
+
+LEARNED_FIELDS = ('typical_pages', 'avg_duration', 'last_success', 'last_outcome', 'runs')
+
+_lock = threading.Lock()
+_registry = None
+# Non-learned fields set by hand in the registry file (e.g. a timezone correction)
+_overrides = {}
+
+
+@lru_cache(maxsize=None)
+def get_county_prefix(county_website):
+    if county_website.startswith(('http://', 'https://')):
+        county_website = county_website.split('://', 1)[1]
+    if county_website.endswith('.com'):
+        county_website = county_website[:-4]
+    return county_website.replace('.', '_')
+
+
+@lru_cache(maxsize=None)
+def extract_county_name(county_website):
+    county = county_website.split('.')[0]
+    return county.capitalize()
+
+
+def site_kind(county_website):
+    return 'realtaxdeed' if 'realtaxdeed' in county_website.lower() else 'realforeclose'
+
+
+def build_entry(county_website):
+    slug = county_website.split('.')[0].lower()
+    state = COUNTY_STATES.get(slug, DEFAULT_STATE)
+    timezone = STATE_TIMEZONES.get(state, 'America/New_York')
+    if state == 'FL' and slug in CENTRAL_FLORIDA_COUNTIES:
+        timezone = 'America/Chicago'
+    return {
+        'website': county_website,
+        'name': extract_county_name(county_website),
+        'prefix': get_county_prefix(county_website),
+        'kind': site_kind(county_website),
+        'state': state,
+        'timezone': timezone,
+        'close_time': DEFAULT_CLOSE_TIME,
+        'typical_pages': None,
+        'avg_duration': None,
+        'last_success': None,
+        'last_outcome': None,
+        'runs': 0,
+    }
+
+
+def _read_json(path, default):
+    if not os.path.exists(path):
+        return default
+    with open(path, 'r') as f:
+        return json.load(f)
+
+
+def load_registry(counties_file=COUNTIES_FILE, registry_file=None):
+    # Builds the index from the counties list and merges in the learned statistics
+    global _registry, _overrides
+    registry_file = registry_file or REGISTRY_FILE
+    stored = _read_json(registry_file, {})
+    registry = {}
+    overrides = {}
+    for county in _read_json(counties_file, []):
+        website = county['website']
+        key = website.lower()
+        entry = build_entry(website)
+        # Anything stored for the site (learned stats, manual overrides like timezone) wins
+        entry.update(stored.get(key, {}))
+        overrides[key] = {field: value for field, value in stored.get(key, {}).items() if field not in LEARNED_FIELDS}
+        registry[key] = entry
+    with _lock:
+        _registry = registry
+        _overrides = overrides
+    return registry
+
+
+def get_registry():
+    if _registry is None:
+        load_registry()
+    return _registry
+
+
+def get_county(county_website):
+    entry = get_registry().get(county_website.lower())
+    if entry is None:
+        # Sites not in the counties list (e.g. ad-hoc runs) get derived metadata only
+        entry = build_entry(county_website)
+    return entry
+
+
+def list_counties():
+    return list(get_registry().values())
+
+
+def save_registry(registry_file=None):
+    registry_file = registry_file or REGISTRY_FILE
+    with _lock:
+        data = {
+            key: {**_overrides.get(key, {}), **{field: entry.get(field) for field in LEARNED_FIELDS}}
+            for key, entry in (_registry or {}).items()
+        }
+    tmp_path = registry_file + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(data, f, indent=2)
+    os.replace(tmp_path, registry_file)
+
+
+def _moving_average(previous, value):
+    if previous is None:
+        return value
+    return round(STATS_ALPHA * value + (1 - STATS_ALPHA) * previous, 3)
+
+
+def record_county_result(record, save=True):
+    # Updates the learned statistics from a run_history county record
+    registry = get_registry()
+    key = record['website'].lower()
+    with _lock:
+        entry = registry.setdefault(key, build_entry(record['website']))
+        entry['runs'] = entry.get('runs', 0) + 1
+        entry['last_outcome'] = record['outcome']
+        if record['outcome'] in ('success', 'no_data'):
+            entry['last_success'] = datetime.fromtimestamp(record['ended_at']).isoformat()
+            entry['avg_duration'] = _moving_average(entry.get('avg_duration'), record['duration'])
+            if record['pages']:
+                entry['typical_pages'] = _moving_average(entry.get('typical_pages'), record['pages'])
+        elif record['outcome'] == 'timeout':
+            # The real duration is at least the deadline; keeps the planner starting it early
+            entry['avg_duration'] = max(entry.get('avg_duration') or 0, record['duration'])
+    if save:
+        save_registry()
+    return entry
+
+
+if __name__ == "__main__":
+    for entry in list_counties():
+        print(f"{entry['website']:40} {entry['kind']:14} {entry['state']:3} {entry['timezone']:20} "
+              f"pages={entry['typical_pages']} avg={entry['avg_duration']} last_success={entry['last_success']}")
@@ -0,0 +1,149 @@
+# detail_cache.py
+#
+# Persistent cache of the static property details parsed from the LOAD HTML (case #, parcel
+# ID, final judgment amount, assessed value, address split into city/state/zip), keyed by
+# county + Case # + Parcel ID. Postponed cases come back on later auction dates with the same
+# details; their items are then recognised with a regex and a fingerprint of the detail rows
+# instead of a BeautifulSoup parse. A changed detail row changes the fingerprint, so the item
+# is parsed again and the entry replaced. Entries expire after DETAIL_CACHE_TTL_DAYS and the
+# table is trimmed to DETAIL_CACHE_MAX_ENTRIES, least recently used first. Used from the
+# parse pool's worker processes, so it only depends on the standard library.
+
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+DETAIL_CACHE_DB = os.getenv('DETAIL_CACHE_DB', 'detail_cache.db')
+# 0 disables the cache
+DETAIL_CACHE_ENABLED = os.getenv('DETAIL_CACHE_ENABLED', '1') == '1'
+DETAIL_CACHE_TTL_DAYS = float(os.getenv('DETAIL_CACHE_TTL_DAYS', 180))
+DETAIL_CACHE_MAX_ENTRIES = int(os.getenv('DETAIL_CACHE_MAX_ENTRIES', 200000))
+# The table is trimmed every this many writes
+PRUNE_EVERY = 500
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS details (
+    county TEXT NOT NULL,
+    case_number TEXT NOT NULL,
+    parcel_id TEXT NOT NULL,
+    fingerprint TEXT NOT NULL,
+    details TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    last_used REAL NOT NULL,
+    PRIMARY KEY (county, case_number, parcel_id)
+);
+CREATE INDEX IF NOT EXISTS idx_details_last_used ON details (last_used);
+"""
+
+# A label/value row of an auction item, as parse_auction_item reads them
+DETAIL_ROW = re.compile(r'<th[^>]*>(.*?)</th>\s*<td[^>]*>(.*?)</td>', re.S | re.I)
+TAG = re.compile(r'<[^>]+>')
+
+_lock = threading.Lock()
+_initialized = set()
+_writes = 0
+
+
+def _open(db_path=None):
+    db_path = db_path or DETAIL_CACHE_DB
+    conn = sqlite3.connect(db_path, timeout=10)
+    if db_path not in _initialized:
+        # Several parse workers read and write at once
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript(SCHEMA)
+        _initialized.add(db_path)
+    return conn
+
+
+@contextmanager
+def _connect(db_path=None):
+    # Commits or rolls back like sqlite3's own context manager, then closes the connection
+    conn = _open(db_path)
+    try:
+        with conn:
+            yield conn
+    finally:
+        conn.close()
+
+
+def item_key(item_html):
+    # -> (case number, parcel id, fingerprint) of an item's preprocessed HTML, or None when
+    # it has no case number to key on. Only the rows' text is fingerprinted: links in them
+    # can carry the listing's AID.
+    rows = [(TAG.sub('', label).strip(), TAG.sub('', value).strip()) for label, value in DETAIL_ROW.findall(item_html)]
+    values = {label.rstrip(':'): value for label, value in rows}
+    if not values.get('Case #'):
+        return None
+    fingerprint = hashlib.blake2b(json.dumps(rows).encode('utf-8'), digest_size=16).hexdigest()
+    return values['Case #'], values.get('Parcel ID', ''), fingerprint
+
+
+def get_many(county, keys, db_path=None):
+    # keys: (case number, parcel id, fingerprint) -> details, for the entries that are
+    # present, unexpired and have the same fingerprint
+    if not keys:
+        return {}
+    now = time.time()
+    oldest = now - DETAIL_CACHE_TTL_DAYS * 86400
+    found = {}
+    try:
+        with _connect(db_path) as conn:
+            for case_number, parcel_id, fingerprint in keys:
+                row = conn.execute(
+                    "SELECT fingerprint, details, created_at FROM details "
+                    "WHERE county = ? AND case_number = ? AND parcel_id = ?",
+                    (county, case_number, parcel_id)
+                ).fetchone()
+                if row is not None and row[0] == fingerprint and row[2] >= oldest:
+                    found[(case_number, parcel_id, fingerprint)] = json.loads(row[1])
+            if found:
+                conn.executemany(
+                    "UPDATE details SET last_used = ? WHERE county = ? AND case_number = ? AND parcel_id = ?",
+                    [(now, county, case_number, parcel_id) for case_number, parcel_id, _ in found]
+                )
+    except sqlite3.Error as e:
+        # The cache only saves work; a locked or broken database means parsing everything
+        print(f"Detail cache lookup failed: {e}")
+    return found
+
+
+def put_many(county, entries, db_path=None):
+    # entries: [((case number, parcel id, fingerprint), details)]
+    global _writes
+    if not entries:
+        return
+    now = time.time()
+    try:
+        with _lock, _connect(db_path) as conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO details (county, case_number, parcel_id, fingerprint, details, created_at, last_used) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [(county, case_number, parcel_id, fingerprint, json.dumps(details), now, now)
+                 for (case_number, parcel_id, fingerprint), details in entries]
+            )
+            _writes += len(entries)
+            if _writes >= PRUNE_EVERY:
+                _writes = 0
+                prune(conn)
+    except sqlite3.Error as e:
+        print(f"Detail cache write failed: {e}")
+
+
+def prune(conn):
+    conn.execute("DELETE FROM details WHERE created_at < ?", (time.time() - DETAIL_CACHE_TTL_DAYS * 86400,))
+    conn.execute(
+        "DELETE FROM details WHERE rowid IN ("
+        "SELECT rowid FROM details ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+        (DETAIL_CACHE_MAX_ENTRIES,)
+    )
+
+
+def stats(db_path=None):
+    with _connect(db_path) as conn:
+        entries, counties = conn.execute("SELECT COUNT(*), COUNT(DISTINCT county) FROM details").fetchone()
+    return {'entries': entries, 'counties': counties}
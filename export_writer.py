@@ -0,0 +1,179 @@
+# export_writer.py
+#
+# Nightly export: every county appends its cleaned rows to one consolidated CSV and/or
+# NDJSON file per night. Rows are encoded into an in-memory buffer and written in large
+# chunks from a worker thread to the run's own .part file. When the run closes, its rows are
+# appended to the night's file (through a copy that is renamed into place), so the runs of
+# the timezone slots all add to the same file and a failed run adds nothing. Appends hold an
+# exclusive lock on <night file>.lock, so runs in other processes (the CLI next to the
+# scheduler) can't drop each other's rows.
+
+import asyncio
+import csv
+import gzip
+import io
+import json
+import os
+import shutil
+import threading
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:
+    # Windows: only the runs of this process are serialized
+    fcntl = None
+
+# Comma-separated list of formats to write (csv, ndjson); empty disables the export
+EXPORT_FORMATS = [fmt.strip() for fmt in os.getenv('EXPORT_FORMATS', 'csv').split(',') if fmt.strip()]
+# none, gzip or zstd (zstd needs the zstandard package)
+EXPORT_COMPRESSION = os.getenv('EXPORT_COMPRESSION', 'none')
+EXPORT_BUFFER_BYTES = int(os.getenv('EXPORT_BUFFER_BYTES', 1024 * 1024))
+EXPORT_DIR = os.getenv('EXPORT_DIR', 'results')
+
+COMPRESSION_SUFFIXES = {'none': '', 'gzip': '.gz', 'zstd': '.zst'}
+
+# Runs finishing at the same time append to the night's file one after the other; flock
+# doesn't exclude other threads of the same process
+_append_lock = threading.Lock()
+
+
+def _format_csv_value(value):
+    return '' if value is None else str(value)
+
+
+def encode_csv_rows(rows, fieldnames, header=False):
+    # Correctly quoted CSV (values with commas, quotes or newlines are quoted)
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator='\n')
+    if header:
+        writer.writerow(fieldnames)
+    writer.writerows([_format_csv_value(row.get(field)) for field in fieldnames] for row in rows)
+    return buffer.getvalue()
+
+
+def encode_ndjson_rows(rows, fieldnames):
+    return ''.join(json.dumps({field: row.get(field) for field in fieldnames}) + '\n' for row in rows)
+
+
+@contextmanager
+def _locked(path):
+    with _append_lock, open(path + '.lock', 'a') as lock_file:
+        if fcntl is not None:
+            # Released when the lock file is closed
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+        yield
+
+
+def _open_output(path, compression):
+    if compression == 'gzip':
+        return gzip.open(path, 'wb', compresslevel=6)
+    if compression == 'zstd':
+        import zstandard
+        return zstandard.ZstdCompressor(level=6).stream_writer(open(path, 'wb'))
+    if compression != 'none':
+        raise ValueError(f"Unknown export compression: {compression}")
+    return open(path, 'wb', buffering=EXPORT_BUFFER_BYTES)
+
+
+class _ExportFile:
+    def __init__(self, path, fmt, compression, fieldnames, run_id):
+        self.path = path
+        self.part_path = f"{path}.{run_id}.part"
+        self.fmt = fmt
+        self.compression = compression
+        self.fieldnames = fieldnames
+        self.rows = 0
+        self._pending = []
+        self._pending_size = 0
+        self._file = _open_output(self.part_path, compression)
+
+    def _append(self, text):
+        self._pending.append(text)
+        self._pending_size += len(text)
+
+    def add_rows(self, rows):
+        if self.fmt == 'csv':
+            self._append(encode_csv_rows(rows, self.fieldnames))
+        else:
+            self._append(encode_ndjson_rows(rows, self.fieldnames))
+        self.rows += len(rows)
+
+    def pending_size(self):
+        return self._pending_size
+
+    def take_pending(self):
+        chunk = ''.join(self._pending)
+        self._pending = []
+        self._pending_size = 0
+        return chunk.encode('utf-8')
+
+    def write(self, data):
+        if data:
+            self._file.write(data)
+
+    def finish(self):
+        # Compressed streams can be concatenated (gzip members, zstd frames), so the run's
+        # file is appended as is; the CSV header is written once, when the night's file starts
+        self._file.close()
+        with _locked(self.path):
+            merged_path = self.path + '.part'
+            if os.path.exists(self.path):
+                shutil.copyfile(self.path, merged_path)
+            else:
+                header = _open_output(merged_path, self.compression)
+                if self.fmt == 'csv':
+                    header.write(encode_csv_rows([], self.fieldnames, header=True).encode('utf-8'))
+                header.close()
+            with open(merged_path, 'ab') as merged, open(self.part_path, 'rb') as run_file:
+                shutil.copyfileobj(run_file, merged)
+            os.replace(merged_path, self.path)
+            os.remove(self.part_path)
+
+    def abort(self):
+        self._file.close()
+        if os.path.exists(self.part_path):
+            os.remove(self.part_path)
+
+
+class ExportWriter:
+    def __init__(self, export_name, fieldnames, formats=None, compression=None, directory=None, run_id=None):
+        # export_name is the night's file (without extension); run_id names this run's .part files
+        formats = EXPORT_FORMATS if formats is None else formats
+        compression = compression or EXPORT_COMPRESSION
+        directory = directory or EXPORT_DIR
+        run_id = run_id or f"{os.getpid()}-{id(self)}"
+        os.makedirs(directory, exist_ok=True)
+        suffix = COMPRESSION_SUFFIXES.get(compression, '')
+        self.files = [
+            _ExportFile(os.path.join(directory, f"{export_name}.{fmt}{suffix}"), fmt, compression, fieldnames, run_id)
+            for fmt in formats
+        ]
+        # Serializes flushes so chunks reach the file in the order they were encoded
+        self._flush_lock = asyncio.Lock()
+
+    @property
+    def paths(self):
+        return [export_file.path for export_file in self.files]
+
+    async def add_rows(self, rows):
+        # Encoding is in memory; disk writes happen in a thread once the buffer is large
+        if not rows:
+            return
+        for export_file in self.files:
+            export_file.add_rows(rows)
+            if export_file.pending_size() >= EXPORT_BUFFER_BYTES:
+                async with self._flush_lock:
+                    await asyncio.to_thread(export_file.write, export_file.take_pending())
+
+    async def close(self):
+        async with self._flush_lock:
+            for export_file in self.files:
+                await asyncio.to_thread(export_file.write, export_file.take_pending())
+                await asyncio.to_thread(export_file.finish)
+                print(f'Export saved: {export_file.path} (+{export_file.rows} rows)')
+
+    async def abort(self):
+        async with self._flush_lock:
+            for export_file in self.files:
+                await asyncio.to_thread(export_file.abort)
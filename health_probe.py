@@ -0,0 +1,148 @@
+# health_probe.py
+#
+# Lightweight health check of every county site: one plain HTTP GET of the auction preview
+# page per site, all sites concurrently, through the same proxy as the scraper. For each site
+# it records latency, HTTP status, whether the request was blocked (403) and whether the site
+# issued a session cookie. Results go to the health_probes table in run_history.db and are
+# used by run_all_counties to skip or deprioritize unhealthy counties (HEALTH_PROBE_BEFORE_RUN).
+
+import argparse
+import asyncio
+import json
+import os
+import time
+from datetime import datetime
+
+import aiohttp
+from dotenv import load_dotenv
+
+import run_history
+from browser_pool import USER_AGENT
+from logger import get_logger
+
+logger = get_logger()
+
+load_dotenv()
+
+PROXY_HOST = 'shared-datacenter.geonode.com'
+PROXY_PORT = '9008'
+PROBE_CONCURRENCY = int(os.getenv('PROBE_CONCURRENCY', 20))
+# Seconds per site, connect and body included
+PROBE_TIMEOUT = float(os.getenv('PROBE_TIMEOUT', 10))
+# A site answering slower than this is reported as 'slow' (still healthy)
+PROBE_SLOW_SECONDS = float(os.getenv('PROBE_SLOW_SECONDS', 5))
+PROBE_USE_PROXY = os.getenv('PROBE_USE_PROXY', '1') == '1'
+# Cookies the sites' ColdFusion backend sets when a session starts
+SESSION_COOKIES = ('CFID', 'CFTOKEN', 'JSESSIONID')
+HEALTHY_STATUSES = ('ok', 'slow')
+
+
+def get_proxy_url():
+    proxy_username = os.getenv('PROXY_USERNAME')
+    proxy_password = os.getenv('PROXY_PASSWORD')
+    if not PROBE_USE_PROXY or not proxy_username:
+        return None
+    return f"http://{proxy_username}:{proxy_password}@{PROXY_HOST}:{PROXY_PORT}"
+
+
+def probe_url(county_website, auction_date=None):
+    # The page initialize_session opens, so the probe sees what the scraper will see
+    formatted_date = (auction_date or datetime.now()).strftime("%m/%d/%Y")
+    return f"https://{county_website}/index.cfm?zaction=AUCTION&zmethod=PREVIEW&AuctionDate={formatted_date}"
+
+
+def classify(result):
+    if result['error'] is not None:
+        return 'error'
+    if result['blocked']:
+        return 'blocked'
+    if result['http_status'] != 200:
+        return f"http_{result['http_status']}"
+    if not result['session_cookie']:
+        return 'no_session'
+    if result['latency'] > PROBE_SLOW_SECONDS:
+        return 'slow'
+    return 'ok'
+
+
+async def probe_site(session, county_website, semaphore, proxy=None):
+    result = {
+        'website': county_website,
+        'probed_at': time.time(),
+        'http_status': None,
+        'latency': None,
+        'blocked': False,
+        'session_cookie': False,
+        'cookies': [],
+        'error': None,
+    }
+    async with semaphore:
+        started = time.perf_counter()
+        try:
+            async with session.get(probe_url(county_website), proxy=proxy, allow_redirects=True) as response:
+                body = await response.text(errors='replace')
+                result['http_status'] = response.status
+                # Cookies can be set on a redirect before the final page
+                cookies = set(response.cookies)
+                for previous in response.history:
+                    cookies.update(previous.cookies)
+            result['cookies'] = sorted(cookies)
+            result['blocked'] = response.status == 403 or '403 Forbidden' in body
+            result['session_cookie'] = any(name.upper() in SESSION_COOKIES for name in cookies)
+        except Exception as e:
+            result['error'] = f"{type(e).__name__}: {e}" if str(e) else type(e).__name__
+        result['latency'] = round(time.perf_counter() - started, 3)
+    result['status'] = classify(result)
+    return result
+
+
+async def probe_all(websites, concurrency=PROBE_CONCURRENCY, probe_id=None, record=True):
+    semaphore = asyncio.Semaphore(concurrency)
+    timeout = aiohttp.ClientTimeout(total=PROBE_TIMEOUT)
+    proxy = get_proxy_url()
+    started = time.perf_counter()
+    # No shared cookie jar: every site has to issue its own session cookie
+    async with aiohttp.ClientSession(timeout=timeout, headers={'user-agent': USER_AGENT},
+                                     cookie_jar=aiohttp.DummyCookieJar()) as session:
+        results = await asyncio.gather(*(probe_site(session, website, semaphore, proxy) for website in websites))
+
+    unhealthy = [result for result in results if result['status'] not in HEALTHY_STATUSES]
+    logger.info(f"Probed {len(results)} sites in {time.perf_counter() - started:.1f}s, {len(unhealthy)} unhealthy")
+    for result in unhealthy:
+        logger.error(f"Unhealthy site {result['website']}: {result['status']} {result['error'] or ''}".rstrip())
+    if record:
+        run_history.record_health_probe(probe_id or run_history.new_run_id('probe'), results)
+    return results
+
+
+def unhealthy_websites(results):
+    return {result['website'] for result in results if result['status'] not in HEALTHY_STATUSES}
+
+
+def format_table(results):
+    lines = [f"{'website':40} {'status':12} {'http':>4} {'latency':>8} {'403':>4} {'session':>7}"]
+    for result in sorted(results, key=lambda result: (result['status'] in HEALTHY_STATUSES, result['website'])):
+        latency = f"{result['latency']:.2f}s" if result['latency'] is not None else '-'
+        lines.append(f"{result['website']:40} {result['status']:12} {result['http_status'] or '-':>4} {latency:>8} "
+                     f"{'yes' if result['blocked'] else 'no':>4} {'yes' if result['session_cookie'] else 'no':>7}")
+    return '\n'.join(lines)
+
+
+def load_websites(counties_file='counties_websites_list.json'):
+    with open(counties_file, 'r') as f:
+        return [county_data['website'] for county_data in json.load(f)]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Check every county site with a plain HTTP request")
+    parser.add_argument('websites', nargs='*', help="Only these sites (default: the counties list)")
+    parser.add_argument('--counties-file', default='counties_websites_list.json')
+    parser.add_argument('--concurrency', type=int, default=PROBE_CONCURRENCY)
+    parser.add_argument('--no-record', action='store_true', help="Don't write the results to run_history.db")
+    args = parser.parse_args()
+
+    results = asyncio.run(probe_all(args.websites or load_websites(args.counties_file), args.concurrency,
+                                    record=not args.no_record))
+    print(format_table(results))
+    unhealthy = unhealthy_websites(results)
+    print(f"\n{len(results) - len(unhealthy)} healthy, {len(unhealthy)} unhealthy")
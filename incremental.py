@@ -0,0 +1,118 @@
+# incremental.py
+#
+# Per-county, per-date scrape state for cheap re-runs (retries, reruns, several runs a day).
+# results/state/<prefix>_<MM-DD-YYYY>.json records every AID's last merged auction, whether
+# it is final (sold, canceled, redeemed, ...), a hash of its cleaned row and, per sink
+# (Sheets, the run export, the results store), the row hash that sink last received. A
+# re-run skips the detail HTML and the UPDATE request of final AIDs, reuses their stored
+# data for the full per-county files, and only sends each sink the rows it doesn't have yet.
+
+import hashlib
+import json
+import os
+from datetime import datetime
+
+from county_registry import get_county_prefix
+
+STATE_DIR = os.getenv('SCRAPE_STATE_DIR', os.path.join('results', 'state'))
+# 0: every run fetches and emits everything, as before
+INCREMENTAL_SCRAPE = os.getenv('INCREMENTAL_SCRAPE', '1') == '1'
+
+# Status messages of auctions that will not change again
+CLOSED_STATUS_WORDS = ('sold', 'cancel', 'redeemed', 'bankruptcy', 'postponed', 'closed')
+
+
+def is_closed(auction):
+    if auction['soldTo'].get('value'):
+        return True
+    message = auction['status'].get('message')
+    return isinstance(message, str) and any(word in message.lower() for word in CLOSED_STATUS_WORDS)
+
+
+def row_hash(row):
+    # Of the cleaned row, so cosmetic UPDATE fields don't count as changes
+    return hashlib.blake2b(json.dumps(row, sort_keys=True).encode('utf-8'), digest_size=12).hexdigest()
+
+
+class ScrapeState:
+    def __init__(self, county_website, formatted_date, state_dir=STATE_DIR):
+        self.path = os.path.join(state_dir, f"{get_county_prefix(county_website)}_{formatted_date.replace('/', '-')}.json")
+        self.auctions = {}
+        self.page_info = None
+        self.reused = 0
+        if os.path.exists(self.path):
+            try:
+                with open(self.path, 'r') as f:
+                    state = json.load(f)
+                self.auctions = state['auctions']
+                self.page_info = state['page_info']
+            except (ValueError, KeyError):
+                # A damaged state file only costs a full scrape
+                self.auctions = {}
+                self.page_info = None
+
+    def final_aids(self):
+        # Without a stored pageInfo a page of only final AIDs couldn't be answered from state
+        if self.page_info is None:
+            return set()
+        return {aid for aid, entry in self.auctions.items() if entry['final']}
+
+    def update_page(self, merged_page, page_rlist):
+        # Records the fetched auctions and fills in the final ones from state, in page order
+        if merged_page['pageInfo'].get('total'):
+            self.page_info = merged_page['pageInfo']
+        fetched = {auction['id']: auction for auction in merged_page['auctions']}
+        auctions = []
+        for aid in page_rlist:
+            auction = fetched.pop(aid, None)
+            if auction is not None:
+                previous = self.auctions.get(aid, {})
+                self.auctions[aid] = {'final': is_closed(auction), 'row_hash': previous.get('row_hash'),
+                                      'emitted': previous.get('emitted', {}), 'auction': auction}
+            elif aid in self.auctions and self.auctions[aid]['final']:
+                auction = self.auctions[aid]['auction']
+                self.reused += 1
+            else:
+                continue
+            auctions.append(auction)
+        auctions.extend(fetched.values())
+        return {**merged_page, 'auctions': auctions}
+
+    def record_rows(self, items):
+        # (AID, cleaned row) pairs of a page; each row is hashed once, here
+        for aid, row in items:
+            if aid in self.auctions:
+                self.auctions[aid]['row_hash'] = row_hash(row)
+
+    def pending(self, items, sink):
+        # The (AID, row) pairs whose row differs from what sink last received
+        return [(aid, row) for aid, row in items
+                if aid not in self.auctions or self.auctions[aid]['row_hash'] is None
+                or self.auctions[aid]['row_hash'] != self.auctions[aid]['emitted'].get(sink)]
+
+    def mark_emitted(self, sink, aids):
+        for aid in aids:
+            if aid in self.auctions:
+                self.auctions[aid]['emitted'][sink] = self.auctions[aid]['row_hash']
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with open(self.path + '.part', 'w') as f:
+            json.dump({'page_info': self.page_info, 'auctions': self.auctions}, f)
+        os.replace(self.path + '.part', self.path)
+
+
+def prune_states(before_date, state_dir=STATE_DIR):
+    # Deletes the state files of auction dates before before_date; returns how many
+    if not os.path.isdir(state_dir):
+        return 0
+    removed = 0
+    for filename in os.listdir(state_dir):
+        try:
+            state_date = datetime.strptime(filename.rsplit('_', 1)[-1], '%m-%d-%Y.json').date()
+        except ValueError:
+            continue
+        if state_date < before_date:
+            os.remove(os.path.join(state_dir, filename))
+            removed += 1
+    return removed
@@ -0,0 +1,163 @@
+# latency.py
+#
+# Per-endpoint latency histograms that drive request timeouts (p99 x LATENCY_TIMEOUT_FACTOR)
+# and hedging: when a request has taken longer than the endpoint's p95, a duplicate is sent
+# on a second connection and whichever answer comes first wins. Hedges are paid for from a
+# per-endpoint token budget (HEDGE_BUDGET tokens per request) so they stay a small fraction
+# of the traffic.
+
+import asyncio
+import bisect
+import math
+import os
+import time
+
+LATENCY_TIMEOUT_FACTOR = float(os.getenv('LATENCY_TIMEOUT_FACTOR', 3))
+MIN_TIMEOUT = float(os.getenv('MIN_REQUEST_TIMEOUT', 5))
+# Samples needed before the histogram is trusted over the fixed defaults
+MIN_SAMPLES = int(os.getenv('LATENCY_MIN_SAMPLES', 20))
+# Hedge tokens earned per request, and the most that can be saved up
+HEDGE_BUDGET = float(os.getenv('HEDGE_BUDGET', 0.05))
+HEDGE_BURST = float(os.getenv('HEDGE_BURST', 2))
+
+# Bucket upper bounds in seconds: 50 ms to ~5 min, 20% apart
+BUCKETS = [0.05 * 1.2 ** index for index in range(49)]
+
+
+class LatencyHistogram:
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.samples = 0
+        self.hedge_tokens = 1.0
+        self.requests = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+
+    def observe(self, seconds):
+        self.counts[bisect.bisect_left(BUCKETS, seconds)] += 1
+        self.samples += 1
+
+    def percentile(self, q):
+        if self.samples < MIN_SAMPLES:
+            return None
+        rank = math.ceil(q * self.samples)
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank:
+                return BUCKETS[index] if index < len(BUCKETS) else BUCKETS[-1]
+        return BUCKETS[-1]
+
+    def timeout(self, default):
+        p99 = self.percentile(0.99)
+        if p99 is None:
+            return default
+        return min(max(p99 * LATENCY_TIMEOUT_FACTOR, MIN_TIMEOUT), default)
+
+    def retry_delay(self, attempt):
+        # Scales with how fast the endpoint normally answers instead of a flat second
+        p50 = self.percentile(0.5) or 1.0
+        return min(max(p50, 0.5) * 2 ** attempt, 30)
+
+    def earn(self):
+        self.requests += 1
+        self.hedge_tokens = min(self.hedge_tokens + HEDGE_BUDGET, HEDGE_BURST)
+
+    def try_spend(self):
+        if self.hedge_tokens < 1:
+            return False
+        self.hedge_tokens -= 1
+        self.hedges += 1
+        return True
+
+    def snapshot(self):
+        return {
+            'samples': self.samples,
+            'p50': self.percentile(0.5),
+            'p95': self.percentile(0.95),
+            'p99': self.percentile(0.99),
+            'requests': self.requests,
+            'hedges': self.hedges,
+            'hedge_wins': self.hedge_wins,
+        }
+
+
+_histograms = {}
+
+
+def get_histogram(key):
+    histogram = _histograms.get(key)
+    if histogram is None:
+        histogram = _histograms[key] = LatencyHistogram()
+    return histogram
+
+
+def snapshot():
+    return {key: histogram.snapshot() for key, histogram in _histograms.items()}
+
+
+def _succeeded(task):
+    return not task.cancelled() and task.exception() is None and getattr(task.result(), 'ok', True)
+
+
+async def _cancel(task):
+    task.cancel()
+    await asyncio.gather(task, return_exceptions=True)
+
+
+async def hedged(key, primary, backup=None, abort_primary=None):
+    # primary/backup are zero-argument coroutine functions for the same idempotent request.
+    # Only the primary's latency is recorded; a primary beaten by its hedge is recorded with
+    # the time it had taken so far (a lower bound), and so are failures and timeouts, which
+    # would otherwise leave only the fast answers in the histogram and shrink the timeout
+    # on slow sites. Cancelling a task doesn't stop a browser navigation, so abort_primary
+    # (e.g. a navigation to about:blank) is awaited when the hedge wins.
+    histogram = get_histogram(key)
+    histogram.earn()
+    delay = histogram.percentile(0.95) if backup is not None else None
+    started = time.perf_counter()
+    primary_task = asyncio.ensure_future(primary())
+
+    try:
+        done, _ = await asyncio.wait({primary_task}, timeout=delay)
+    except asyncio.CancelledError:
+        await _cancel(primary_task)
+        raise
+    if done or not histogram.try_spend():
+        try:
+            result = await primary_task
+        except asyncio.CancelledError:
+            await _cancel(primary_task)
+            raise
+        except Exception:
+            histogram.observe(time.perf_counter() - started)
+            raise
+        histogram.observe(time.perf_counter() - started)
+        return result
+
+    hedge_task = asyncio.ensure_future(backup())
+    pending = {primary_task, hedge_task}
+    try:
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            winner = next((task for task in done if _succeeded(task)), None)
+            if winner is None and pending:
+                continue
+            histogram.observe(time.perf_counter() - started)
+            if winner is hedge_task:
+                histogram.hedge_wins += 1
+            for task in pending:
+                await _cancel(task)
+            if primary_task in pending and abort_primary is not None:
+                try:
+                    await abort_primary()
+                except Exception:
+                    pass
+            if winner is not None:
+                return winner.result()
+            # Both failed: report the primary's outcome
+            return primary_task.result()
+    except asyncio.CancelledError:
+        for task in (primary_task, hedge_task):
+            await _cancel(task)
+        raise
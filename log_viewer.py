@@ -1,12 +1,70 @@
 # log_viewer.py
 
-from flask import Flask, render_template_string
+from flask import Flask, Response, render_template_string, jsonify, request
+import hashlib
+import hmac
 import os
 import re
+import threading
+import time
+from collections import OrderedDict
+
+import county_registry
+import run_history
+import resource_watchdog
+import results_store
+from planner import SCRAPE_CONCURRENCY_MAX
 
 app = Flask(__name__)
 
 LOG_FILE = 'scraper.log'
+# Bearer token for POST /api/jobs/<name>/trigger; without one, triggers are only accepted from localhost
+JOBS_API_TOKEN = os.getenv('JOBS_API_TOKEN')
+LOCAL_ADDRESSES = ('127.0.0.1', '::1')
+
+# Run history responses are cached briefly so dashboards polling the API don't hit sqlite on every request.
+# Keys include query parameters, so the cache is bounded: expired entries are dropped on every
+# lookup and the least recently used ones beyond API_CACHE_SIZE.
+API_CACHE_TTL = int(os.getenv('API_CACHE_TTL', 30))
+API_CACHE_SIZE = int(os.getenv('API_CACHE_SIZE', 256))
+_api_cache = OrderedDict()
+_api_cache_lock = threading.Lock()
+
+
+def cached_json(key, compute):
+    now = time.time()
+    with _api_cache_lock:
+        for expired in [cached_key for cached_key, (expires, _) in _api_cache.items() if expires <= now]:
+            del _api_cache[expired]
+        if key in _api_cache:
+            _api_cache.move_to_end(key)
+            return jsonify(_api_cache[key][1])
+    result = compute()
+    with _api_cache_lock:
+        _api_cache[key] = (now + API_CACHE_TTL, result)
+        _api_cache.move_to_end(key)
+        while len(_api_cache) > API_CACHE_SIZE:
+            _api_cache.popitem(last=False)
+    return jsonify(result)
+
+# Hot /api/auctions queries; entries are keyed by the store version, so a finished scrape
+# (which bumps the version) makes every older entry unreachable
+AUCTIONS_CACHE_SIZE = int(os.getenv('AUCTIONS_CACHE_SIZE', 256))
+_auctions_cache = OrderedDict()
+_auctions_cache_lock = threading.Lock()
+
+
+def cached_auctions(key, compute):
+    with _auctions_cache_lock:
+        if key in _auctions_cache:
+            _auctions_cache.move_to_end(key)
+            return _auctions_cache[key]
+    result = compute()
+    with _auctions_cache_lock:
+        _auctions_cache[key] = result
+        while len(_auctions_cache) > AUCTIONS_CACHE_SIZE:
+            _auctions_cache.popitem(last=False)
+    return result
 
 def is_relevant_log(log_line):
     # Patterns to exclude
@@ -85,5 +143,144 @@ def view_log():
     
     return render_template_string(html_template, logs=''.join(processed_logs))
 
+@app.route('/api/runs/latest')
+def api_latest_run():
+    return cached_json('latest_run', run_history.get_latest_run)
+
+
+@app.route('/api/counties/<county_website>/trend')
+def api_county_trend(county_website):
+    limit = request.args.get('limit', 30, type=int)
+    return cached_json(('trend', county_website, limit),
+                       lambda: run_history.get_county_trend(county_website, limit))
+
+
+@app.route('/api/counties/slowest')
+def api_slowest_counties():
+    limit = request.args.get('limit', 10, type=int)
+    days = request.args.get('days', 14, type=int)
+    return cached_json(('slowest', limit, days),
+                       lambda: run_history.get_slowest_counties(limit, days))
+
+
+
+@app.route('/api/health/latest')
+def api_latest_health():
+    return cached_json('latest_health', run_history.get_latest_health)
+
+
+@app.route('/metrics')
+def metrics():
+    # Prometheus text format: RSS/CPU of the scraper and its browsers, concurrency limit
+    sample = resource_watchdog.current_sample()
+    return Response(resource_watchdog.prometheus_metrics(sample), mimetype='text/plain; version=0.0.4')
+
+
+@app.route('/api/auctions')
+def api_auctions():
+    # Filters: county (name or website), from/to (YYYY-MM-DD), type, min_excess; page/per_page
+    params = (
+        request.args.get('county') or None,
+        request.args.get('from') or None,
+        request.args.get('to') or None,
+        request.args.get('type') or None,
+        request.args.get('min_excess', type=float),
+        request.args.get('page', 1, type=int),
+        request.args.get('per_page', 100, type=int),
+    )
+    return results_response(('auctions', params), lambda: results_store.query_auctions(*params))
+
+
+@app.route('/api/rollups')
+def api_rollups():
+    # Auctions and Excess Amount totals grouped by county, period (day/month/year) and type
+    params = (
+        request.args.get('period', 'month'),
+        request.args.get('county') or None,
+        request.args.get('from') or None,
+        request.args.get('to') or None,
+        request.args.get('type') or None,
+    )
+    if params[0] not in results_store.ROLLUP_PERIODS:
+        return jsonify({'error': f"period must be one of {', '.join(results_store.ROLLUP_PERIODS)}"}), 400
+    return results_response(('rollups', params), lambda: results_store.query_rollups(*params))
+
+
+def results_response(key, compute):
+    # Conditional JSON response for queries on the results store, cached by store version. No
+    # Last-Modified: with one-second granularity, two writes in the same second would look unchanged.
+    version, _ = results_store.get_version()
+    etag = hashlib.sha1(repr((version, key)).encode('utf-8')).hexdigest()
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+    else:
+        response = jsonify(cached_auctions((version, key), compute))
+    response.set_etag(etag)
+    response.cache_control.no_cache = True
+    return response
+
+
+def get_scheduler():
+    # Set by main.py when the viewer runs inside the scheduler process
+    return app.config.get('SCHEDULER')
+
+
+@app.route('/api/jobs')
+def api_jobs():
+    scheduler = get_scheduler()
+    if scheduler is None:
+        return jsonify({'error': 'scheduler not running'}), 503
+    return jsonify(scheduler.status())
+
+
+def trigger_allowed():
+    if JOBS_API_TOKEN:
+        supplied = request.headers.get('Authorization', '')
+        return hmac.compare_digest(supplied.encode('utf-8'), f"Bearer {JOBS_API_TOKEN}".encode('utf-8'))
+    return request.remote_addr in LOCAL_ADDRESSES
+
+
+def trigger_options(options):
+    # -> (job kwargs, error). Only counties from the registry are accepted, since the browser
+    # navigates to https://<website>/..., and concurrency can't exceed SCRAPE_CONCURRENCY_MAX.
+    kwargs = {}
+    if 'websites' in options:
+        websites = options['websites']
+        if not isinstance(websites, list) or not websites or not all(isinstance(website, str) for website in websites):
+            return None, 'websites must be a non-empty list of county websites'
+        registry = county_registry.get_registry()
+        unknown = [website for website in websites if website.lower() not in registry]
+        if unknown:
+            return None, f"unknown websites: {', '.join(unknown)}"
+        kwargs['websites'] = [registry[website.lower()]['website'] for website in websites]
+    if 'concurrency' in options:
+        concurrency = options['concurrency']
+        if not isinstance(concurrency, int) or isinstance(concurrency, bool) or concurrency < 1:
+            return None, 'concurrency must be a positive integer'
+        kwargs['concurrency'] = min(concurrency, SCRAPE_CONCURRENCY_MAX)
+    return kwargs, None
+
+
+@app.route('/api/jobs/<name>/trigger', methods=['POST'])
+def api_trigger_job(name):
+    # Optional JSON body, e.g. {"websites": ["manatee.realforeclose.com"], "concurrency": 2}
+    if not trigger_allowed():
+        return jsonify({'error': 'forbidden'}), 403
+    scheduler = get_scheduler()
+    if scheduler is None:
+        return jsonify({'error': 'scheduler not running'}), 503
+    kwargs, error = trigger_options(request.get_json(silent=True) or {})
+    if error is not None:
+        return jsonify({'error': error}), 400
+    try:
+        started = scheduler.trigger_threadsafe(name, **kwargs)
+    except KeyError:
+        return jsonify({'error': f'unknown job {name}'}), 404
+    except RuntimeError:
+        return jsonify({'error': 'scheduler not running'}), 503
+    if not started:
+        return jsonify({'job': name, 'started': False, 'reason': 'already running'}), 409
+    return jsonify({'job': name, 'started': True}), 202
+
 if __name__ == '__main__':
     app.run(host='0.0.0.0', port=5000)
\ No newline at end of file
@@ -1,30 +1,148 @@
+import atexit
+import contextvars
+import json
 import logging
+import logging.handlers
+import multiprocessing
+import os
+import queue
+import time
+from datetime import datetime, timezone
+
+LOG_FILE = 'scraper.log'
+JSON_LOG_FILE = 'scraper.jsonl'
+
+# Rotation settings: roll over when the file exceeds LOG_MAX_BYTES or at midnight,
+# whichever comes first, keeping LOG_BACKUP_COUNT old files.
+LOG_MAX_BYTES = int(os.getenv('LOG_MAX_BYTES', 10 * 1024 * 1024))
+LOG_BACKUP_COUNT = int(os.getenv('LOG_BACKUP_COUNT', 14))
+# Set LOG_JSON=1 to also write JSON lines with county/run/stage fields to scraper.jsonl
+LOG_JSON = os.getenv('LOG_JSON', '0').lower() in ('1', 'true', 'yes')
+
+CONTEXT_FIELDS = ('county', 'run_id', 'stage')
+
+_log_context = {field: contextvars.ContextVar(f'log_{field}', default=None) for field in CONTEXT_FIELDS}
+
+
+def set_log_context(**fields):
+    # Context is stored in contextvars, so each asyncio task (county) keeps its own values
+    for field, value in fields.items():
+        if field not in _log_context:
+            raise ValueError(f"Unknown log context field: {field}")
+        _log_context[field].set(value)
+
+
+def get_log_context():
+    return {field: var.get() for field, var in _log_context.items()}
+
+
+class ContextFilter(logging.Filter):
+    # Runs in the caller's thread/task, before the record is queued
+    def filter(self, record):
+        for field, var in _log_context.items():
+            if not hasattr(record, field):
+                setattr(record, field, var.get())
+        return True
+
+
+class JsonLinesFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            'ts': datetime.fromtimestamp(record.created, tz=timezone.utc).isoformat(),
+            'level': record.levelname,
+            'message': record.getMessage(),
+        }
+        for field in CONTEXT_FIELDS:
+            value = getattr(record, field, None)
+            if value is not None:
+                entry[field] = value
+        if record.exc_info:
+            entry['exc_info'] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry['exc_info'] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class SizedTimedRotatingFileHandler(logging.handlers.RotatingFileHandler):
+    # Size-based rotation that also rolls over once per day at local midnight
+    def __init__(self, filename, max_bytes, backup_count, encoding='utf-8'):
+        super().__init__(filename, maxBytes=max_bytes, backupCount=backup_count, encoding=encoding)
+        self.rollover_at = self._next_midnight(time.time())
+
+    @staticmethod
+    def _next_midnight(now):
+        t = time.localtime(now)
+        return time.mktime((t.tm_year, t.tm_mon, t.tm_mday + 1, 0, 0, 0, 0, 0, -1))
+
+    def shouldRollover(self, record):
+        if time.time() >= self.rollover_at:
+            return True
+        return super().shouldRollover(record)
+
+    def doRollover(self):
+        super().doRollover()
+        self.rollover_at = self._next_midnight(time.time())
+
+
+_listener = None
+
 
 def setup_logger():
+    global _listener
+
     logger = logging.getLogger('scraper')
     logger.setLevel(logging.INFO)
-    
-    # Create file handler
-    file_handler = logging.FileHandler('scraper.log')
+    if _listener is not None:
+        return logger
+    if multiprocessing.parent_process() is not None:
+        # Worker processes (e.g. the parse pool) re-import the main module; only the
+        # parent process owns the log files
+        return logger
+
+    # Create formatter for the text handlers (the log viewer parses this format)
+    formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
+
+    # Create rotating file handler
+    file_handler = SizedTimedRotatingFileHandler(LOG_FILE, LOG_MAX_BYTES, LOG_BACKUP_COUNT)
     file_handler.setLevel(logging.INFO)
-    
+    file_handler.setFormatter(formatter)
+
     # Create console handler
     console_handler = logging.StreamHandler()
     console_handler.setLevel(logging.INFO)
-    
-    # Create formatter and add it to the handlers
-    formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
-    file_handler.setFormatter(formatter)
     console_handler.setFormatter(formatter)
-    
-    # Add the handlers to the logger
-    logger.addHandler(file_handler)
-    logger.addHandler(console_handler)
-    
+
+    handlers = [file_handler, console_handler]
+
+    if LOG_JSON:
+        json_handler = SizedTimedRotatingFileHandler(JSON_LOG_FILE, LOG_MAX_BYTES, LOG_BACKUP_COUNT)
+        json_handler.setLevel(logging.INFO)
+        json_handler.setFormatter(JsonLinesFormatter())
+        handlers.append(json_handler)
+
+    # The logger only enqueues records; a background thread does the blocking disk and console writes
+    log_queue = queue.SimpleQueue()
+    queue_handler = logging.handlers.QueueHandler(log_queue)
+    queue_handler.addFilter(ContextFilter())
+    logger.addHandler(queue_handler)
+
+    _listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _listener.start()
+    atexit.register(stop_logger)
+
     return logger
 
+
+def stop_logger():
+    # Flush any queued records and stop the listener thread
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
 # Create and configure the logger
 logger = setup_logger()
 
 def get_logger():
-    return logger
\ No newline at end of file
+    return logger
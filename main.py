@@ -1,26 +1,44 @@
 import asyncio
-import time
-from datetime import datetime, timedelta
+import os
+import threading
+from datetime import datetime
+
 import pytz
-from new_scraper import run_all_counties
+from werkzeug.serving import make_server
+
+from new_scraper import WATCHDOG_ENABLED, browser_launch_options, run_all_counties
 from log_viewer import app as flask_app
-import threading
+from browser_pool import BrowserPool
+from parse_pool import shutdown_parse_pool
+from planner import SCRAPE_CONCURRENCY, SCRAPE_CONCURRENCY_MAX
+from resource_watchdog import AdaptiveLimiter, Watchdog
+from scheduler import CronSchedule, Scheduler
+from slots import build_slots
+from compaction import COMPACT_CRON, compact
+import county_registry
 
 from logger import get_logger
 
 logger = get_logger()
 
-def job():
+JSON_FILE_PATH = 'counties_websites_list.json'
+# Cron expression (US/Eastern) for the nightly run of every county
+SCRAPE_CRON = os.getenv('SCRAPE_CRON', '0 18 * * *')
+# 1: each county runs in its timezone's slot after the local close time; 0: everyone at SCRAPE_CRON
+SCHEDULE_BY_TIMEZONE = os.getenv('SCHEDULE_BY_TIMEZONE', '1') == '1'
+
+
+async def scrape_job(browser_pool, websites=None, concurrency=None, run_label=None, limiter=None):
     est_time = datetime.now(pytz.timezone('US/Eastern'))
     logger.info(f"Starting scraper job at {est_time} EST")
-    
+
     max_retries = 3
     retry_count = 0
-    
+
     while retry_count < max_retries:
         try:
-            json_file_path = 'counties_websites_list.json'
-            asyncio.run(run_all_counties(json_file_path))
+            await run_all_counties(JSON_FILE_PATH, concurrency=concurrency, websites=websites,
+                                   browser_pool=browser_pool, run_label=run_label, limiter=limiter)
             logger.info("Scraper job completed successfully")
             return  # Exit the function if successful
         except Exception as e:
@@ -28,65 +46,62 @@ def job():
             logger.error(f"Error occurred during scraper job (attempt {retry_count}/{max_retries}): {str(e)}", exc_info=True)
             if retry_count < max_retries:
                 logger.info(f"Retrying in 5 minutes...")
-                time.sleep(300)  # Wait for 5 minutes before retrying
-    
+                await asyncio.sleep(300)  # Wait for 5 minutes before retrying
+
     logger.error("FAILED ALL 3 RETRIES")
 
-def run_schedule():
-    est = pytz.timezone('US/Eastern')
-    
-    def schedule_next_run():
-        now = datetime.now(est)
-        next_run = now.replace(hour=18, minute=0, second=0, microsecond=0)
-        if now >= next_run:
-            next_run += timedelta(days=1)
-        return next_run
-    
-    def time_until_next_run():
-        return (schedule_next_run() - datetime.now(est)).total_seconds()
-
-    logger.info("Starting the scraper scheduler")
-    
-    while True:
-        try:
-            # Schedule the next run
-            next_run = schedule_next_run()
-            logger.info(f"Next scraper run scheduled for: {next_run} EST")
-            
-            # Sleep until the next run time
-            sleep_seconds = time_until_next_run()
-            logger.info(f"Sleeping for {sleep_seconds / 3600:.2f} hours until next run")
-            
-            try:
-                time.sleep(sleep_seconds)
-            except KeyboardInterrupt:
-                logger.info("Sleep interrupted by user")
-                raise  # re-raise to be caught by outer try-except
-            
-            # Run the job
-            job()
-        except KeyboardInterrupt:
-            logger.info("Scheduler stopped by user")
-            break
-        except Exception as e:
-            logger.error(f"Error in scheduler loop: {str(e)}", exc_info=True)
-            # Optional: add a short sleep to prevent tight error loops
-            time.sleep(60)
 
-def run_flask():
-    flask_app.run(host='0.0.0.0', port=5000)
+async def compact_job():
+    stats = await asyncio.to_thread(compact)
+    logger.info(f"Compaction: {stats['archived']} files archived, {stats['expired']} raw dumps expired")
+
+
+def start_web_server(scheduler):
+    # The log viewer runs in a thread of this process and reaches the scheduler through app.config
+    flask_app.config['SCHEDULER'] = scheduler
+    server = make_server('0.0.0.0', 5000, flask_app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+async def main():
+    # One long-lived runtime: the browser, parse workers and HTTP session stay warm between jobs
+    browser_pool = BrowserPool(browser_launch_options())
+    # One concurrency limit for all scrape jobs, so overlapping slots don't add up; it starts
+    # at SCRAPE_CONCURRENCY and one watchdog adjusts it (up to SCRAPE_CONCURRENCY_MAX) and
+    # recycles the pool's browser
+    limiter = AdaptiveLimiter(SCRAPE_CONCURRENCY, maximum=SCRAPE_CONCURRENCY_MAX)
+    watchdog = Watchdog(limiter, browser_pool).start() if WATCHDOG_ENABLED else None
+    scheduler = Scheduler()
+    if SCHEDULE_BY_TIMEZONE:
+        county_registry.load_registry(JSON_FILE_PATH)
+        for slot in build_slots():
+            scheduler.add_job(slot['name'], scrape_job, slot['schedule'], browser_pool=browser_pool,
+                              websites=slot['websites'], run_label=slot['name'], limiter=limiter)
+            logger.info(f"{slot['name']}: {len(slot['websites'])} counties")
+        # Every county at once, on demand only
+        scheduler.add_job('nightly', scrape_job, browser_pool=browser_pool, limiter=limiter)
+    else:
+        scheduler.add_job('nightly', scrape_job, CronSchedule(SCRAPE_CRON, 'US/Eastern'), browser_pool=browser_pool,
+                          limiter=limiter)
+    scheduler.add_job('compact', compact_job, CronSchedule(COMPACT_CRON, 'US/Eastern'))
+    server = start_web_server(scheduler)
+    try:
+        await scheduler.run()
+    finally:
+        server.shutdown()
+        if watchdog is not None:
+            await watchdog.stop()
+        await browser_pool.close()
+        shutdown_parse_pool()
+
 
 if __name__ == "__main__":
     try:
-        # Start Flask app in a separate thread
-        flask_thread = threading.Thread(target=run_flask, daemon=True)
-        flask_thread.start()
-        
-        # Run the main scheduler
-        run_schedule()
+        asyncio.run(main())
     except KeyboardInterrupt:
         logger.info("Scheduler stopped by user")
         print("Scheduler stopped by user")
     except Exception as e:
         logger.critical(f"Unexpected error occurred: {str(e)}", exc_info=True)
-        print(f"Unexpected error occurred: {str(e)}")
\ No newline at end of file
+        print(f"Unexpected error occurred: {str(e)}")
@@ -0,0 +1,196 @@
+# monitor.py
+#
+# Live monitoring mode: loads a county's AID list (with the LOAD details) once per day,
+# then polls only the lightweight FNC=UPDATE endpoint for the auctions that are still open,
+# at the server's nextCheck cadence. Auctions sold to a 3rd party are emitted as events
+# (log line + results/<prefix>_<date>_events.ndjson) within one poll interval. Every county
+# is watched from the start, each in its own context of one shared browser; only the
+# loads and polls in flight at a time are limited (MONITOR_CONCURRENCY).
+
+import argparse
+import asyncio
+import json
+import os
+from contextlib import nullcontext
+from datetime import datetime
+
+import aiofiles
+import pytz
+
+from logger import get_logger, set_log_context
+import county_registry
+from browser_pool import BrowserPool
+from county_registry import extract_county_name, get_county_prefix
+from new_scraper import browser_launch_options, fetch_all_pages, fetch_page_info, initialize_session, open_page
+from parsing import clean_auction_row
+from incremental import is_closed
+
+logger = get_logger()
+
+# Poll interval bounds in seconds; the server's nextCheck is clamped to them
+MONITOR_MIN_INTERVAL = float(os.getenv('MONITOR_MIN_INTERVAL', 15))
+MONITOR_MAX_INTERVAL = float(os.getenv('MONITOR_MAX_INTERVAL', 300))
+# Interval multiplier after a poll with no changes (or an error)
+MONITOR_BACKOFF = float(os.getenv('MONITOR_BACKOFF', 1.5))
+# AIDs per UPDATE request, keeps the ref= list a reasonable URL length
+MONITOR_REF_CHUNK = int(os.getenv('MONITOR_REF_CHUNK', 50))
+# Hour, in the county's timezone, after which monitoring stops even if auctions are still open
+MONITOR_UNTIL_HOUR = int(os.getenv('MONITOR_UNTIL_HOUR', 18))
+# Loads and polls in flight at once across all counties (not counties being watched)
+MONITOR_CONCURRENCY = int(os.getenv('MONITOR_CONCURRENCY', 4))
+
+THIRD_PARTY_BIDDER = '3rd Party Bidder'
+
+
+def auction_state(auction):
+    # The fields of an UPDATE item that matter for change detection
+    return (auction['status'].get('message'), auction['status'].get('timestamp'),
+            auction['amount'].get('value'), auction['soldTo'].get('value'))
+
+
+def next_check_seconds(page_info):
+    try:
+        return float(page_info.get('nextCheck'))
+    except (TypeError, ValueError):
+        return None
+
+
+class CountyMonitor:
+    def __init__(self, county_website, auction_date=None, on_event=None):
+        self.county_website = county_website
+        self.timezone = pytz.timezone(county_registry.get_county(county_website)['timezone'])
+        # Today in the county's timezone unless given
+        self.auction_date = auction_date or datetime.now(self.timezone).date()
+        self.formatted_date = self.auction_date.strftime("%m/%d/%Y")
+        self.county_name = extract_county_name(county_website)
+        self.on_event = on_event
+        self.details = {}
+        self.states = {}
+        self.open_aids = []
+        self.emitted = set()
+        self.polls = 0
+        self.requests = 0
+        self.events_path = os.path.join(
+            'results', f"{get_county_prefix(county_website)}_{self.formatted_date.replace('/', '-')}_events.ndjson"
+        )
+
+    async def load(self, page):
+        # One full LOAD pass per day for the details (case #, judgment amount, ...)
+        await initialize_session(page, self.county_website, self.formatted_date)
+        async for merged_page in fetch_all_pages(page, self.county_website):
+            for auction in merged_page['auctions']:
+                self.details[auction['id']] = auction['details']
+                self.states[auction['id']] = auction_state(auction)
+                if is_closed(auction):
+                    # Sold before monitoring started: reported by the nightly scrape instead
+                    self.emitted.add(auction['id'])
+                else:
+                    self.open_aids.append(auction['id'])
+        logger.info(f"Monitoring {len(self.open_aids)} open of {len(self.details)} auctions for {self.county_website}")
+
+    async def poll(self, page):
+        # Returns (changed auction count, server nextCheck in seconds or None)
+        changed = 0
+        next_check = None
+        still_open = []
+        for start in range(0, len(self.open_aids), MONITOR_REF_CHUNK):
+            chunk = self.open_aids[start:start + MONITOR_REF_CHUNK]
+            self.requests += 1
+            page_data = await fetch_page_info(page, self.county_website, chunk)
+            next_check = next_check_seconds(page_data['pageInfo']) or next_check
+            seen = set()
+            for auction in page_data['auctions']:
+                aid = auction['id']
+                seen.add(aid)
+                state = auction_state(auction)
+                if state != self.states.get(aid):
+                    changed += 1
+                    self.states[aid] = state
+                if auction['soldTo'].get('value') == THIRD_PARTY_BIDDER and aid not in self.emitted:
+                    await self.emit(auction)
+                if not is_closed(auction):
+                    still_open.append(aid)
+            # AIDs missing from the response are kept and asked for again
+            still_open.extend(aid for aid in chunk if aid not in seen)
+        self.open_aids = still_open
+        self.polls += 1
+        return changed, next_check
+
+    async def emit(self, auction):
+        self.emitted.add(auction['id'])
+        row = clean_auction_row({**auction, 'details': self.details.get(auction['id'], {})},
+                                self.formatted_date, self.county_name)
+        event = {'type': 'sold_3rd_party', 'aid': auction['id'], 'detected_at': datetime.now().isoformat(), 'row': row}
+        logger.info(f"Sold to 3rd party: {self.county_website} case {row['Case #']} for {row['Sold Amount']} "
+                    f"(excess {row['Excess Amount']})")
+        os.makedirs('results', exist_ok=True)
+        async with aiofiles.open(self.events_path, mode='a', encoding='utf-8') as file:
+            await file.write(json.dumps(event) + '\n')
+        if self.on_event is not None:
+            await self.on_event(event)
+
+    def finished(self):
+        return not self.open_aids or datetime.now(self.timezone).hour >= MONITOR_UNTIL_HOUR
+
+    async def run(self, page, slots=None):
+        # slots bounds the loads and polls in flight across counties; the sleeps between
+        # polls don't hold it
+        slots = slots or nullcontext()
+        async with slots:
+            await self.load(page)
+        interval = MONITOR_MIN_INTERVAL
+        while not self.finished():
+            try:
+                async with slots:
+                    changed, next_check = await self.poll(page)
+            except Exception as e:
+                logger.error(f"Monitor poll failed for {self.county_website}: {str(e)}")
+                interval = min(interval * MONITOR_BACKOFF, MONITOR_MAX_INTERVAL)
+            else:
+                if changed or next_check is None:
+                    # Follow the server while auctions are moving
+                    interval = next_check or MONITOR_MIN_INTERVAL
+                else:
+                    # Nothing changed: back off from the server's suggestion
+                    interval = max(next_check, interval * MONITOR_BACKOFF)
+                interval = min(max(interval, MONITOR_MIN_INTERVAL), MONITOR_MAX_INTERVAL)
+            if not self.finished():
+                await asyncio.sleep(interval)
+        logger.info(f"Monitoring finished for {self.county_website}: {self.polls} polls, {self.requests} UPDATE "
+                    f"requests, {len(self.emitted)} closed, {len(self.open_aids)} still open")
+
+
+async def monitor_county(county_website, auction_date=None, on_event=None, browser_pool=None, slots=None):
+    # Without a browser pool the county gets a browser of its own
+    set_log_context(county=county_website, stage='monitor')
+    monitor = CountyMonitor(county_website, auction_date, on_event)
+    async with open_page(browser_pool) as page:
+        await monitor.run(page, slots)
+    return monitor
+
+
+async def monitor_all_counties(json_file_path, concurrency=None, on_event=None, websites=None):
+    registry = county_registry.load_registry(json_file_path)
+    websites = websites or [entry['website'] for entry in registry.values()]
+    slots = asyncio.Semaphore(concurrency or MONITOR_CONCURRENCY)
+    browser_pool = BrowserPool(browser_launch_options())
+
+    async def run_one(county_website):
+        try:
+            await monitor_county(county_website, on_event=on_event, browser_pool=browser_pool, slots=slots)
+        except Exception as e:
+            logger.error(f"Monitoring failed for {county_website}: {str(e)}")
+
+    try:
+        await asyncio.gather(*(run_one(website) for website in websites))
+    finally:
+        await browser_pool.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Watch today's auctions and report 3rd party sales as they happen")
+    parser.add_argument('websites', nargs='*', help="County websites (default: every county in the list)")
+    parser.add_argument('--concurrency', type=int, default=MONITOR_CONCURRENCY)
+    args = parser.parse_args()
+
+    asyncio.run(monitor_all_counties('counties_websites_list.json', args.concurrency, websites=args.websites))
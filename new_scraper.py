@@ -1,19 +1,35 @@
+import argparse
 import asyncio
 import json
+from contextlib import asynccontextmanager
 from datetime import datetime
 from playwright.async_api import async_playwright
-import aiohttp
-from bs4 import BeautifulSoup
 import aiofiles
-import csv
 import os
 import requests
+import threading
 from dotenv import load_dotenv
-import pytz
-from datetime import date
-import re
 
-from logger import get_logger
+from logger import get_logger, set_log_context
+import run_history
+import results_store
+import latency
+import county_registry
+from county_registry import extract_county_name, get_county_prefix
+from parsing import (
+    COLUMN_NAMES, clean_auction_items, clean_auction_page, merge_auction_and_page_data, parse_auction_payload,
+    parse_auction_payload_partial, parse_page_payload
+)
+from parse_pool import get_parse_pool, shutdown_parse_pool
+from parse_cache import cached_parse, get_parse_cache, payload_key
+from detail_cache import DETAIL_CACHE_ENABLED
+from browser_pool import USER_AGENT, BrowserPool
+from export_writer import EXPORT_FORMATS, ExportWriter, encode_csv_rows
+from profiling import DEFAULT_PROFILE_MODES, parse_modes, profiled
+from planner import SCRAPE_CONCURRENCY, SCRAPE_CONCURRENCY_MAX, estimate_durations, plan_lpt, run_plan
+from health_probe import HEALTHY_STATUSES, probe_all
+from resource_watchdog import AdaptiveLimiter, Watchdog
+from incremental import INCREMENTAL_SCRAPE, ScrapeState
 
 logger = get_logger()
 
@@ -30,25 +46,29 @@ proxy_password = os.getenv('PROXY_PASSWORD')
 
 
 SPREADSHEET_APPS_SCRIPT_URL = os.getenv('SPREADSHEET_APPS_SCRIPT_URL')
-COLUMN_NAMES = [
-    "Auction Date", "County", "Auction Type", "Sold Amount", "Opening Bid",
-    "Excess Amount", "Case #", "Parcel ID", "Property Address", "Property City",
-    "Property State", "Property Zip", "Assessed Value", "Auction Status",
-    "Certificate #", "Sold Date", "Sold To", "Final Judgment Amount",
-    "Plaintiff Max Bid", "Lenders Starting Bid Amount"
-]
-
-def get_county_prefix(county_website):
-    if county_website.startswith(('http://', 'https://')):
-        county_website = county_website.split('://', 1)[1]
-    if county_website.endswith('.com'):
-        county_website = county_website[:-4]
-    return county_website.replace('.', '_')
-
-
-def extract_county_name(county_website):
-    county = county_website.split('.')[0]
-    return county.capitalize()
+# Seconds; LOAD/UPDATE navigations fail after this instead of waiting on Playwright's default
+NAVIGATION_TIMEOUT = float(os.getenv('NAVIGATION_TIMEOUT', 30))
+# Seconds one county may take, all retries included, and the budget for a whole run (0 = none)
+COUNTY_DEADLINE = float(os.getenv('COUNTY_DEADLINE', 1800))
+RUN_DEADLINE = float(os.getenv('RUN_DEADLINE', 0))
+# 1: probe every site with plain HTTP before the run; unhealthy sites run last, or not at all
+# with HEALTH_SKIP_UNHEALTHY=1
+HEALTH_PROBE_BEFORE_RUN = os.getenv('HEALTH_PROBE_BEFORE_RUN', '0') == '1'
+HEALTH_SKIP_UNHEALTHY = os.getenv('HEALTH_SKIP_UNHEALTHY', '0') == '1'
+# 1: the resource watchdog adjusts the concurrency (up to SCRAPE_CONCURRENCY_MAX) and recycles browsers
+WATCHDOG_ENABLED = os.getenv('WATCHDOG_ENABLED', '1') == '1'
+# One session per thread (requests.Session isn't thread-safe and posts run in asyncio.to_thread
+# workers), reused so the connection to Apps Script stays open between counties
+_http_local = threading.local()
+# Auction items whose details came from the detail cache vs. were parsed
+detail_cache_metrics = {'hits': 0, 'misses': 0}
+
+
+def get_http_session():
+    session = getattr(_http_local, 'session', None)
+    if session is None:
+        session = _http_local.session = requests.Session()
+    return session
 
 
 def send_auction_data(auction_date, auction_items):
@@ -74,15 +94,48 @@ def send_auction_data(auction_date, auction_items):
     }
 
     try:
-        response = requests.post(SPREADSHEET_APPS_SCRIPT_URL, json=data)
+        response = get_http_session().post(SPREADSHEET_APPS_SCRIPT_URL, json=data)
         if response.status_code == 200:
             print(f"Successfully sent data for {len(auction_items)} items to Google Sheets.")
             print("Response from server:", response.text)
-        else:
-            print(f"Failed to send data to Google Sheets. Status code: {response.status_code}")
-            print("Response from server:", response.text)
+            return True
+        print(f"Failed to send data to Google Sheets. Status code: {response.status_code}")
+        print("Response from server:", response.text)
     except Exception as e:
         print(f"An error occurred while sending data to Google Sheets: {str(e)}")
+    return False
+
+
+def browser_launch_options():
+    return {
+        "proxy": {
+            "server": f"http://{proxy_host}:{proxy_port}",
+            "username": proxy_username,
+            "password": proxy_password
+        }
+    }
+
+
+async def launch_browser(p):
+    browser = await p.chromium.launch(headless=True, **browser_launch_options())
+    context = await browser.new_context(user_agent=USER_AGENT)
+    page = await context.new_page()
+    return browser, page
+
+
+@asynccontextmanager
+async def open_page(browser_pool=None):
+    # A page from the long-lived browser pool, or a browser launched just for this county
+    if browser_pool is not None:
+        async with browser_pool.page() as page:
+            yield page
+        return
+    async with async_playwright() as p:
+        browser, page = await launch_browser(p)
+        try:
+            yield page
+        finally:
+            await browser.close()
 
 
 async def initialize_session(page, county_website, formatted_date):
@@ -102,363 +155,182 @@ async def initialize_session(page, county_website, formatted_date):
         raise Exception("Failed to initialize session")
 
 
-async def fetch_all_pages(page, county_website):
-    all_auctions = []
+async def fetch_all_pages(page, county_website, stats=None, state=None):
+    # Async generator: yields each merged page as soon as it is ready, so callers can
+    # clean and write it before the next page is downloaded. With a ScrapeState, final
+    # auctions are neither parsed nor asked for again; their stored data is yielded instead.
+    total_auctions = 0
     page_number = 1
     total_pages = None
 
     while True:
-        auction_list = await fetch_auction_list(page, county_website, page_number)
-        parsed_auctions = parse_auction_data(auction_list)
-
-        page_info = await fetch_page_info(page, county_website, parsed_auctions['rlist'])
-        parsed_page_data = parse_page_data(page_info)
-
-        if total_pages is None:
-            total_pages = int(parsed_page_data['pageInfo']['total'])
-            print(f"Total pages: {total_pages}")
-
-        if total_pages == 0:
-            print("No auctions found for this date.")
-            break
-
-        merged_page_data = merge_auction_and_page_data(parsed_auctions, parsed_page_data)
-        all_auctions.extend(merged_page_data['auctions'])
+        with run_history.time_stage(stats, 'fetch'):
+            final_aids = state.final_aids() if state is not None else None
+            parsed_auctions = await fetch_auction_list(page, county_website, page_number, stats, final_aids)
+            if parsed_auctions['rlist']:
+                parsed_page_data = await fetch_page_info(page, county_website, parsed_auctions['rlist'], stats)
+            else:
+                # Every auction on the page is final
+                parsed_page_data = {'pageInfo': state.page_info, 'resetRequired': {}, 'auctions': [], 'remainingTime': []}
+
+            if total_pages is None:
+                total_pages = int(parsed_page_data['pageInfo']['total'])
+                print(f"Total pages: {total_pages}")
+
+            if total_pages == 0:
+                print("No auctions found for this date.")
+                return
+
+            # A dict merge: cheaper on the loop than pickling both inputs to a worker and back
+            merged_page_data = merge_auction_and_page_data(parsed_auctions, parsed_page_data)
+            if state is not None:
+                merged_page_data = state.update_page(merged_page_data, parsed_auctions.get('page_rlist', parsed_auctions['rlist']))
+        total_auctions += len(merged_page_data['auctions'])
+        if stats is not None:
+            stats['pages'] += 1
+            stats['items'] += len(merged_page_data['auctions'])
 
         print(f"Processed page {page_number} of {total_pages}")
+        yield merged_page_data
         page_number += 1
 
         if page_number > total_pages:
-            logger.info(f"Total auctions found: {len(all_auctions)}")
-            break
-
-    return {'auctions': all_auctions, 'pageInfo': parsed_page_data['pageInfo']}
-
-
-
-async def fetch_auction_list(page, county_website, page_number):
+            logger.info(f"Total auctions found: {total_auctions}")
+            return
+
+
+
+async def fetch_endpoint(page, county_website, kind, url):
+    # LOAD/UPDATE are safe to repeat: a slow navigation is hedged with the same request on the
+    # context's API client (same cookies, separate connection), with a timeout from the host's p99
+    histogram = latency.get_histogram(f"{county_website}:{kind}")
+    timeout_ms = histogram.timeout(NAVIGATION_TIMEOUT) * 1000
+    return await latency.hedged(
+        f"{county_website}:{kind}",
+        lambda: page.goto(url, wait_until="networkidle", timeout=timeout_ms),
+        lambda: page.context.request.get(url, timeout=timeout_ms),
+        # Stops the page's navigation when the hedge wins
+        lambda: page.goto('about:blank', timeout=5000)
+    )
+
+
+async def parse_auction_list(body, county_website, skip_aids=None):
+    # Unchanged bodies come from the parse cache. Others are parsed in the parse pool item by
+    # item, leaving out final AIDs and reusing the cached details of repeat listings.
+    if not skip_aids and not DETAIL_CACHE_ENABLED:
+        return await cached_parse(parse_auction_payload, body)
+    key = payload_key(parse_auction_payload, body)
+    if not skip_aids:
+        data = await get_parse_cache().get(key)
+        if data is not None:
+            return data
+    data = await get_parse_pool().run(parse_auction_payload_partial, body, sorted(skip_aids or ()),
+                                      get_county_prefix(county_website) if DETAIL_CACHE_ENABLED else None)
+    detail_cache_metrics['hits'] += data['detail_hits']
+    detail_cache_metrics['misses'] += len(data['rlist']) - data['detail_hits']
+    if not skip_aids:
+        await get_parse_cache().put(key, {'auctions': data['auctions'], 'rlist': data['rlist']})
+    return data
+
+
+async def fetch_auction_list(page, county_website, page_number, stats=None, skip_aids=None):
     max_retries = 3
+    histogram = latency.get_histogram(f"{county_website}:LOAD")
     for attempt in range(max_retries):
         try:
             load_url = f"https://{county_website}/index.cfm?zaction=AUCTION&Zmethod=UPDATE&FNC=LOAD&AREA=C&PageDir=1&doR=0&bypassPage={page_number}"
-            response = await page.goto(load_url, wait_until="networkidle")
+            response = await fetch_endpoint(page, county_website, 'LOAD', load_url)
             
             if response.ok:
-                text = await response.text()
-                data = json.loads(text.strip())
+                body = await response.body()
+                data = await parse_auction_list(body, county_website, skip_aids)
                 print(f"Auction list for page {page_number} fetched successfully")
                 return data
             else:
                 raise ValueError(f"HTTP error: {response.status}")
         except Exception as e:
+            if stats is not None:
+                stats['retries'] += 1
             if attempt < max_retries - 1:
                 print(f"Attempt {attempt + 1} failed: {str(e)}. Retrying...")
-                await asyncio.sleep(1)
+                await asyncio.sleep(histogram.retry_delay(attempt))
             else:
                 print(f"All {max_retries} attempts failed.")
                 raise
 
-async def fetch_page_info(page, county_website, rlist):
+async def fetch_page_info(page, county_website, rlist, stats=None):
     max_retries = 3
+    histogram = latency.get_histogram(f"{county_website}:UPDATE")
     for attempt in range(max_retries):
         try:
             timestamp = int(datetime.now().timestamp() * 1000)
             load_url = f"https://{county_website}/index.cfm?zaction=AUCTION&ZMETHOD=UPDATE&FNC=UPDATE&ref={','.join(rlist)}&tx={timestamp}&_={timestamp - 321}"
             
-            response = await page.goto(load_url, wait_until="networkidle")
+            response = await fetch_endpoint(page, county_website, 'UPDATE', load_url)
             
             if response.ok:
-                text = await response.text()
-                data = json.loads(text.strip())
+                body = await response.body()
+                # Not cached: UPDATE bodies change with every poll
+                data = await get_parse_pool().run(parse_page_payload, body)
                 print('Page info fetched successfully')
                 return data
             else:
                 raise ValueError(f"HTTP error: {response.status}")
         except Exception as e:
+            if stats is not None:
+                stats['retries'] += 1
             if attempt < max_retries - 1:
                 print(f"Attempt {attempt + 1} failed: {str(e)}. Retrying...")
-                await asyncio.sleep(1)
+                await asyncio.sleep(histogram.retry_delay(attempt))
             else:
                 print(f"All {max_retries} attempts failed.")
                 raise
 
-def preprocess_html(html):
-    print('Preprocessing HTML...')
-    replacements = {
-        '@A': '<div class="', '@B': '</div>', '@C': 'class="', '@D': '<div>', 
-        '@E': 'AUCTION', '@F': '</td><td', '@G': '</td></tr>', '@H': '<tr><td ', 
-        '@I': 'table', '@J': 'p_back="NextCheck=', '@K': 'style="Display:none"', 
-        '@L': '/index.cfm?zaction=auction&zmethod=details&AID='
-    }
+def pending_items(state, items, sink):
+    # The (AID, row) pairs sink hasn't received yet; all of them without incremental state
+    return items if state is None else state.pending(items, sink)
 
-    for key, value in replacements.items():
-        html = html.replace(key, value)
-    #print(html)  # For debugging
-    return html
-
-
-def parse_auction_data(data):
-    print('Parsing auction data...')
-    processed_html = preprocess_html(data['retHTML'])
-    #print(processed_html)  # For debugging
-    soup = BeautifulSoup(processed_html, 'html.parser')
-
-    auctions = []
-    for element in soup.select('.AUCTION_ITEM'):
-        item = {}
-        address_parts = []
-        for row in element.select('tr'):
-            label_elem = row.select_one('th')
-            value_elem = row.select_one('td')
-            
-            if label_elem and value_elem:
-                label = label_elem.text.strip().rstrip(':')
-                if label == 'Parcel ID':
-                    value = value_elem.select_one('a').text.strip() if value_elem.select_one('a') else value_elem.text.strip()
-                else:
-                    value = value_elem.text.strip()
-
-                if label == 'Property Address':
-                    address_parts.append(value)
-                elif not label:  # This is likely the continuation of the address
-                    address_parts.append(value)
-                elif label and value:
-                    item[label] = value
-
-        # Combine address parts and split into components
-        full_address = ' '.join(address_parts)
-        address_components = full_address.split(',')
-        if len(address_components) == 2:
-            address_field = address_components[0].strip()
-            address_words = address_field.split()
-            if len(address_words) > 1:
-                item['Property Address'] = ' '.join(address_words[:-1])
-                item['Property City'] = address_words[-1]
-            else:
-                item['Property Address'] = address_field
-                item['Property City'] = address_field
-            state_zip = address_components[1].strip().split('-')
-            if len(state_zip) == 2:
-                item['Property State'] = state_zip[0].strip()
-                item['Property Zip'] = state_zip[1].strip()
-        else:
-            item['Property Address'] = full_address
-            item['Property City'] = ''
-            item['Property State'] = ''
-            item['Property Zip'] = ''
-
-        auctions.append(item)
-
-    print(f"Parsed {len(auctions)} auctions")
-    return {'auctions': auctions, 'rlist': data['rlist'].split(',')}
-
-def parse_page_data(data):
-    print('Parsing page data...')
-    templates = {
-        'A_A': "Auction Starts", 'A_B': "Auction Status", 'PS_A': "NORMAL", 'I_A': "Name on Title (Nickname)",
-        'S_A': "AUCTION_ITEM_PUBLIC", 'S_B': "AUCTION_ITEM", 'P_A': "Hidden",
-        'E_A': "My Proxy Bid", 'E_B': "My Maximum Bid", 'PB_A': "Place Bid"
-    }
-
-    def get_template(i_data, i_field):
-        if i_data in ("A", "B"):
-            return templates.get(f"{i_field}_{i_data}")
-        return False if i_data == "-" else True if i_data == "+" else i_data
-
-    # Check if the expected keys are present in the data
-    if 'CC' not in data or 'CM' not in data:
-        print("Warning: No auction data found.")
-        return {
-            'pageInfo': {
-                'current': 0,
-                'total': 0,
-                'winning': {'count': 0, 'max': 0},
-                'nextCheck': None
-            },
-            'resetRequired': {
-                'all': False, 'regular': False, 'completed': False, 'winning': False
-            },
-            'auctions': [],
-            'remainingTime': []
-        }
-
-    parsed_data = {
-        'pageInfo': {
-            'current': data.get('CC', 0),
-            'total': data.get('CM', 0),
-            'winning': {'count': data.get('WC', 0), 'max': data.get('WM', 0)},
-            'nextCheck': data.get('NC')
-        },
-        'resetRequired': {
-            'all': data.get('RA', False),
-            'regular': data.get('RR', False),
-            'completed': data.get('RC', False),
-            'winning': data.get('RW', False)
-        },
-        'auctions': [],
-        'remainingTime': []
-    }
-
-    if 'ADATA' in data and 'AITEM' in data['ADATA']:
-        parsed_data['auctions'] = [{
-            'id': item.get('AID'),
-            'status': {'message': get_template(item.get('A'), 'A'), 'timestamp': item.get('B')},
-            'amount': {'label': item.get('C'), 'value': item.get('D')},
-            'soldTo': {'label': item.get('SL'), 'value': item.get('ST')},
-            'extraInfo': {
-                'proxyBid': get_template(item.get('E'), 'E'),
-                'F': item.get('F'),
-                'G': item.get('G'),
-                'H': item.get('H'),
-                'nameOnTitle': get_template(item.get('I'), 'I')
-            },
-            'bidInfo': {
-                'placeBid': get_template(item.get('PB'), 'PB'),
-                'showPlaceBid': item.get('SP'),
-                'showBidHistory': item.get('SBH')
-            },
-            'styleInfo': {
-                'panelStatus': get_template(item.get('PS'), "PS"),
-                'itemType': get_template(item.get('S'), 'S'),
-                'priceVisibility': get_template(item.get('P'), 'P')
-            },
-            'lendersStartingBidAmount': item.get('P')
-        } for item in data['ADATA']['AITEM']]
-
-    if 'RTIME' in data and 'RITEM' in data['RTIME']:
-        parsed_data['remainingTime'] = [{
-            'id': item.get('AID'),
-            'timeRemaining': item.get('TREM')
-        } for item in data['RTIME']['RITEM']]
-
-    print(f"Parsed page data with {len(parsed_data['auctions'])} auctions")
-    return parsed_data
-
-
-
-def merge_auction_and_page_data(auctions_data, page_data):
-    print('Merging auction data...')
-    detailed_auction_map = {auctions_data['rlist'][i]: auction for i, auction in enumerate(
-        auctions_data['auctions'])}
-
-    # Save auctions_data and page_data as JSON in results folder
-    os.makedirs('results', exist_ok=True)
-    with open('results/auctions_data.json', 'w') as f:
-        json.dump(auctions_data, f, indent=2)
-    with open('results/page_data.json', 'w') as f:
-        json.dump(page_data, f, indent=2)
-    print('Saved auctions_data.json and page_data.json in results folder')
-    merged_data = {
-        'pageInfo': page_data['pageInfo'],
-        'resetRequired': page_data['resetRequired'],
-        'auctions': [{
-            **update_auction,
-            'details': {
-                'auctionType': detailed_auction_map.get(update_auction['id'], {}).get('Auction Type', ''),
-                'caseNumber': detailed_auction_map.get(update_auction['id'], {}).get('Case #', ''),
-                'finalJudgmentAmount': detailed_auction_map.get(update_auction['id'], {}).get('Final Judgment Amount', ''),
-                'parcelId': detailed_auction_map.get(update_auction['id'], {}).get('Parcel ID', ''),
-                'assessedValue': detailed_auction_map.get(update_auction['id'], {}).get('Assessed Value', ''),
-                'plaintiffMaxBid': detailed_auction_map.get(update_auction['id'], {}).get('Plaintiff Max Bid', ''),
-                'propertyAddress': detailed_auction_map.get(update_auction['id'], {}).get('Property Address', ''),
-                'propertyCity': detailed_auction_map.get(update_auction['id'], {}).get('Property City', ''),
-                'propertyState': detailed_auction_map.get(update_auction['id'], {}).get('Property State', ''),
-                'propertyZip': detailed_auction_map.get(update_auction['id'], {}).get('Property Zip', ''),
-                'certificateNumber': detailed_auction_map.get(update_auction['id'], {}).get('Certificate #', ''),
-                'openingBid': detailed_auction_map.get(update_auction['id'], {}).get('Opening Bid', ''),
-                'lendersStartingBidAmount': update_auction.get('lendersStartingBidAmount', '')
-            }
-        } for update_auction in page_data['auctions']],
-        'rlist': auctions_data['rlist']
-    }
-
-    print(f"Merged data for {len(merged_data['auctions'])} auctions")
-    # Save merged_data as JSON in results folder
-    with open('results/merged_data.json', 'w') as f:
-        json.dump(merged_data, f, indent=2)
-    print('Saved merged_data.json in results folder')
-    return merged_data
 
+def mark_emitted(state, sink, items):
+    # Saved right away: the next sink may fail, and the county's retry reloads the state
+    if state is not None:
+        state.mark_emitted(sink, [aid for aid, _ in items])
+        state.save()
 
 
 def clean_and_filter_auction_data(merged_data, auction_date, county_website):
-    cleaned_data = []
     county_name = extract_county_name(county_website)
     
     if not merged_data['auctions']:
         print(f"No auctions found for {county_name} on {auction_date}")
-        return cleaned_data
-    #print(merged_data['auctions'])
-    for auction in merged_data['auctions']:
-        if auction['soldTo']['value'] == '3rd Party Bidder':
-            try:
-                cleaned_auction = {column: None for column in COLUMN_NAMES}  # Initialize all columns with None
-                
-                cleaned_auction.update({
-                    'Auction Date': auction_date,
-                    'County': county_name,
-                    'Auction Type': auction['details'].get('auctionType', ''),
-                    'Sold Amount': parse_float(auction['amount']['value']),
-                    'Opening Bid': parse_float(auction['details'].get('openingBid', '')),
-                    'Case #': auction['details'].get('caseNumber', '').strip(),
-                    'Parcel ID': auction['details'].get('parcelId', ''),
-                    'Property Address': auction['details'].get('propertyAddress', ''),
-                    'Property City': auction['details'].get('propertyCity', ''),
-                    'Property State': auction['details'].get('propertyState', ''),
-                    'Property Zip': auction['details'].get('propertyZip', ''),
-                    'Assessed Value': parse_float(auction['details'].get('assessedValue', '')),
-                    'Auction Status': auction['status'].get('message', ''),
-                    'Certificate #': auction['details'].get('certificateNumber', ''),
-                    'Sold Date': auction['status'].get('timestamp', ''),
-                    'Sold To': auction['soldTo'].get('value', ''),
-                    'Final Judgment Amount': parse_float(auction['details'].get('finalJudgmentAmount', '')),
-                    'Plaintiff Max Bid': parse_float(auction['details'].get('plaintiffMaxBid', '')),
-                    'Lenders Starting Bid Amount': parse_float(auction['details'].get('lendersStartingBidAmount', ''))
-                })
-                
-                if cleaned_auction['Auction Type'] == 'FORECLOSURE':
-                    if cleaned_auction['Sold Amount'] is not None and cleaned_auction['Final Judgment Amount'] is not None:
-                        cleaned_auction['Excess Amount'] = cleaned_auction['Sold Amount'] - cleaned_auction['Final Judgment Amount']
-                else:
-                    if cleaned_auction['Sold Amount'] is not None and cleaned_auction['Opening Bid'] is not None:
-                        cleaned_auction['Excess Amount'] = cleaned_auction['Sold Amount'] - cleaned_auction['Opening Bid']
-                
-                cleaned_data.append(cleaned_auction)
-            except Exception as e:
-                print(f"Error processing auction: {e}")
+        return []
 
+    cleaned_data = clean_auction_page(merged_data['auctions'], auction_date, county_name)
     logger.info(f"Cleaned and filtered data :  {len(cleaned_data)} auctions")
+    save_cleaned_data(cleaned_data, county_website)
+    return cleaned_data
+
 
+def save_cleaned_data(cleaned_data, county_website):
     # Save cleaned_data as JSON in results folder
     os.makedirs('results', exist_ok=True)
     county_prefix = get_county_prefix(county_website)
     with open(f'results/{county_prefix}_cleaned_data.json', 'w') as f:
         json.dump(cleaned_data, f, indent=2)
     print(f'Saved {county_prefix}_cleaned_data.json in results folder')
-    return cleaned_data
-
 
 
-def parse_float(value):
-    try:
-        return float(value.replace('$', '').replace(',', '')) if value else None
-    except ValueError:
-        print(f"Warning: Could not convert '{value}' to float")
-        return None
 
-
-async def save_to_csv(data, filename, county_website):
+async def save_to_csv(data, filename, county_website, append=False):
     print(f'Saving data to CSV: {filename}')
     os.makedirs('results', exist_ok=True)
     county_prefix = get_county_prefix(county_website)
     filepath = os.path.join('results', f"{county_prefix}_{filename}")
 
-    async with aiofiles.open(filepath, mode='w', newline='', encoding='utf-8') as file:
-        writer = csv.DictWriter(file, fieldnames=COLUMN_NAMES)
-        await file.write(','.join(COLUMN_NAMES) + '\n')  # Write header
-        for row in data:
-            csv_row = {field: (str(row.get(field, '')) if row.get(field) is not None else '') for field in COLUMN_NAMES}
-            await file.write(','.join(csv_row.values()) + '\n')
+    # append=True adds rows to a file started by an earlier call (streaming pages).
+    # Rows are encoded (and quoted) in memory and written with a single call.
+    async with aiofiles.open(filepath, mode='a' if append else 'w', newline='', encoding='utf-8') as file:
+        await file.write(encode_csv_rows(data, COLUMN_NAMES, header=not append))
 
     print(f'Data saved to CSV: {filepath}')
 
@@ -475,6 +347,45 @@ async def save_to_json(data, filename, county_website):
 
     print(f'Data saved to JSON: {filepath}')
 
+
+class JsonStreamWriter:
+    # Writes {"auctions": [...], **extra} one page at a time into a .part file that is
+    # renamed into place on close, so the full auction list never has to be held in memory
+    def __init__(self, filename, county_website):
+        os.makedirs('results', exist_ok=True)
+        county_prefix = get_county_prefix(county_website)
+        self.filepath = os.path.join('results', f"{county_prefix}_{filename}")
+        self.part_path = self.filepath + '.part'
+        self.count = 0
+        self._file = None
+
+    async def write_items(self, items):
+        if self._file is None:
+            self._file = await aiofiles.open(self.part_path, mode='w', encoding='utf-8')
+            await self._file.write('{"auctions": [')
+        if not items:
+            return
+        chunk = ',\n'.join(json.dumps(item, indent=2) for item in items)
+        await self._file.write((',\n' if self.count else '\n') + chunk)
+        self.count += len(items)
+
+    async def close(self, extra=None):
+        if self._file is None:
+            await self.write_items([])
+        tail = ''.join(f', {json.dumps(key)}: {json.dumps(value, indent=2)}' for key, value in (extra or {}).items())
+        await self._file.write('\n]' + tail + '}')
+        await self._file.close()
+        self._file = None
+        os.replace(self.part_path, self.filepath)
+        print(f'Data saved to JSON: {self.filepath}')
+
+    async def discard(self):
+        if self._file is not None:
+            await self._file.close()
+            self._file = None
+        if os.path.exists(self.part_path):
+            os.remove(self.part_path)
+
 #new_scraper.py
 def log(message, level='info'):
     if logger:
@@ -485,83 +396,136 @@ def log(message, level='info'):
         elif level == 'warning':
             logger.warning(message)
 
-async def run_new_scraper(county_website, auction_date=None):
-    start_time = time.time()
-
-    if auction_date is None:
-        auction_date = datetime.now().date()  # Use today's date
-    formatted_date = auction_date.strftime("%m/%d/%Y")
-
-    start_time = datetime.now()
-    if logger:
-        logger.info(f"Scraper started for website: {county_website}, date: {formatted_date}")
-    else:
-        print(f"Scraper started for website: {county_website}, date: {formatted_date}")
-
+async def scrape_county(record, county_website, formatted_date, start_time, export_writer=None, browser_pool=None):
     max_browser_retries = 3
     browser_retry_count = 0
 
     while browser_retry_count < max_browser_retries:
         try:
-            async with async_playwright() as p:
-                browser = await p.chromium.launch(
-                    headless=True,
-                    proxy={
-                        "server": f"http://{proxy_host}:{proxy_port}",
-                        "username": proxy_username,
-                        "password": proxy_password
-                    }
-                )
-                context = await browser.new_context(
-                    user_agent='Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-                )
-                page = await context.new_page()
-
+            async with open_page(browser_pool) as page:
                 try:
+                    set_log_context(stage='init')
                     if logger:
                         logger.info(f'Initializing session for {county_website}...')
                     else:
                         print(f'Initializing session for {county_website}...')
-                    await initialize_session(page, county_website, formatted_date)
+                    with run_history.time_stage(record, 'init'):
+                        await initialize_session(page, county_website, formatted_date)
 
+                    set_log_context(stage='fetch')
                     if logger:
                         logger.info(f'Fetching data from all pages for {county_website}...')
                     else:
                         print(f'Fetching data from all pages for {county_website}...')
-                    all_data = await fetch_all_pages(page, county_website)
+                    record['pages'] = record['items'] = 0
+                    county_name = extract_county_name(county_website)
+                    # Rows are appended to a .part file that is renamed once every page is in, so
+                    # a county that fails partway doesn't leave a CSV that looks complete
+                    csv_path = os.path.join('results', f"{get_county_prefix(county_website)}_{formatted_date.replace('/', '-')}.csv")
+                    csv_part_filename = f"{formatted_date.replace('/', '-')}.csv.part"
+                    final_json = JsonStreamWriter(f"{formatted_date.replace('/', '-')}_final.json", county_website)
+                    cleaned_data = []
+                    # (AID, row) pairs of cleaned_data; with incremental state each sink only gets
+                    # the ones it hasn't received yet
+                    cleaned_items = []
+                    page_info = None
+                    state = ScrapeState(county_website, formatted_date) if INCREMENTAL_SCRAPE else None
+
+                    # Each page is cleaned and written as soon as it arrives; only the
+                    # (small) cleaned 3rd-party rows are kept for the Google Sheets post
+                    try:
+                        async for merged_page in fetch_all_pages(page, county_website, record, state):
+                            page_info = merged_page['pageInfo']
+                            with run_history.time_stage(record, 'clean'):
+                                page_items = clean_auction_items(merged_page['auctions'], formatted_date, county_name)
+                                if state is not None:
+                                    state.record_rows(page_items)
+                                page_rows = [row for _, row in page_items]
+                            cleaned_items.extend(page_items)
+                            with run_history.time_stage(record, 'save_json'):
+                                await final_json.write_items(merged_page['auctions'])
+                            if page_rows:
+                                with run_history.time_stage(record, 'save_csv'):
+                                    await save_to_csv(page_rows, csv_part_filename, county_website, append=bool(cleaned_data))
+                                cleaned_data.extend(page_rows)
+                                record['cleaned'] = len(cleaned_data)
+                    except BaseException:
+                        await final_json.discard()
+                        if os.path.exists(csv_path + '.part'):
+                            os.remove(csv_path + '.part')
+                        if state is not None:
+                            # Keeps what was fetched so a retry skips the auctions that are already final
+                            state.save()
+                        raise
 
-                    if logger:
-                        logger.info(f'Cleaning and filtering auction data for {county_website}...')
+                    if cleaned_data:
+                        os.replace(csv_path + '.part', csv_path)
+                        print(f'Data saved to CSV: {csv_path}')
+
+                    set_log_context(stage='clean')
+                    record['cleaned'] = len(cleaned_data)
+                    if record['items'] == 0:
+                        print(f"No auctions found for {county_name} on {formatted_date}")
                     else:
-                        print(f'Cleaning and filtering auction data for {county_website}...')
-                    cleaned_data = clean_and_filter_auction_data(all_data, formatted_date, county_website)
+                        logger.info(f"Cleaned and filtered data :  {len(cleaned_data)} auctions")
+                        save_cleaned_data(cleaned_data, county_website)
+                    sheet_items = pending_items(state, cleaned_items, 'sheets')
+                    if state is not None and state.reused:
+                        logger.info(f"Reused {state.reused} final auctions from the last run, "
+                                    f"{len(sheet_items)} of {len(cleaned_data)} rows new or changed")
 
                     if cleaned_data:
-                        if logger:
-                            logger.info(f'Saving cleaned auction data to CSV for {county_website}...')
-                        else:
-                            print(f'Saving cleaned auction data to CSV for {county_website}...')
-                        csv_filename = f"{formatted_date.replace('/', '-')}.csv"
-                        await save_to_csv(cleaned_data, csv_filename, county_website)
-
+                        set_log_context(stage='save_json')
                         if logger:
                             logger.info(f'Saving final JSON data for {county_website}...')
                         else:
                             print(f'Saving final JSON data for {county_website}...')
-                        json_filename = f"{formatted_date.replace('/', '-')}_final.json"
-                        await save_to_json(all_data, json_filename, county_website)
+                        with run_history.time_stage(record, 'save_json'):
+                            await final_json.close({'pageInfo': page_info})
 
+                    # Each sink is marked in the state as soon as it has its rows, so a retry after a
+                    # later step fails doesn't send them to it again
+                    if sheet_items:
+                        set_log_context(stage='sheets')
                         if logger:
                             logger.info(f'Sending data to Google Sheets for {county_website}...')
                         else:
                             print(f'Sending data to Google Sheets for {county_website}...')
-                        send_auction_data(formatted_date, cleaned_data)
-                    else:
+                        with run_history.time_stage(record, 'sheets'):
+                            sent = await asyncio.to_thread(send_auction_data, formatted_date,
+                                                           [row for _, row in sheet_items])
+                        if sent:
+                            mark_emitted(state, 'sheets', sheet_items)
+                        elif state is not None:
+                            logger.warning(f"Google Sheets post failed for {county_website}; "
+                                           f"{len(sheet_items)} changed rows will be resent next run")
+
+                    # Added once the county has finished, so a browser retry can't duplicate rows
+                    export_items = pending_items(state, cleaned_items, 'export') if export_writer is not None else []
+                    if export_items:
+                        with run_history.time_stage(record, 'export'):
+                            await export_writer.add_rows([row for _, row in export_items])
+                        mark_emitted(state, 'export', export_items)
+
+                    # Indexed copy for /api/auctions; bumps the store version the API caches on
+                    store_items = pending_items(state, cleaned_items, 'store')
+                    if store_items:
+                        with run_history.time_stage(record, 'store'):
+                            await asyncio.to_thread(results_store.store_county_results, county_website,
+                                                    [row for _, row in store_items])
+                        mark_emitted(state, 'store', store_items)
+
+                    if state is not None:
+                        state.save()
+
+                    if not cleaned_data:
+                        await final_json.discard()
                         if logger:
                             logger.info(f"No auction data found for {county_website} on {formatted_date}. Skipping CSV, JSON, and Google Sheets operations.")
                         else:
                             print(f"No auction data found for {county_website} on {formatted_date}. Skipping CSV, JSON, and Google Sheets operations.")
 
+                    set_log_context(stage='done')
                     end_time = datetime.now()
                     elapsed_time = (end_time - start_time).total_seconds()
                     if logger:
@@ -571,6 +535,7 @@ async def run_new_scraper(county_website, auction_date=None):
                         print(f"Scraper completed successfully for {county_website} at: {end_time.isoformat()}")
                         print(f"Total execution time for {county_website}: {elapsed_time:.2f} seconds")
                     
+                    run_history.finish_county_record(record, 'success' if cleaned_data else 'no_data')
                     # If we reach here without exceptions, break the retry loop
                     break
 
@@ -585,11 +550,9 @@ async def run_new_scraper(county_website, auction_date=None):
                     # Re-raise the exception to be caught by the outer try-except
                     raise
 
-                finally:
-                    await browser.close()
-
         except Exception as browser_error:
             browser_retry_count += 1
+            record['retries'] += 1
             if logger:
                 logger.error(f"Browser initialization failed (attempt {browser_retry_count}/{max_browser_retries}): {str(browser_error)}")
             else:
@@ -600,42 +563,184 @@ async def run_new_scraper(county_website, auction_date=None):
                     logger.error(f"Failed to initialize browser after {max_browser_retries} attempts. Aborting scraper for {county_website}.")
                 else:
                     print(f"Failed to initialize browser after {max_browser_retries} attempts. Aborting scraper for {county_website}.")
+                run_history.finish_county_record(record, 'failed', browser_error)
                 break
 
             # Wait before retrying
             await asyncio.sleep(5)
 
 
+async def run_new_scraper(county_website, auction_date=None, run_id=None, export_writer=None, browser_pool=None,
+                          deadline=None, profile=None):
+    start_time = time.time()
+
+    if auction_date is None:
+        auction_date = datetime.now().date()  # Use today's date
+    formatted_date = auction_date.strftime("%m/%d/%Y")
 
-async def run_all_counties(json_file_path):
-    # Load the JSON file
-    with open(json_file_path, 'r') as file:
-        counties_data = json.load(file)
+    start_time = datetime.now()
+    set_log_context(county=county_website, stage='start')
+    record = run_history.new_county_record(run_id or run_history.new_run_id(), county_website, formatted_date)
+    if logger:
+        logger.info(f"Scraper started for website: {county_website}, date: {formatted_date}")
+    else:
+        print(f"Scraper started for website: {county_website}, date: {formatted_date}")
 
-    # Loop through each county website
-    for county_data in counties_data:
-        county_website = county_data['website']
-        
-        print("\n" + "="*50)
-        print(f"Starting scraper for: {county_website}")
-        print("="*50 + "\n")
+    scrape = scrape_county(record, county_website, formatted_date, start_time, export_writer, browser_pool)
+    if profile:
+        # Only this county's coroutine is profiled; profile is True, "all" or e.g. "cpu,memory"
+        scrape = profiled(scrape, get_county_prefix(county_website), record['run_id'], parse_modes(profile))
+    try:
+        await asyncio.wait_for(scrape, deadline)
+    except asyncio.TimeoutError:
+        # Cancelled mid-run: the browser context is closed and the counts so far are kept
+        set_log_context(stage='timeout')
+        logger.error(f"Deadline of {deadline:.0f}s exceeded for {county_website} after {record['pages']} pages")
+        run_history.finish_county_record(record, 'timeout', f"Deadline of {deadline:.0f}s exceeded")
 
-        try:
-            auction_date = datetime(2024, 9, 11)  # September 18, 2024
-            await run_new_scraper(county_website)#, auction_date)
-        except Exception as e:
-            print(f"Error occurred while scraping {county_website}: {str(e)}")
+    try:
+        run_history.record_county(record)
+        county_registry.record_county_result(record)
+    except Exception as e:
+        logger.error(f"Failed to record run history for {county_website}: {str(e)}")
+    return record
+
+
+
+async def run_all_counties(json_file_path, concurrency=None, websites=None, browser_pool=None, run_label=None,
+                           profile_counties=None, profile=DEFAULT_PROFILE_MODES, auction_date=None, limiter=None):
+    # limiter: a concurrency limit shared with other runs (the scheduler's slot jobs); by
+    # default the run makes its own, adjusted by its own watchdog. An explicit concurrency
+    # caps the run; otherwise the watchdog may take it up to SCRAPE_CONCURRENCY_MAX.
+    # Load the counties list into the registry index
+    counties_data = list(county_registry.load_registry(json_file_path).values())
+    if websites is not None:
+        # A slot of the schedule only runs its own counties
+        selected = {website.lower() for website in websites}
+        counties_data = [county_data for county_data in counties_data if county_data['website'].lower() in selected]
+    max_concurrency = concurrency or SCRAPE_CONCURRENCY_MAX
+    concurrency = concurrency or SCRAPE_CONCURRENCY
+    # A run of its own (the CLI) also shares one browser between its counties, so the
+    # watchdog can recycle it when it grows past its memory cap
+    own_browser_pool = browser_pool is None
+    if own_browser_pool:
+        browser_pool = BrowserPool(browser_launch_options())
+
+    run_id = run_history.new_run_id(run_label)
+    set_log_context(run_id=run_id)
+    run_history.start_run(run_id)
+
+    # One consolidated export per auction date for downstream jobs; the runs of every
+    # timezone slot (and backfills of the date) append to it
+    export_writer = None
+    if EXPORT_FORMATS:
+        export_name = f"export_{(auction_date or datetime.now()).strftime('%Y-%m-%d')}"
+        export_writer = ExportWriter(export_name, COLUMN_NAMES, run_id=run_id)
 
-        print("\n" + "="*50)
-        print(f"Finished scraping: {county_website}")
-        print("="*50 + "\n")
+    try:
+        websites = [county_data['website'] for county_data in counties_data]
+        unhealthy = {}
+        if HEALTH_PROBE_BEFORE_RUN:
+            probe_results = await probe_all(websites, probe_id=f"{run_id}-probe")
+            unhealthy = {result['website']: result['status'] for result in probe_results
+                         if result['status'] not in HEALTHY_STATUSES}
+            if HEALTH_SKIP_UNHEALTHY:
+                for county_website, status in unhealthy.items():
+                    logger.error(f"Health probe failed ({status}), skipping {county_website}")
+                    record = run_history.new_county_record(run_id, county_website, (auction_date or datetime.now()).strftime("%m/%d/%Y"))
+                    run_history.record_county(run_history.finish_county_record(record, 'skipped', f"Health probe: {status}"))
+                websites = [website for website in websites if website not in unhealthy]
+
+        # Longest counties first so a slow county doesn't start last and stretch the run
+        durations = estimate_durations(websites)
+        plan = plan_lpt(durations, concurrency, last=unhealthy)
+        logger.info(f"Planned {len(plan['order'])} counties on {plan['workers']} workers, "
+                    f"predicted makespan {plan['predicted_makespan']:.0f}s")
+        run_history.record_run_plan(run_id, plan['workers'], plan['predicted_makespan'])
+
+        run_deadline = time.monotonic() + RUN_DEADLINE if RUN_DEADLINE else None
+        profile_counties = {website.lower() for website in profile_counties or []}
+
+        async def run_county(county_website):
+            deadline = COUNTY_DEADLINE or None
+            if run_deadline is not None:
+                remaining = run_deadline - time.monotonic()
+                if remaining <= 0:
+                    # Out of run budget: recorded as skipped instead of started
+                    logger.error(f"Run deadline exceeded, skipping {county_website}")
+                    record = run_history.new_county_record(run_id, county_website, (auction_date or datetime.now()).strftime("%m/%d/%Y"))
+                    run_history.record_county(run_history.finish_county_record(record, 'skipped', 'Run deadline exceeded'))
+                    return
+                deadline = min(deadline, remaining) if deadline else remaining
+
+            print("\n" + "="*50)
+            print(f"Starting scraper for: {county_website}")
+            print("="*50 + "\n")
 
-        # Optional: Add a delay between scraping different websites
-        await asyncio.sleep(1)  # 5 seconds delay, adjust as needed
+            try:
+                await run_new_scraper(county_website, auction_date=auction_date, run_id=run_id, export_writer=export_writer, browser_pool=browser_pool,
+                                      deadline=deadline,
+                                      profile=profile if county_website.lower() in profile_counties else None)
+            except Exception as e:
+                print(f"Error occurred while scraping {county_website}: {str(e)}")
 
+            print("\n" + "="*50)
+            print(f"Finished scraping: {county_website}")
+            print("="*50 + "\n")
+
+            # Optional: Add a delay between scraping different websites
+            await asyncio.sleep(1)  # 5 seconds delay, adjust as needed
+
+        watchdog = None
+        if limiter is None:
+            limiter = AdaptiveLimiter(plan['workers'], maximum=max_concurrency)
+            watchdog = Watchdog(limiter, browser_pool).start() if WATCHDOG_ENABLED else None
+            run_slots = limiter
+            run_limited = run_county
+        else:
+            # max_concurrency caps this run, the shared limiter all overlapping runs together
+            run_slots = asyncio.Semaphore(max_concurrency)
+
+            async def run_limited(county_website):
+                async with limiter:
+                    await run_county(county_website)
+        try:
+            actual_makespan = await run_plan(plan, run_limited, run_slots)
+        finally:
+            if watchdog is not None:
+                await watchdog.stop()
+                logger.info(f"Watchdog: {watchdog.decreases} decreases, {watchdog.increases} increases, "
+                            f"{watchdog.recycles} browser recycles, final concurrency {limiter.limit}")
+        logger.info(f"Run {run_id} makespan: predicted {plan['predicted_makespan']:.0f}s, actual {actual_makespan:.0f}s")
+        run_history.record_run_plan(run_id, plan['workers'], plan['predicted_makespan'], actual_makespan)
+
+        logger.info(f"Parse cache: {get_parse_cache().stats()}")
+        if DETAIL_CACHE_ENABLED:
+            logger.info(f"Detail cache: {detail_cache_metrics}")
+        logger.info(f"Request latency: {latency.snapshot()}")
+    except BaseException:
+        # A failed run's export is discarded instead of being renamed into place as if complete
+        if export_writer is not None:
+            await export_writer.abort()
+        run_history.finish_run(run_id, 'failed')
+        raise
+    finally:
+        if own_browser_pool:
+            # The long-lived runtime keeps its browser and the parse workers warm between jobs
+            await browser_pool.close()
+            shutdown_parse_pool()
+    if export_writer is not None:
+        await export_writer.close()
+    run_history.finish_run(run_id)
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Scrape today's auction results")
+    parser.add_argument('--profile', nargs='+', metavar='WEBSITE', default=[],
+                        help="Profile these counties into profiles/<run_id>/")
+    parser.add_argument('--profile-modes', default=DEFAULT_PROFILE_MODES, help="Any of cpu,sample,memory or all")
+    args = parser.parse_args()
+
     json_file_path = 'counties_websites_list.json'
     #county_website = "eagle.realforeclose.com"
     # county_website = "coconino.realtaxdeed.com"
@@ -644,6 +749,6 @@ if __name__ == "__main__":
         logger.error(f"Error: The file {json_file_path} does not exist.")
         logger.info("Falling back to default county website...")
         county_website = "manatee.realforeclose.com"
-        asyncio.run(run_new_scraper(county_website))
+        asyncio.run(run_new_scraper(county_website, profile=args.profile_modes if args.profile else None))
     else:
-        asyncio.run(run_all_counties(json_file_path))
+        asyncio.run(run_all_counties(json_file_path, profile_counties=args.profile, profile=args.profile_modes))
@@ -0,0 +1,149 @@
+# parse_cache.py
+#
+# Memoizes the parsing functions from parsing.py by a hash of the raw response body, so a
+# page that comes back unchanged (retries, re-runs) costs one hash instead of a BeautifulSoup
+# parse. Only LOAD bodies are worth it: UPDATE bodies carry timers and change on every poll.
+# An in-memory LRU can be backed by an on-disk tier of JSON files (set PARSE_CACHE_DIR), whose
+# reads and writes run in a worker thread, off the event loop. Cached results are shared
+# between callers and must not be mutated.
+
+import asyncio
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+
+from parse_pool import get_parse_pool
+
+PARSE_CACHE_SIZE = int(os.getenv('PARSE_CACHE_SIZE', 512))
+# Directory for the disk tier, e.g. .parse_cache (empty: memory only)
+PARSE_CACHE_DIR = os.getenv('PARSE_CACHE_DIR', '')
+PARSE_CACHE_DISK_MAX = int(os.getenv('PARSE_CACHE_DISK_MAX', 20000))
+# Disk tier is trimmed to PARSE_CACHE_DISK_MAX entries every this many writes
+PRUNE_EVERY = 200
+
+
+def payload_key(func, raw):
+    if isinstance(raw, str):
+        raw = raw.encode('utf-8')
+    digest = hashlib.blake2b(raw, digest_size=20)
+    digest.update(func.__name__.encode('utf-8'))
+    return digest.hexdigest()
+
+
+class ParseCache:
+    def __init__(self, max_entries=PARSE_CACHE_SIZE, directory=PARSE_CACHE_DIR, disk_max=PARSE_CACHE_DISK_MAX):
+        self.max_entries = max_entries
+        self.directory = directory
+        self.disk_max = disk_max
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._writes = 0
+        self.metrics = {'memory_hits': 0, 'disk_hits': 0, 'misses': 0, 'disk_errors': 0}
+
+    def _disk_path(self, key):
+        return os.path.join(self.directory, key[:2], f"{key}.json")
+
+    def _remember(self, key, value):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def _recall(self, key):
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.metrics['memory_hits'] += 1
+                return self._entries[key]
+        return None
+
+    def _load(self, key):
+        try:
+            with open(self._disk_path(key), 'r', encoding='utf-8') as f:
+                value = json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError):
+            self.metrics['disk_errors'] += 1
+            return None
+        self.metrics['disk_hits'] += 1
+        self._remember(key, value)
+        return value
+
+    def _store(self, key, value):
+        path = self._disk_path(key)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(value, f)
+            os.replace(tmp_path, path)
+        except OSError:
+            self.metrics['disk_errors'] += 1
+            return
+        with self._lock:
+            self._writes += 1
+            prune = self._writes % PRUNE_EVERY == 0
+        if prune:
+            self.prune_disk()
+
+    async def get(self, key):
+        # Memory hits stay on the event loop, disk reads go to a thread
+        value = self._recall(key)
+        if value is None and self.directory:
+            value = await asyncio.to_thread(self._load, key)
+        if value is None:
+            self.metrics['misses'] += 1
+        return value
+
+    async def put(self, key, value):
+        self._remember(key, value)
+        if self.directory:
+            await asyncio.to_thread(self._store, key, value)
+
+    def prune_disk(self):
+        # Drops the least recently written files beyond disk_max
+        files = []
+        for root, _, names in os.walk(self.directory):
+            files.extend(os.path.join(root, name) for name in names if name.endswith('.json'))
+        if len(files) <= self.disk_max:
+            return
+        files.sort(key=lambda path: os.path.getmtime(path))
+        for path in files[:len(files) - self.disk_max]:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def stats(self):
+        lookups = sum(self.metrics[name] for name in ('memory_hits', 'disk_hits', 'misses'))
+        hits = self.metrics['memory_hits'] + self.metrics['disk_hits']
+        return {
+            **self.metrics,
+            'entries': len(self._entries),
+            'hit_rate': round(hits / lookups, 3) if lookups else None,
+        }
+
+
+_cache = None
+
+
+def get_parse_cache():
+    global _cache
+    if _cache is None:
+        _cache = ParseCache()
+    return _cache
+
+
+async def cached_parse(func, raw):
+    # func(raw) from the cache, or parsed in the parse pool and stored
+    cache = get_parse_cache()
+    key = payload_key(func, raw)
+    value = await cache.get(key)
+    if value is None:
+        value = await get_parse_pool().run(func, raw)
+        await cache.put(key, value)
+    return value
@@ -0,0 +1,69 @@
+# parse_pool.py
+#
+# Runs the CPU-bound parsing functions from parsing.py in worker processes so a large
+# page doesn't stall other counties' network I/O on the event loop. At most
+# PARSE_QUEUE_SIZE jobs are in flight; further callers wait (backpressure) instead of
+# queueing unbounded work in the executor.
+
+import asyncio
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+# PARSE_WORKERS=0 parses inline on the event loop (the old behavior)
+PARSE_WORKERS = int(os.getenv('PARSE_WORKERS', min(4, os.cpu_count() or 1)))
+PARSE_QUEUE_SIZE = int(os.getenv('PARSE_QUEUE_SIZE', max(1, PARSE_WORKERS * 2)))
+
+
+class ParsePool:
+    def __init__(self, workers=PARSE_WORKERS, max_pending=PARSE_QUEUE_SIZE):
+        self.workers = workers
+        self.max_pending = max_pending
+        self._executor = None
+        self._slots = None
+
+    def _get_executor(self):
+        if self._executor is None:
+            # spawn: forking a process that runs the logging thread and Playwright is unsafe
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context('spawn')
+            )
+        return self._executor
+
+    async def run(self, func, *args):
+        if self.workers <= 0:
+            return func(*args)
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.max_pending)
+        async with self._slots:
+            loop = asyncio.get_running_loop()
+            try:
+                return await loop.run_in_executor(self._get_executor(), func, *args)
+            except BrokenProcessPool:
+                # A worker died (e.g. OOM killed); start a fresh pool for the next jobs
+                self.shutdown()
+                raise
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+_pool = None
+
+
+def get_parse_pool():
+    global _pool
+    if _pool is None:
+        _pool = ParsePool()
+    return _pool
+
+
+def shutdown_parse_pool():
+    global _pool
+    if _pool is not None:
+        _pool.shutdown()
+        _pool = None
@@ -0,0 +1,358 @@
+# parsing.py
+#
+# Pure parsing of the AUCTION UPDATE endpoints and cleaning of the merged auctions into
+# COLUMN_NAMES rows. Kept free of browser, network and logging imports so it can be loaded
+# cheaply in parse_pool worker processes and by clean_batch.py.
+
+import json
+import os
+import re
+
+from bs4 import BeautifulSoup
+
+import detail_cache
+
+# 1: progress prints and the auctions_data/page_data/merged_data.json dumps in results/.
+# Off by default: these functions run for every page in the parse pool workers, and
+# concurrent counties would overwrite each other's dumps.
+PARSE_DEBUG = os.getenv('PARSE_DEBUG', '0') == '1'
+
+
+def debug(message):
+    if PARSE_DEBUG:
+        print(message)
+
+
+def debug_dump(data, filename):
+    if PARSE_DEBUG:
+        os.makedirs('results', exist_ok=True)
+        with open(os.path.join('results', filename), 'w') as f:
+            json.dump(data, f, indent=2)
+        print(f'Saved {filename} in results folder')
+
+
+def parse_auction_payload(raw):
+    # raw is the LOAD response body (bytes or str)
+    return parse_auction_data(json.loads(raw))
+
+
+def parse_auction_payload_partial(raw, skip_aids, detail_county=None):
+    # Like parse_auction_payload, but the HTML of the items in skip_aids (auctions already
+    # final) is not parsed. 'rlist' only has the parsed AIDs, 'page_rlist' the whole page.
+    # With detail_county, items whose details are in the detail cache aren't parsed either.
+    data = json.loads(raw)
+    rlist = data['rlist'].split(',')
+    skip = set(skip_aids)
+    wanted = [index for index, aid in enumerate(rlist) if aid not in skip]
+    detail_hits = 0
+    if len(wanted) == len(rlist) and detail_county is None:
+        result = parse_auction_data(data)
+    else:
+        items = split_auction_items(preprocess_html(data['retHTML']))
+        if len(items) == len(rlist):
+            keys = {}
+            cached = {}
+            if detail_county is not None:
+                keys = {index: detail_cache.item_key(items[index]) for index in wanted}
+                cached = detail_cache.get_many(detail_county, [key for key in keys.values() if key])
+            auctions = []
+            parsed = []
+            for index in wanted:
+                key = keys.get(index)
+                if key in cached:
+                    auctions.append(cached[key])
+                    detail_hits += 1
+                    continue
+                auction = parse_auction_item(BeautifulSoup(items[index], 'html.parser').select_one('.AUCTION_ITEM'))
+                auctions.append(auction)
+                if key:
+                    parsed.append((key, auction))
+            if detail_county is not None:
+                detail_cache.put_many(detail_county, parsed)
+        else:
+            # Items can't be lined up with the rlist: parse the whole page
+            auctions = parse_auction_data(data)['auctions']
+            auctions = [auctions[index] for index in wanted if index < len(auctions)]
+        result = {'auctions': auctions, 'rlist': [rlist[index] for index in wanted]}
+    result['page_rlist'] = rlist
+    result['detail_hits'] = detail_hits
+    return result
+
+
+def parse_page_payload(raw):
+    # raw is the UPDATE response body (bytes or str)
+    return parse_page_data(json.loads(raw))
+
+
+def preprocess_html(html):
+    debug('Preprocessing HTML...')
+    replacements = {
+        '@A': '<div class="', '@B': '</div>', '@C': 'class="', '@D': '<div>', 
+        '@E': 'AUCTION', '@F': '</td><td', '@G': '</td></tr>', '@H': '<tr><td ', 
+        '@I': 'table', '@J': 'p_back="NextCheck=', '@K': 'style="Display:none"', 
+        '@L': '/index.cfm?zaction=auction&zmethod=details&AID='
+    }
+
+    for key, value in replacements.items():
+        html = html.replace(key, value)
+    #print(html)  # For debugging
+    return html
+
+
+AUCTION_ITEM_START = re.compile(r'<div class="AUCTION_ITEM[\s"]')
+
+
+def split_auction_items(html):
+    # The preprocessed HTML of each auction item, in page order
+    starts = [match.start() for match in AUCTION_ITEM_START.finditer(html)]
+    return [html[start:end] for start, end in zip(starts, starts[1:] + [len(html)])]
+
+
+def parse_auction_data(data):
+    debug('Parsing auction data...')
+    processed_html = preprocess_html(data['retHTML'])
+    #print(processed_html)  # For debugging
+    soup = BeautifulSoup(processed_html, 'html.parser')
+
+    auctions = [parse_auction_item(element) for element in soup.select('.AUCTION_ITEM')]
+
+    debug(f"Parsed {len(auctions)} auctions")
+    return {'auctions': auctions, 'rlist': data['rlist'].split(',')}
+
+
+def parse_auction_item(element):
+    item = {}
+    address_parts = []
+    for row in element.select('tr'):
+        label_elem = row.select_one('th')
+        value_elem = row.select_one('td')
+        
+        if label_elem and value_elem:
+            label = label_elem.text.strip().rstrip(':')
+            if label == 'Parcel ID':
+                value = value_elem.select_one('a').text.strip() if value_elem.select_one('a') else value_elem.text.strip()
+            else:
+                value = value_elem.text.strip()
+
+            if label == 'Property Address':
+                address_parts.append(value)
+            elif not label:  # This is likely the continuation of the address
+                address_parts.append(value)
+            elif label and value:
+                item[label] = value
+
+    # Combine address parts and split into components
+    full_address = ' '.join(address_parts)
+    address_components = full_address.split(',')
+    if len(address_components) == 2:
+        address_field = address_components[0].strip()
+        address_words = address_field.split()
+        if len(address_words) > 1:
+            item['Property Address'] = ' '.join(address_words[:-1])
+            item['Property City'] = address_words[-1]
+        else:
+            item['Property Address'] = address_field
+            item['Property City'] = address_field
+        state_zip = address_components[1].strip().split('-')
+        if len(state_zip) == 2:
+            item['Property State'] = state_zip[0].strip()
+            item['Property Zip'] = state_zip[1].strip()
+    else:
+        item['Property Address'] = full_address
+        item['Property City'] = ''
+        item['Property State'] = ''
+        item['Property Zip'] = ''
+
+    return item
+
+
+def parse_page_data(data):
+    debug('Parsing page data...')
+    templates = {
+        'A_A': "Auction Starts", 'A_B': "Auction Status", 'PS_A': "NORMAL", 'I_A': "Name on Title (Nickname)",
+        'S_A': "AUCTION_ITEM_PUBLIC", 'S_B': "AUCTION_ITEM", 'P_A': "Hidden",
+        'E_A': "My Proxy Bid", 'E_B': "My Maximum Bid", 'PB_A': "Place Bid"
+    }
+
+    def get_template(i_data, i_field):
+        if i_data in ("A", "B"):
+            return templates.get(f"{i_field}_{i_data}")
+        return False if i_data == "-" else True if i_data == "+" else i_data
+
+    # Check if the expected keys are present in the data
+    if 'CC' not in data or 'CM' not in data:
+        print("Warning: No auction data found.")
+        return {
+            'pageInfo': {
+                'current': 0,
+                'total': 0,
+                'winning': {'count': 0, 'max': 0},
+                'nextCheck': None
+            },
+            'resetRequired': {
+                'all': False, 'regular': False, 'completed': False, 'winning': False
+            },
+            'auctions': [],
+            'remainingTime': []
+        }
+
+    parsed_data = {
+        'pageInfo': {
+            'current': data.get('CC', 0),
+            'total': data.get('CM', 0),
+            'winning': {'count': data.get('WC', 0), 'max': data.get('WM', 0)},
+            'nextCheck': data.get('NC')
+        },
+        'resetRequired': {
+            'all': data.get('RA', False),
+            'regular': data.get('RR', False),
+            'completed': data.get('RC', False),
+            'winning': data.get('RW', False)
+        },
+        'auctions': [],
+        'remainingTime': []
+    }
+
+    if 'ADATA' in data and 'AITEM' in data['ADATA']:
+        parsed_data['auctions'] = [{
+            'id': item.get('AID'),
+            'status': {'message': get_template(item.get('A'), 'A'), 'timestamp': item.get('B')},
+            'amount': {'label': item.get('C'), 'value': item.get('D')},
+            'soldTo': {'label': item.get('SL'), 'value': item.get('ST')},
+            'extraInfo': {
+                'proxyBid': get_template(item.get('E'), 'E'),
+                'F': item.get('F'),
+                'G': item.get('G'),
+                'H': item.get('H'),
+                'nameOnTitle': get_template(item.get('I'), 'I')
+            },
+            'bidInfo': {
+                'placeBid': get_template(item.get('PB'), 'PB'),
+                'showPlaceBid': item.get('SP'),
+                'showBidHistory': item.get('SBH')
+            },
+            'styleInfo': {
+                'panelStatus': get_template(item.get('PS'), "PS"),
+                'itemType': get_template(item.get('S'), 'S'),
+                'priceVisibility': get_template(item.get('P'), 'P')
+            },
+            'lendersStartingBidAmount': item.get('P')
+        } for item in data['ADATA']['AITEM']]
+
+    if 'RTIME' in data and 'RITEM' in data['RTIME']:
+        parsed_data['remainingTime'] = [{
+            'id': item.get('AID'),
+            'timeRemaining': item.get('TREM')
+        } for item in data['RTIME']['RITEM']]
+
+    debug(f"Parsed page data with {len(parsed_data['auctions'])} auctions")
+    return parsed_data
+
+
+
+def merge_auction_and_page_data(auctions_data, page_data):
+    debug('Merging auction data...')
+    detailed_auction_map = {auctions_data['rlist'][i]: auction for i, auction in enumerate(
+        auctions_data['auctions'])}
+
+    debug_dump(auctions_data, 'auctions_data.json')
+    debug_dump(page_data, 'page_data.json')
+    merged_data = {
+        'pageInfo': page_data['pageInfo'],
+        'resetRequired': page_data['resetRequired'],
+        'auctions': [{
+            **update_auction,
+            'details': {
+                'auctionType': detailed_auction_map.get(update_auction['id'], {}).get('Auction Type', ''),
+                'caseNumber': detailed_auction_map.get(update_auction['id'], {}).get('Case #', ''),
+                'finalJudgmentAmount': detailed_auction_map.get(update_auction['id'], {}).get('Final Judgment Amount', ''),
+                'parcelId': detailed_auction_map.get(update_auction['id'], {}).get('Parcel ID', ''),
+                'assessedValue': detailed_auction_map.get(update_auction['id'], {}).get('Assessed Value', ''),
+                'plaintiffMaxBid': detailed_auction_map.get(update_auction['id'], {}).get('Plaintiff Max Bid', ''),
+                'propertyAddress': detailed_auction_map.get(update_auction['id'], {}).get('Property Address', ''),
+                'propertyCity': detailed_auction_map.get(update_auction['id'], {}).get('Property City', ''),
+                'propertyState': detailed_auction_map.get(update_auction['id'], {}).get('Property State', ''),
+                'propertyZip': detailed_auction_map.get(update_auction['id'], {}).get('Property Zip', ''),
+                'certificateNumber': detailed_auction_map.get(update_auction['id'], {}).get('Certificate #', ''),
+                'openingBid': detailed_auction_map.get(update_auction['id'], {}).get('Opening Bid', ''),
+                'lendersStartingBidAmount': update_auction.get('lendersStartingBidAmount', '')
+            }
+        } for update_auction in page_data['auctions']],
+        'rlist': auctions_data['rlist']
+    }
+
+    debug(f"Merged data for {len(merged_data['auctions'])} auctions")
+    debug_dump(merged_data, 'merged_data.json')
+    return merged_data
+
+
+COLUMN_NAMES = [
+    "Auction Date", "County", "Auction Type", "Sold Amount", "Opening Bid",
+    "Excess Amount", "Case #", "Parcel ID", "Property Address", "Property City",
+    "Property State", "Property Zip", "Assessed Value", "Auction Status",
+    "Certificate #", "Sold Date", "Sold To", "Final Judgment Amount",
+    "Plaintiff Max Bid", "Lenders Starting Bid Amount"
+]
+FLOAT_FIELDS = [
+    "Sold Amount", "Opening Bid", "Assessed Value", "Final Judgment Amount",
+    "Plaintiff Max Bid", "Lenders Starting Bid Amount"
+]
+
+
+def parse_float(value):
+    try:
+        return float(value.replace('$', '').replace(',', '')) if value else None
+    except ValueError:
+        print(f"Warning: Could not convert '{value}' to float")
+        return None
+
+
+def clean_auction_row(auction, auction_date, county_name):
+    cleaned_auction = {column: None for column in COLUMN_NAMES}  # Initialize all columns with None
+
+    cleaned_auction.update({
+        'Auction Date': auction_date,
+        'County': county_name,
+        'Auction Type': auction['details'].get('auctionType', ''),
+        'Sold Amount': parse_float(auction['amount']['value']),
+        'Opening Bid': parse_float(auction['details'].get('openingBid', '')),
+        'Case #': auction['details'].get('caseNumber', '').strip(),
+        'Parcel ID': auction['details'].get('parcelId', ''),
+        'Property Address': auction['details'].get('propertyAddress', ''),
+        'Property City': auction['details'].get('propertyCity', ''),
+        'Property State': auction['details'].get('propertyState', ''),
+        'Property Zip': auction['details'].get('propertyZip', ''),
+        'Assessed Value': parse_float(auction['details'].get('assessedValue', '')),
+        'Auction Status': auction['status'].get('message', ''),
+        'Certificate #': auction['details'].get('certificateNumber', ''),
+        'Sold Date': auction['status'].get('timestamp', ''),
+        'Sold To': auction['soldTo'].get('value', ''),
+        'Final Judgment Amount': parse_float(auction['details'].get('finalJudgmentAmount', '')),
+        'Plaintiff Max Bid': parse_float(auction['details'].get('plaintiffMaxBid', '')),
+        'Lenders Starting Bid Amount': parse_float(auction['details'].get('lendersStartingBidAmount', ''))
+    })
+
+    if cleaned_auction['Auction Type'] == 'FORECLOSURE':
+        if cleaned_auction['Sold Amount'] is not None and cleaned_auction['Final Judgment Amount'] is not None:
+            cleaned_auction['Excess Amount'] = cleaned_auction['Sold Amount'] - cleaned_auction['Final Judgment Amount']
+    else:
+        if cleaned_auction['Sold Amount'] is not None and cleaned_auction['Opening Bid'] is not None:
+            cleaned_auction['Excess Amount'] = cleaned_auction['Sold Amount'] - cleaned_auction['Opening Bid']
+
+    return cleaned_auction
+
+
+def clean_auction_items(auctions, auction_date, county_name):
+    # -> (AID, cleaned row) pairs of the auctions sold to a 3rd party bidder
+    cleaned_items = []
+    for auction in auctions:
+        if auction['soldTo']['value'] == '3rd Party Bidder':
+            try:
+                cleaned_items.append((auction.get('id'), clean_auction_row(auction, auction_date, county_name)))
+            except Exception as e:
+                print(f"Error processing auction: {e}")
+    return cleaned_items
+
+
+def clean_auction_page(auctions, auction_date, county_name):
+    return [row for _, row in clean_auction_items(auctions, auction_date, county_name)]
@@ -0,0 +1,64 @@
+# planner.py
+#
+# Orders the counties of a run longest-first (LPT scheduling) so the slow counties start
+# while there is still work to pack around them, and runs them under a concurrency limit.
+# Durations come from the county registry's learned averages; counties with no history
+# get the median of the known durations.
+
+import asyncio
+import heapq
+import os
+import statistics
+import time
+
+import county_registry
+
+SCRAPE_CONCURRENCY = int(os.getenv('SCRAPE_CONCURRENCY', 1))
+# How far the resource watchdog may raise the concurrency while there is headroom
+SCRAPE_CONCURRENCY_MAX = max(SCRAPE_CONCURRENCY, int(os.getenv('SCRAPE_CONCURRENCY_MAX', 4)))
+# Used when no county has any history yet
+DEFAULT_DURATION = float(os.getenv('PLANNER_DEFAULT_DURATION', 300))
+
+
+def estimate_durations(websites):
+    known = {}
+    for website in websites:
+        avg_duration = county_registry.get_county(website).get('avg_duration')
+        if avg_duration:
+            known[website] = avg_duration
+    fallback = statistics.median(known.values()) if known else DEFAULT_DURATION
+    return {website: known.get(website, fallback) for website in websites}
+
+
+def plan_lpt(durations, workers, last=()):
+    # Longest job first, each onto the worker that frees up earliest; websites in `last`
+    # (e.g. failing the health probe) go after all the others
+    workers = max(1, workers)
+    order = sorted(durations, key=lambda website: (website in last, -durations[website], website))
+    slots = [(0.0, slot) for slot in range(workers)]
+    assignments = {slot: [] for slot in range(workers)}
+    for website in order:
+        load, slot = heapq.heappop(slots)
+        assignments[slot].append(website)
+        heapq.heappush(slots, (load + durations[website], slot))
+    return {
+        'order': order,
+        'assignments': assignments,
+        'predicted_makespan': round(max(load for load, _ in slots), 3),
+        'workers': workers,
+    }
+
+
+async def run_plan(plan, run_county, slots=None):
+    # Counties are started in LPT order as slots free up, which is the greedy schedule
+    # plan_lpt predicted; returns the actual makespan in seconds. `slots` can be a limiter
+    # whose size changes during the run (resource_watchdog.AdaptiveLimiter).
+    slots = slots or asyncio.Semaphore(plan['workers'])
+    started = time.perf_counter()
+
+    async def run_one(website):
+        async with slots:
+            await run_county(website)
+
+    await asyncio.gather(*(run_one(website) for website in plan['order']))
+    return round(time.perf_counter() - started, 3)
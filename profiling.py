@@ -0,0 +1,181 @@
+# profiling.py
+#
+# On-demand profiling of single counties. The county's coroutine is wrapped so the profilers
+# only run while that coroutine itself is executing on the event loop: other counties running
+# concurrently are neither measured nor slowed down (the sampler thread stays idle while the
+# profiled county is waiting). Work the county hands to other tasks or to the parse pool's
+# processes is not included. Output goes to profiles/<run_id>/<county prefix>/:
+#   cpu.prof / cpu_top.txt   deterministic cProfile stats (pstats, snakeviz, flameprof)
+#   stacks.folded            sampled stacks per stage, for flamegraph.pl or speedscope
+#   memory_top.txt           top allocations; opt-in only ("memory" or "all"), since
+#                            tracemalloc traces every allocation of the process while it runs
+
+import cProfile
+import io
+import os
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+
+from logger import get_log_context
+
+PROFILE_DIR = os.getenv('PROFILE_DIR', 'profiles')
+PROFILE_MODES = ('cpu', 'sample', 'memory')
+# The modes that add no overhead to the counties that aren't profiled
+DEFAULT_PROFILE_MODES = 'cpu,sample'
+SAMPLE_INTERVAL = float(os.getenv('PROFILE_SAMPLE_INTERVAL', 0.005))
+# Frames kept per allocation; more gives deeper tracebacks but slows every allocation
+TRACEMALLOC_FRAMES = int(os.getenv('PROFILE_TRACEMALLOC_FRAMES', 1))
+TOP_ENTRIES = 40
+
+
+def parse_modes(value):
+    # True -> DEFAULT_PROFILE_MODES, "all" -> every mode, otherwise a comma-separated subset of PROFILE_MODES
+    if value is True:
+        value = DEFAULT_PROFILE_MODES
+    if value == 'all':
+        return set(PROFILE_MODES)
+    modes = {mode.strip() for mode in value.split(',') if mode.strip()}
+    unknown = modes - set(PROFILE_MODES)
+    if unknown:
+        raise ValueError(f"Unknown profile modes: {', '.join(sorted(unknown))}")
+    return modes
+
+
+class StackSampler:
+    # Samples the event loop thread's stack, but only while `active` is set
+    def __init__(self, thread_id, interval=SAMPLE_INTERVAL):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.active = False
+        self.stage = None
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='profile-sampler', daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            if not self.active:
+                continue
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            names = []
+            while frame is not None:
+                code = frame.f_code
+                names.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                frame = frame.f_back
+            names.append(f"stage:{self.stage or 'unknown'}")
+            self.stacks[';'.join(reversed(names))] += 1
+
+    def folded(self):
+        return ''.join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+
+class CountyProfile:
+    def __init__(self, county_prefix, run_id, modes):
+        self.directory = os.path.join(PROFILE_DIR, run_id, county_prefix)
+        self.modes = modes
+        self.profiler = cProfile.Profile() if 'cpu' in modes else None
+        self.sampler = StackSampler(threading.get_ident()) if 'sample' in modes else None
+        self._started_tracemalloc = False
+        self._memory_start = None
+        self.cpu_time = 0.0
+
+    def start(self):
+        if self.sampler is not None:
+            self.sampler.start()
+        if 'memory' in self.modes:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start(TRACEMALLOC_FRAMES)
+                self._started_tracemalloc = True
+            self._memory_start = tracemalloc.take_snapshot()
+
+    def resume(self):
+        self._resumed_at = time.process_time()
+        if self.sampler is not None:
+            self.sampler.stage = get_log_context().get('stage')
+            self.sampler.active = True
+        if self.profiler is not None:
+            self.profiler.enable()
+
+    def pause(self):
+        if self.profiler is not None:
+            self.profiler.disable()
+        if self.sampler is not None:
+            self.sampler.active = False
+        self.cpu_time += time.process_time() - self._resumed_at
+
+    def finish(self):
+        os.makedirs(self.directory, exist_ok=True)
+        if self._memory_start is not None:
+            # Snapshot before writing the other reports so their allocations don't show up
+            snapshot = tracemalloc.take_snapshot().filter_traces([
+                tracemalloc.Filter(False, tracemalloc.__file__),
+                tracemalloc.Filter(False, __file__),
+            ])
+            current, peak = tracemalloc.get_traced_memory()
+            if self._started_tracemalloc:
+                tracemalloc.stop()
+            with open(os.path.join(self.directory, 'memory_top.txt'), 'w') as f:
+                f.write(f"traced memory: current {current / 1e6:.1f} MB, peak {peak / 1e6:.1f} MB\n\n")
+                for stat in snapshot.compare_to(self._memory_start, 'lineno')[:TOP_ENTRIES]:
+                    f.write(f"{stat}\n")
+        if self.profiler is not None:
+            self.profiler.dump_stats(os.path.join(self.directory, 'cpu.prof'))
+            report = io.StringIO()
+            pstats.Stats(self.profiler, stream=report).sort_stats('cumulative').print_stats(TOP_ENTRIES)
+            with open(os.path.join(self.directory, 'cpu_top.txt'), 'w') as f:
+                f.write(report.getvalue())
+        if self.sampler is not None:
+            self.sampler.stop()
+            with open(os.path.join(self.directory, 'stacks.folded'), 'w') as f:
+                f.write(self.sampler.folded())
+        with open(os.path.join(self.directory, 'summary.txt'), 'w') as f:
+            f.write(f"modes: {', '.join(sorted(self.modes))}\ncpu time in county coroutine: {self.cpu_time:.3f}s\n")
+        print(f"Profile saved: {self.directory}")
+        return self.directory
+
+
+class _ProfiledCoroutine:
+    # Steps the wrapped coroutine by hand, turning the profilers on only for its own steps
+    def __init__(self, coro, profile):
+        self.coro = coro
+        self.profile = profile
+
+    def __await__(self):
+        value, error = None, None
+        while True:
+            self.profile.resume()
+            try:
+                if error is not None:
+                    yielded = self.coro.throw(error)
+                else:
+                    yielded = self.coro.send(value)
+            except StopIteration as stop:
+                return stop.value
+            finally:
+                self.profile.pause()
+            try:
+                value, error = (yield yielded), None
+            except BaseException as e:
+                value, error = None, e
+
+
+async def profiled(coro, county_prefix, run_id, modes):
+    profile = CountyProfile(county_prefix, run_id, modes)
+    profile.start()
+    try:
+        return await _ProfiledCoroutine(coro, profile)
+    finally:
+        profile.finish()
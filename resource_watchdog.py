@@ -0,0 +1,243 @@
+# resource_watchdog.py
+#
+# Samples CPU and RSS of this process and its children (the Playwright driver and every
+# Chromium process) and keeps the county concurrency under the memory and CPU ceilings with
+# AIMD: the limit is halved when a ceiling is crossed and raised by one while there is
+# headroom. A browser whose process tree grows past BROWSER_MEMORY_CAP_MB is recycled
+# through the browser pool. The latest sample is served as Prometheus metrics at /metrics.
+
+import asyncio
+import os
+import time
+
+import psutil
+
+from logger import get_logger
+
+logger = get_logger()
+
+WATCHDOG_INTERVAL = float(os.getenv('WATCHDOG_INTERVAL', 2))
+# Total RSS of the scraper and its browsers; 0 = 75% of the machine's memory
+MEMORY_CEILING_MB = float(os.getenv('MEMORY_CEILING_MB', 0)) or psutil.virtual_memory().total * 0.75 / 2 ** 20
+# Machine-wide CPU utilisation
+CPU_CEILING_PERCENT = float(os.getenv('CPU_CEILING_PERCENT', 85))
+# RSS of one browser (main process plus its renderers) before it is recycled
+BROWSER_MEMORY_CAP_MB = float(os.getenv('BROWSER_MEMORY_CAP_MB', 1500))
+# The limit only grows while usage is below this share of both ceilings
+HEADROOM = 0.8
+# Seconds between two decreases, so one spike doesn't collapse the limit to 1
+DECREASE_COOLDOWN = float(os.getenv('WATCHDOG_DECREASE_COOLDOWN', 10))
+
+BROWSER_PROCESS_NAMES = ('chrome', 'chromium', 'headless_shell')
+
+
+class AdaptiveLimiter:
+    # Semaphore whose limit can change while tasks hold it (async with limiter: ...)
+    def __init__(self, limit, minimum=1, maximum=None):
+        self.maximum = max(minimum, maximum or limit)
+        self.minimum = minimum
+        self.limit = min(max(limit, minimum), self.maximum)
+        self.active = 0
+        self._changed = asyncio.Condition()
+
+    async def __aenter__(self):
+        async with self._changed:
+            await self._changed.wait_for(lambda: self.active < self.limit)
+            self.active += 1
+
+    async def __aexit__(self, *exc_info):
+        async with self._changed:
+            self.active -= 1
+            self._changed.notify_all()
+
+    async def set_limit(self, limit):
+        limit = min(max(limit, self.minimum), self.maximum)
+        if limit == self.limit:
+            return False
+        async with self._changed:
+            self.limit = limit
+            self._changed.notify_all()
+        return True
+
+    async def increase(self):
+        return await self.set_limit(self.limit + 1)
+
+    async def decrease(self):
+        return await self.set_limit(self.limit // 2)
+
+
+def _is_browser(process):
+    try:
+        return any(name in process.name().lower() for name in BROWSER_PROCESS_NAMES)
+    except psutil.Error:
+        return False
+
+
+class ResourceSampler:
+    def __init__(self):
+        self.process = psutil.Process(os.getpid())
+        # cpu_percent() compares against the previous call, so keep the Process objects
+        self._children = {}
+        psutil.cpu_percent()
+        self.process.cpu_percent()
+
+    def _child(self, child):
+        known = self._children.get(child.pid)
+        if known is None or known.create_time() != child.create_time():
+            known = self._children[child.pid] = child
+            known.cpu_percent()
+        return known
+
+    def sample(self):
+        children = []
+        for child in self.process.children(recursive=True):
+            try:
+                children.append(self._child(child))
+            except psutil.Error:
+                continue
+        self._children = {child.pid: child for child in children}
+
+        python_rss = self.process.memory_info().rss
+        process_cpu = self.process.cpu_percent()
+        browser_rss = 0
+        other_rss = 0
+        # One entry per browser: its main process with all of its descendants
+        browsers = {}
+        by_pid = {}
+        for child in children:
+            try:
+                rss = child.memory_info().rss
+                process_cpu += child.cpu_percent()
+                is_browser = _is_browser(child)
+                parent_pid = child.ppid()
+            except psutil.Error:
+                continue
+            by_pid[child.pid] = (is_browser, parent_pid, rss)
+        for pid, (is_browser, parent_pid, rss) in by_pid.items():
+            if not is_browser:
+                other_rss += rss
+                continue
+            browser_rss += rss
+            root = pid
+            while by_pid.get(by_pid[root][1], (False,))[0]:
+                root = by_pid[root][1]
+            browser = browsers.setdefault(root, {'pid': root, 'rss': 0, 'processes': 0,
+                                                 'started_at': self._children[root].create_time()})
+            browser['rss'] += rss
+            browser['processes'] += 1
+
+        return {
+            'sampled_at': time.time(),
+            'python_rss': python_rss,
+            'browser_rss': browser_rss,
+            'other_rss': other_rss,
+            'total_rss': python_rss + browser_rss + other_rss,
+            'process_cpu_percent': round(process_cpu, 1),
+            'system_cpu_percent': psutil.cpu_percent(),
+            'system_memory_percent': psutil.virtual_memory().percent,
+            'browsers': sorted(browsers.values(), key=lambda browser: browser['started_at']),
+        }
+
+
+_latest = {}
+
+
+def current_sample():
+    # The watchdog's latest sample while a run is going, otherwise a fresh one
+    sample = _latest.get('sample')
+    if sample is not None and time.time() - sample['sampled_at'] < WATCHDOG_INTERVAL * 2:
+        return sample
+    if 'sampler' not in _latest:
+        _latest['sampler'] = ResourceSampler()
+    return _latest['sampler'].sample()
+
+
+class Watchdog:
+    def __init__(self, limiter=None, browser_pool=None, interval=WATCHDOG_INTERVAL):
+        self.limiter = limiter
+        self.browser_pool = browser_pool
+        self.interval = interval
+        self.sampler = ResourceSampler()
+        self.decreases = 0
+        self.increases = 0
+        self.recycles = 0
+        self._last_decrease = 0.0
+        self._task = None
+
+    def start(self):
+        self._task = asyncio.ensure_future(self.run())
+        return self
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.check(self.sampler.sample())
+            except Exception as e:
+                logger.error(f"Watchdog check failed: {str(e)}")
+
+    async def check(self, sample):
+        sample['limit'] = self.limiter.limit if self.limiter is not None else None
+        sample['watchdog'] = {'decreases': self.decreases, 'increases': self.increases, 'recycles': self.recycles}
+        _latest['sample'] = sample
+        memory_mb = sample['total_rss'] / 2 ** 20
+        cpu = sample['system_cpu_percent']
+
+        if self.limiter is not None:
+            now = time.monotonic()
+            if memory_mb > MEMORY_CEILING_MB or cpu > CPU_CEILING_PERCENT:
+                if now - self._last_decrease >= DECREASE_COOLDOWN and await self.limiter.decrease():
+                    self._last_decrease = now
+                    self.decreases += 1
+                    logger.warning(f"Watchdog: RSS {memory_mb:.0f} MB / CPU {cpu:.0f}% over ceiling, "
+                                   f"concurrency down to {self.limiter.limit}")
+            elif memory_mb < MEMORY_CEILING_MB * HEADROOM and cpu < CPU_CEILING_PERCENT * HEADROOM:
+                if await self.limiter.increase():
+                    self.increases += 1
+                    logger.info(f"Watchdog: concurrency up to {self.limiter.limit}")
+
+        for browser in sample['browsers']:
+            if browser['rss'] / 2 ** 20 <= BROWSER_MEMORY_CAP_MB:
+                continue
+            if self.browser_pool is None:
+                logger.warning(f"Watchdog: browser {browser['pid']} uses {browser['rss'] / 2 ** 20:.0f} MB "
+                               "(per-county browsers are closed when the county finishes)")
+            elif self.browser_pool.launched_at and browser['started_at'] >= self.browser_pool.launched_at - 1:
+                # Only the pool's current browser; older ones are already draining
+                if await self.browser_pool.recycle():
+                    logger.warning(f"Watchdog: browser {browser['pid']} used {browser['rss'] / 2 ** 20:.0f} MB, recycled")
+                    self.recycles += 1
+                break
+
+
+def prometheus_metrics(sample):
+    lines = []
+
+    def metric(name, help_text, value, metric_type='gauge', labels=''):
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {metric_type}")
+        lines.append(f"{name}{labels} {value}")
+
+    metric('scraper_python_rss_bytes', 'RSS of the scraper process', sample['python_rss'])
+    metric('scraper_browser_rss_bytes', 'RSS of all browser processes', sample['browser_rss'])
+    metric('scraper_total_rss_bytes', 'RSS of the scraper and all its child processes', sample['total_rss'])
+    metric('scraper_process_cpu_percent', 'CPU of the scraper and its children (100 = one core)',
+           sample['process_cpu_percent'])
+    metric('scraper_system_cpu_percent', 'Machine-wide CPU utilisation', sample['system_cpu_percent'])
+    metric('scraper_system_memory_percent', 'Machine-wide memory utilisation', sample['system_memory_percent'])
+    metric('scraper_browsers', 'Running browser instances', len(sample['browsers']))
+    if sample.get('limit') is not None:
+        metric('scraper_concurrency_limit', 'Current county concurrency limit', sample['limit'])
+    for key, value in (sample.get('watchdog') or {}).items():
+        metric(f"scraper_watchdog_{key}_total", f"Watchdog {key}", value, 'counter')
+    lines.append("# HELP scraper_browser_rss_per_instance_bytes RSS of one browser and its renderers")
+    lines.append("# TYPE scraper_browser_rss_per_instance_bytes gauge")
+    for browser in sample['browsers']:
+        lines.append(f"scraper_browser_rss_per_instance_bytes{{pid=\"{browser['pid']}\"}} {browser['rss']}")
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,312 @@
+# results_store.py
+#
+# Indexed SQLite store of the cleaned 3rd party auction rows, filled after every county
+# run and queried by the /api/auctions endpoint. A version counter in the meta table is
+# bumped on every write so readers can tell when their cached answers are stale.
+# The rollups table (count and sum of Excess Amount per county, auction date and type) is
+# kept up to date by triggers on the auctions table, so rescraping a county replaces its
+# rows' contributions instead of adding them twice.
+
+import argparse
+import glob
+import json
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+RESULTS_DB = os.getenv('RESULTS_DB', 'results.db')
+MAX_PAGE_SIZE = 500
+# Rollup periods -> length of the YYYY-MM-DD prefix they group on
+ROLLUP_PERIODS = {'day': 10, 'month': 7, 'year': 4}
+
+# Output column -> table column
+FIELDS = {
+    'Auction Date': 'auction_date_text',
+    'County': 'county',
+    'Auction Type': 'auction_type',
+    'Sold Amount': 'sold_amount',
+    'Opening Bid': 'opening_bid',
+    'Excess Amount': 'excess_amount',
+    'Case #': 'case_number',
+    'Parcel ID': 'parcel_id',
+    'Property Address': 'property_address',
+    'Property City': 'property_city',
+    'Property State': 'property_state',
+    'Property Zip': 'property_zip',
+    'Assessed Value': 'assessed_value',
+    'Auction Status': 'auction_status',
+    'Certificate #': 'certificate_number',
+    'Sold Date': 'sold_date',
+    'Sold To': 'sold_to',
+    'Final Judgment Amount': 'final_judgment_amount',
+    'Plaintiff Max Bid': 'plaintiff_max_bid',
+    'Lenders Starting Bid Amount': 'lenders_starting_bid_amount',
+}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS auctions (
+    website TEXT NOT NULL,
+    auction_date TEXT NOT NULL,
+    auction_date_text TEXT,
+    county TEXT,
+    auction_type TEXT,
+    sold_amount REAL,
+    opening_bid REAL,
+    excess_amount REAL,
+    case_number TEXT NOT NULL,
+    parcel_id TEXT NOT NULL DEFAULT '',
+    property_address TEXT,
+    property_city TEXT,
+    property_state TEXT,
+    property_zip TEXT,
+    assessed_value REAL,
+    auction_status TEXT,
+    certificate_number TEXT,
+    sold_date TEXT,
+    sold_to TEXT,
+    final_judgment_amount REAL,
+    plaintiff_max_bid REAL,
+    lenders_starting_bid_amount REAL,
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (website, auction_date, case_number, parcel_id)
+);
+CREATE INDEX IF NOT EXISTS idx_auctions_date ON auctions (auction_date);
+CREATE INDEX IF NOT EXISTS idx_auctions_county_date ON auctions (county COLLATE NOCASE, auction_date);
+CREATE INDEX IF NOT EXISTS idx_auctions_excess ON auctions (excess_amount);
+CREATE TABLE IF NOT EXISTS rollups (
+    website TEXT NOT NULL,
+    auction_date TEXT NOT NULL,
+    auction_type TEXT NOT NULL,
+    county TEXT,
+    auctions INTEGER NOT NULL,
+    excess_count INTEGER NOT NULL,
+    excess_total REAL NOT NULL,
+    PRIMARY KEY (website, auction_date, auction_type)
+);
+CREATE INDEX IF NOT EXISTS idx_rollups_date ON rollups (auction_date);
+CREATE TRIGGER IF NOT EXISTS auctions_rollup_insert AFTER INSERT ON auctions BEGIN
+    INSERT INTO rollups (website, auction_date, auction_type, county, auctions, excess_count, excess_total)
+    VALUES (NEW.website, NEW.auction_date, COALESCE(NEW.auction_type, ''), NEW.county, 1,
+            NEW.excess_amount IS NOT NULL, COALESCE(NEW.excess_amount, 0))
+    ON CONFLICT (website, auction_date, auction_type) DO UPDATE SET
+        county = excluded.county,
+        auctions = auctions + 1,
+        excess_count = excess_count + excluded.excess_count,
+        excess_total = excess_total + excluded.excess_total;
+END;
+CREATE TRIGGER IF NOT EXISTS auctions_rollup_delete AFTER DELETE ON auctions BEGIN
+    UPDATE rollups SET
+        auctions = auctions - 1,
+        excess_count = excess_count - (OLD.excess_amount IS NOT NULL),
+        excess_total = excess_total - COALESCE(OLD.excess_amount, 0)
+    WHERE website = OLD.website AND auction_date = OLD.auction_date AND auction_type = COALESCE(OLD.auction_type, '');
+    DELETE FROM rollups
+    WHERE website = OLD.website AND auction_date = OLD.auction_date AND auction_type = COALESCE(OLD.auction_type, '')
+      AND auctions <= 0;
+END;
+CREATE TRIGGER IF NOT EXISTS auctions_rollup_update AFTER UPDATE OF auction_type, county, excess_amount ON auctions BEGIN
+    UPDATE rollups SET
+        auctions = auctions - 1,
+        excess_count = excess_count - (OLD.excess_amount IS NOT NULL),
+        excess_total = excess_total - COALESCE(OLD.excess_amount, 0)
+    WHERE website = OLD.website AND auction_date = OLD.auction_date AND auction_type = COALESCE(OLD.auction_type, '');
+    DELETE FROM rollups
+    WHERE website = OLD.website AND auction_date = OLD.auction_date AND auction_type = COALESCE(OLD.auction_type, '')
+      AND auctions <= 0;
+    INSERT INTO rollups (website, auction_date, auction_type, county, auctions, excess_count, excess_total)
+    VALUES (NEW.website, NEW.auction_date, COALESCE(NEW.auction_type, ''), NEW.county, 1,
+            NEW.excess_amount IS NOT NULL, COALESCE(NEW.excess_amount, 0))
+    ON CONFLICT (website, auction_date, auction_type) DO UPDATE SET
+        county = excluded.county,
+        auctions = auctions + 1,
+        excess_count = excess_count + excluded.excess_count,
+        excess_total = excess_total + excluded.excess_total;
+END;
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+PRIMARY_KEY = ('website', 'auction_date', 'case_number', 'parcel_id')
+
+_lock = threading.Lock()
+_initialized = set()
+
+
+def _open(db_path=None):
+    db_path = db_path or RESULTS_DB
+    conn = sqlite3.connect(db_path, timeout=10)
+    conn.row_factory = sqlite3.Row
+    if db_path not in _initialized:
+        has_rollups = conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'rollups'").fetchone()
+        conn.executescript(SCHEMA)
+        if not has_rollups:
+            # Store created before the rollups existed: fill them once from the rows
+            rebuild_rollups(conn)
+            conn.commit()
+        _initialized.add(db_path)
+    return conn
+
+
+@contextmanager
+def _connect(db_path=None):
+    # Commits or rolls back like sqlite3's own context manager, then closes the connection
+    conn = _open(db_path)
+    try:
+        with conn:
+            yield conn
+    finally:
+        conn.close()
+
+
+def rebuild_rollups(conn):
+    conn.execute("DELETE FROM rollups")
+    conn.execute("""
+        INSERT INTO rollups (website, auction_date, auction_type, county, auctions, excess_count, excess_total)
+        SELECT website, auction_date, COALESCE(auction_type, ''), MAX(county), COUNT(*),
+               COUNT(excess_amount), COALESCE(SUM(excess_amount), 0)
+        FROM auctions
+        GROUP BY website, auction_date, COALESCE(auction_type, '')
+    """)
+
+
+def iso_date(auction_date):
+    # Rows carry MM/DD/YYYY; the table stores YYYY-MM-DD so ranges sort and compare correctly
+    return datetime.strptime(auction_date, '%m/%d/%Y').strftime('%Y-%m-%d')
+
+
+def get_version(db_path=None):
+    # Returns (version, last write time)
+    with _connect(db_path) as conn:
+        rows = dict(conn.execute("SELECT key, value FROM meta WHERE key IN ('version', 'updated_at')").fetchall())
+    return int(rows.get('version', 0)), float(rows.get('updated_at', 0))
+
+
+def store_county_results(county_website, rows, db_path=None):
+    # Rows without a Case # and a Parcel ID would all share one primary key and overwrite
+    # each other (and their rollup contributions), so they are left out
+    keyed = [row for row in rows if (row.get('Case #') or '').strip() or (row.get('Parcel ID') or '').strip()]
+    if len(keyed) < len(rows):
+        print(f"Not storing {len(rows) - len(keyed)} rows of {county_website} without a Case # or Parcel ID")
+    rows = keyed
+    if not rows:
+        return 0
+    now = time.time()
+    columns = ['website', 'auction_date', *FIELDS.values(), 'updated_at']
+    updates = [column for column in columns if column not in PRIMARY_KEY]
+    values = [
+        (county_website, iso_date(row['Auction Date']),
+         *[(row.get(field) or '') if field in ('Case #', 'Parcel ID') else row.get(field) for field in FIELDS],
+         now)
+        for row in rows
+    ]
+    with _lock, _connect(db_path) as conn:
+        conn.executemany(
+            # An upsert (not INSERT OR REPLACE) so the update trigger moves the row's rollup contribution
+            f"INSERT INTO auctions ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))}) "
+            f"ON CONFLICT ({', '.join(PRIMARY_KEY)}) DO UPDATE SET "
+            f"{', '.join(f'{column} = excluded.{column}' for column in updates)}",
+            values
+        )
+        conn.execute("INSERT INTO meta (key, value) VALUES ('version', '1') "
+                     "ON CONFLICT(key) DO UPDATE SET value = CAST(value AS INTEGER) + 1")
+        conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('updated_at', ?)", (str(now),))
+    return len(values)
+
+
+def _filters(county, date_from, date_to, auction_type):
+    # county matches the county name or the website; dates are YYYY-MM-DD, inclusive
+    where = []
+    params = []
+    if county:
+        where.append("(county = ? COLLATE NOCASE OR website = ? COLLATE NOCASE)")
+        params += [county, county]
+    if date_from:
+        where.append("auction_date >= ?")
+        params.append(date_from)
+    if date_to:
+        where.append("auction_date <= ?")
+        params.append(date_to)
+    if auction_type:
+        where.append("auction_type = ? COLLATE NOCASE")
+        params.append(auction_type)
+    return where, params
+
+
+def query_auctions(county=None, date_from=None, date_to=None, auction_type=None, min_excess=None,
+                   page=1, per_page=100, db_path=None):
+    where, params = _filters(county, date_from, date_to, auction_type)
+    if min_excess is not None:
+        where.append("excess_amount >= ?")
+        params.append(min_excess)
+    clause = f"WHERE {' AND '.join(where)}" if where else ''
+    per_page = max(1, min(per_page, MAX_PAGE_SIZE))
+    page = max(1, page)
+
+    with _connect(db_path) as conn:
+        total = conn.execute(f"SELECT COUNT(*) FROM auctions {clause}", params).fetchone()[0]
+        rows = conn.execute(
+            f"SELECT website, {', '.join(FIELDS.values())} FROM auctions {clause} "
+            "ORDER BY auction_date DESC, county, case_number LIMIT ? OFFSET ?",
+            params + [per_page, (page - 1) * per_page]
+        ).fetchall()
+    items = [{'Website': row['website'], **{field: row[column] for field, column in FIELDS.items()}} for row in rows]
+    return {'total': total, 'page': page, 'per_page': per_page, 'items': items}
+
+
+def query_rollups(period='month', county=None, date_from=None, date_to=None, auction_type=None, db_path=None):
+    # Auctions and Excess Amount totals per county, period and auction type, read from the
+    # rollups table (one row per county/day/type) instead of the auction rows
+    if period not in ROLLUP_PERIODS:
+        raise ValueError(f"period must be one of {', '.join(ROLLUP_PERIODS)}")
+    where, params = _filters(county, date_from, date_to, auction_type)
+    clause = f"WHERE {' AND '.join(where)}" if where else ''
+
+    with _connect(db_path) as conn:
+        rows = conn.execute(
+            f"SELECT county, substr(auction_date, 1, {ROLLUP_PERIODS[period]}) AS period, auction_type, "
+            "SUM(auctions) AS auctions, SUM(excess_count) AS excess_count, SUM(excess_total) AS excess_total "
+            f"FROM rollups {clause} "
+            "GROUP BY county COLLATE NOCASE, period, auction_type ORDER BY period DESC, county, auction_type",
+            params
+        ).fetchall()
+    return [
+        {'County': row['county'], 'Period': row['period'], 'Auction Type': row['auction_type'],
+         'Auctions': row['auctions'], 'Excess Count': row['excess_count'],
+         'Excess Total': round(row['excess_total'], 2)}
+        for row in rows
+    ]
+
+
+def website_from_prefix(prefix):
+    # manatee_realforeclose -> manatee.realforeclose.com (get_county_prefix in reverse)
+    return prefix.replace('_', '.') + '.com'
+
+
+def import_results_dir(directory='results', db_path=None):
+    # Loads the existing <prefix>_cleaned_data.json files, e.g. right after upgrading
+    total = 0
+    for path in sorted(glob.glob(os.path.join(directory, '*_cleaned_data.json'))):
+        prefix = os.path.basename(path)[:-len('_cleaned_data.json')]
+        with open(path, 'r') as f:
+            rows = json.load(f)
+        total += store_county_results(website_from_prefix(prefix), rows, db_path)
+        print(f"Imported {len(rows)} rows from {path}")
+    return total
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load cleaned results into the results store")
+    parser.add_argument('--directory', default='results')
+    parser.add_argument('--rebuild-rollups', action='store_true', help="Recompute the rollups from the auction rows")
+    args = parser.parse_args()
+    if args.rebuild_rollups:
+        with _lock, _connect() as conn:
+            rebuild_rollups(conn)
+        print(f"Rebuilt rollups in {RESULTS_DB}")
+        raise SystemExit
+    print(f"Imported {import_results_dir(args.directory)} rows into {RESULTS_DB}")
@@ -0,0 +1,249 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime
+
+DB_PATH = os.getenv('RUN_HISTORY_DB', 'run_history.db')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    run_id TEXT PRIMARY KEY,
+    started_at REAL NOT NULL,
+    ended_at REAL,
+    outcome TEXT,
+    county_count INTEGER DEFAULT 0,
+    concurrency INTEGER,
+    predicted_makespan REAL,
+    actual_makespan REAL
+);
+CREATE TABLE IF NOT EXISTS county_runs (
+    run_id TEXT NOT NULL,
+    website TEXT NOT NULL,
+    county TEXT NOT NULL,
+    auction_date TEXT,
+    started_at REAL NOT NULL,
+    ended_at REAL,
+    duration REAL,
+    stages TEXT,
+    pages INTEGER DEFAULT 0,
+    items INTEGER DEFAULT 0,
+    cleaned INTEGER DEFAULT 0,
+    retries INTEGER DEFAULT 0,
+    outcome TEXT,
+    error TEXT,
+    PRIMARY KEY (run_id, website)
+);
+CREATE INDEX IF NOT EXISTS idx_county_runs_website ON county_runs (website, started_at);
+CREATE TABLE IF NOT EXISTS health_probes (
+    probe_id TEXT NOT NULL,
+    website TEXT NOT NULL,
+    probed_at REAL NOT NULL,
+    status TEXT NOT NULL,
+    http_status INTEGER,
+    latency REAL,
+    blocked INTEGER DEFAULT 0,
+    session_cookie INTEGER DEFAULT 0,
+    cookies TEXT,
+    error TEXT,
+    PRIMARY KEY (probe_id, website)
+);
+CREATE INDEX IF NOT EXISTS idx_health_probes_website ON health_probes (website, probed_at);
+"""
+
+# Columns added after the first release; older databases get them on connect
+RUN_COLUMNS = {
+    'concurrency': 'INTEGER',
+    'predicted_makespan': 'REAL',
+    'actual_makespan': 'REAL',
+}
+
+_lock = threading.Lock()
+_initialized = set()
+
+
+def _migrate(conn):
+    existing = {row['name'] for row in conn.execute("PRAGMA table_info(runs)")}
+    for column, column_type in RUN_COLUMNS.items():
+        if column not in existing:
+            conn.execute(f"ALTER TABLE runs ADD COLUMN {column} {column_type}")
+
+
+def _open(db_path=None):
+    db_path = db_path or DB_PATH
+    conn = sqlite3.connect(db_path, timeout=10)
+    conn.row_factory = sqlite3.Row
+    if db_path not in _initialized:
+        conn.executescript(SCHEMA)
+        _migrate(conn)
+        _initialized.add(db_path)
+    return conn
+
+
+@contextmanager
+def _connect(db_path=None):
+    # Commits on success and rolls back on error like sqlite3's own context manager,
+    # which leaves the connection open; this one also closes it
+    conn = _open(db_path)
+    try:
+        with conn:
+            yield conn
+    finally:
+        conn.close()
+
+
+def new_run_id(label=None):
+    # Sorts by start time; the random part keeps runs started in the same second (a manual
+    # trigger next to a scheduled run, two schedule slots) apart
+    run_id = f"{datetime.now().strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:8]}"
+    return f"{run_id}-{label}" if label else run_id
+
+
+def new_county_record(run_id, county_website, auction_date):
+    return {
+        'run_id': run_id,
+        'website': county_website,
+        'county': county_website.split('.')[0].capitalize(),
+        'auction_date': auction_date,
+        'started_at': time.time(),
+        'ended_at': None,
+        'duration': None,
+        'stages': {},
+        'pages': 0,
+        'items': 0,
+        'cleaned': 0,
+        'retries': 0,
+        'outcome': 'running',
+        'error': None,
+    }
+
+
+@contextmanager
+def time_stage(record, stage):
+    # Accumulates wall time per stage; a stage can run more than once (e.g. browser retries)
+    if record is None:
+        yield
+        return
+    stage_start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - stage_start
+        record['stages'][stage] = round(record['stages'].get(stage, 0.0) + elapsed, 3)
+
+
+def finish_county_record(record, outcome, error=None):
+    record['ended_at'] = time.time()
+    record['duration'] = round(record['ended_at'] - record['started_at'], 3)
+    record['outcome'] = outcome
+    record['error'] = str(error) if error is not None else None
+    return record
+
+
+def start_run(run_id, db_path=None):
+    with _lock, _connect(db_path) as conn:
+        conn.execute(
+            "INSERT OR REPLACE INTO runs (run_id, started_at) VALUES (?, ?)",
+            (run_id, time.time())
+        )
+
+
+def finish_run(run_id, outcome='completed', db_path=None):
+    with _lock, _connect(db_path) as conn:
+        conn.execute(
+            "UPDATE runs SET ended_at = ?, outcome = ?, "
+            "county_count = (SELECT COUNT(*) FROM county_runs WHERE run_id = ?) WHERE run_id = ?",
+            (time.time(), outcome, run_id, run_id)
+        )
+
+
+def record_run_plan(run_id, concurrency, predicted_makespan, actual_makespan=None, db_path=None):
+    with _lock, _connect(db_path) as conn:
+        conn.execute(
+            "UPDATE runs SET concurrency = ?, predicted_makespan = ?, actual_makespan = ? WHERE run_id = ?",
+            (concurrency, predicted_makespan, actual_makespan, run_id)
+        )
+
+
+def record_county(record, db_path=None):
+    with _lock, _connect(db_path) as conn:
+        conn.execute(
+            "INSERT OR REPLACE INTO county_runs (run_id, website, county, auction_date, started_at, ended_at, "
+            "duration, stages, pages, items, cleaned, retries, outcome, error) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (record['run_id'], record['website'], record['county'], record['auction_date'],
+             record['started_at'], record['ended_at'], record['duration'], json.dumps(record['stages']),
+             record['pages'], record['items'], record['cleaned'], record['retries'],
+             record['outcome'], record['error'])
+        )
+
+
+def _county_row(row):
+    result = dict(row)
+    result['stages'] = json.loads(result['stages']) if result['stages'] else {}
+    return result
+
+
+def get_latest_run(db_path=None):
+    with _connect(db_path) as conn:
+        run = conn.execute("SELECT * FROM runs ORDER BY started_at DESC LIMIT 1").fetchone()
+        if run is None:
+            return None
+        counties = conn.execute(
+            "SELECT * FROM county_runs WHERE run_id = ? ORDER BY started_at", (run['run_id'],)
+        ).fetchall()
+    result = dict(run)
+    result['counties'] = [_county_row(row) for row in counties]
+    result['outcomes'] = {}
+    for county in result['counties']:
+        result['outcomes'][county['outcome']] = result['outcomes'].get(county['outcome'], 0) + 1
+    return result
+
+
+def get_county_trend(county_website, limit=30, db_path=None):
+    with _connect(db_path) as conn:
+        rows = conn.execute(
+            "SELECT * FROM county_runs WHERE website = ? ORDER BY started_at DESC LIMIT ?",
+            (county_website, limit)
+        ).fetchall()
+    return [_county_row(row) for row in rows]
+
+
+def get_slowest_counties(limit=10, days=14, db_path=None):
+    since = time.time() - days * 86400
+    with _connect(db_path) as conn:
+        rows = conn.execute(
+            "SELECT website, county, COUNT(*) AS runs, AVG(duration) AS avg_duration, "
+            "MAX(duration) AS max_duration, AVG(pages) AS avg_pages, "
+            "SUM(CASE WHEN outcome = 'failed' THEN 1 ELSE 0 END) AS failures "
+            "FROM county_runs WHERE started_at >= ? AND duration IS NOT NULL "
+            "GROUP BY website ORDER BY avg_duration DESC LIMIT ?",
+            (since, limit)
+        ).fetchall()
+    return [dict(row) for row in rows]
+
+
+def record_health_probe(probe_id, results, db_path=None):
+    with _lock, _connect(db_path) as conn:
+        conn.executemany(
+            "INSERT OR REPLACE INTO health_probes (probe_id, website, probed_at, status, http_status, latency, "
+            "blocked, session_cookie, cookies, error) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            [(probe_id, result['website'], result['probed_at'], result['status'], result['http_status'],
+              result['latency'], result['blocked'], result['session_cookie'], ','.join(result['cookies']),
+              result['error']) for result in results]
+        )
+
+
+def get_latest_health(db_path=None):
+    # The most recent probe of each site
+    with _connect(db_path) as conn:
+        rows = conn.execute(
+            "SELECT h.* FROM health_probes h JOIN ("
+            "SELECT website, MAX(probed_at) AS probed_at FROM health_probes GROUP BY website"
+            ") latest ON h.website = latest.website AND h.probed_at = latest.probed_at "
+            "ORDER BY h.status != 'ok', h.website"
+        ).fetchall()
+    return [dict(row) for row in rows]
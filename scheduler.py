@@ -0,0 +1,212 @@
+# scheduler.py
+#
+# Cron-like job scheduler for the long-lived asyncio runtime in main.py. Each job has an
+# optional cron schedule ("minute hour day month weekday", in its own timezone) and can
+# also be triggered ad hoc. A job never overlaps itself: a due run is skipped while the
+# previous one is still going.
+
+import asyncio
+from datetime import datetime, timedelta
+
+import pytz
+
+from logger import get_logger
+
+logger = get_logger()
+
+CRON_RANGES = [(0, 59), (0, 23), (1, 31), (1, 12), (0, 6)]
+# How far ahead next_after looks before giving up (e.g. "0 0 31 2 *")
+MAX_LOOKAHEAD_DAYS = 366 * 4
+
+
+def parse_cron_field(field, low, high):
+    values = set()
+    for part in field.split(','):
+        step = 1
+        stepped = '/' in part
+        if stepped:
+            part, step = part.split('/', 1)
+            step = int(step)
+        if part == '*':
+            start, end = low, high
+        elif '-' in part:
+            start, end = (int(value) for value in part.split('-', 1))
+        else:
+            # Like cron, "N/S" runs from N to the end of the range
+            start = int(part)
+            end = high if stepped else start
+        if start < low or end > high or start > end or step < 1:
+            raise ValueError(f"Invalid cron field: {field}")
+        values.update(range(start, end + 1, step))
+    return sorted(values)
+
+
+class CronSchedule:
+    def __init__(self, expression, timezone='US/Eastern'):
+        fields = expression.split()
+        if len(fields) != 5:
+            raise ValueError(f"Cron expression needs 5 fields: {expression}")
+        self.expression = expression
+        self.timezone = pytz.timezone(timezone)
+        self.minutes, self.hours, self.days, self.months, self.weekdays = (
+            parse_cron_field(field, low, high) for field, (low, high) in zip(fields, CRON_RANGES)
+        )
+        # Like cron: when both day fields are restricted, either one matching is enough
+        self._day_or_weekday = fields[2] != '*' and fields[4] != '*'
+
+    def _day_matches(self, day):
+        day_ok = day.day in self.days
+        weekday_ok = (day.weekday() + 1) % 7 in self.weekdays
+        if self._day_or_weekday:
+            return day_ok or weekday_ok
+        return day_ok and weekday_ok
+
+    def next_after(self, now):
+        # Next matching time strictly after now (an aware datetime), in the schedule's timezone
+        local_now = now.astimezone(self.timezone)
+        day = local_now.date()
+        for _ in range(MAX_LOOKAHEAD_DAYS):
+            if day.month in self.months and self._day_matches(day):
+                for hour in self.hours:
+                    for minute in self.minutes:
+                        candidate = self.timezone.localize(datetime(day.year, day.month, day.day, hour, minute))
+                        if candidate > local_now:
+                            return candidate
+            day += timedelta(days=1)
+        return None
+
+    def __repr__(self):
+        return f"CronSchedule({self.expression!r}, {self.timezone.zone!r})"
+
+
+class Job:
+    def __init__(self, name, func, schedule=None, kwargs=None):
+        self.name = name
+        self.func = func
+        self.schedule = schedule
+        self.kwargs = kwargs or {}
+        self.next_run = None
+        self.task = None
+        self.last_started = None
+        self.last_finished = None
+        self.last_error = None
+        self.runs = 0
+
+    @property
+    def running(self):
+        return self.task is not None and not self.task.done()
+
+    def status(self):
+        return {
+            'name': self.name,
+            'schedule': repr(self.schedule) if self.schedule else None,
+            'next_run': self.next_run.isoformat() if self.next_run else None,
+            'running': self.running,
+            'runs': self.runs,
+            'last_started': self.last_started,
+            'last_finished': self.last_finished,
+            'last_error': self.last_error,
+        }
+
+
+class Scheduler:
+    def __init__(self):
+        self.jobs = {}
+        self._wakeup = None
+        self._loop = None
+        self._stopping = False
+
+    def add_job(self, name, func, schedule=None, **kwargs):
+        # func is an async callable; kwargs are passed on every run (ad-hoc triggers can add more)
+        job = Job(name, func, schedule, kwargs)
+        if schedule is not None:
+            job.next_run = schedule.next_after(datetime.now(pytz.utc))
+        self.jobs[name] = job
+        self._notify()
+        return job
+
+    def _notify(self):
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    def _start(self, job, **kwargs):
+        if job.running:
+            logger.warning(f"Job {job.name} is still running, skipping this run")
+            return False
+        job.runs += 1
+        job.last_started = datetime.now().isoformat()
+        job.task = asyncio.create_task(self._run_job(job, {**job.kwargs, **kwargs}), name=f"job-{job.name}")
+        return True
+
+    async def _run_job(self, job, kwargs):
+        logger.info(f"Starting job {job.name}")
+        try:
+            await job.func(**kwargs)
+            job.last_error = None
+            logger.info(f"Job {job.name} finished")
+        except asyncio.CancelledError:
+            job.last_error = 'cancelled'
+            raise
+        except Exception as e:
+            job.last_error = str(e)
+            logger.error(f"Job {job.name} failed: {str(e)}", exc_info=True)
+        finally:
+            job.last_finished = datetime.now().isoformat()
+
+    def trigger(self, name, **kwargs):
+        # Ad-hoc run from the event loop; returns False if the job is already running
+        job = self.jobs.get(name)
+        if job is None:
+            raise KeyError(name)
+        return self._start(job, **kwargs)
+
+    def trigger_threadsafe(self, name, timeout=5, **kwargs):
+        # For callers outside the event loop (the Flask thread); the loop only exists while run() is going
+        loop = self._loop
+        if loop is None or loop.is_closed():
+            raise RuntimeError("Scheduler is not running")
+
+        async def trigger():
+            return self.trigger(name, **kwargs)
+        return asyncio.run_coroutine_threadsafe(trigger(), loop).result(timeout)
+
+    def status(self):
+        return [job.status() for job in self.jobs.values()]
+
+    async def run(self):
+        self._loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+        logger.info("Starting the scraper scheduler")
+        for job in self.jobs.values():
+            if job.next_run:
+                logger.info(f"Job {job.name} next run: {job.next_run}")
+
+        while not self._stopping:
+            now = datetime.now(pytz.utc)
+            for job in self.jobs.values():
+                if job.next_run is not None and job.next_run <= now:
+                    self._start(job)
+                    job.next_run = job.schedule.next_after(now)
+                    logger.info(f"Job {job.name} next run: {job.next_run}")
+
+            pending = [job.next_run for job in self.jobs.values() if job.next_run is not None]
+            timeout = None
+            if pending:
+                timeout = max(0.0, (min(pending) - datetime.now(pytz.utc)).total_seconds())
+                # Wake up at least hourly so clock changes and suspends can't push a run far out
+                timeout = min(timeout, 3600)
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+        running = [job.task for job in self.jobs.values() if job.running]
+        for task in running:
+            task.cancel()
+        await asyncio.gather(*running, return_exceptions=True)
+        self._loop = None
+
+    def stop(self):
+        self._stopping = True
+        self._notify()
@@ -1,7 +1,11 @@
+import argparse
+import asyncio
+import random
 import requests
 import os
 import json
 import logging
+import time
 from dotenv import load_dotenv
 from requests.packages.urllib3.exceptions import InsecureRequestWarning
 from urllib.parse import urlparse
@@ -14,40 +18,51 @@ logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(
 # Suppress only the single InsecureRequestWarning
 requests.packages.urllib3.disable_warnings(InsecureRequestWarning)
 
-def make_requests_with_proxy():
-    logging.info("Starting the request process...")
-    
-    url = 'https://manatee.realforeclose.com/index.cfm'
-    
-    headers = {
-        'accept': 'application/json, text/javascript, */*; q=0.01',
-        'accept-language': 'en-US,en;q=0.9',
-        'cache-control': 'no-cache',
-        'content-type': 'application/x-www-form-urlencoded; charset=UTF-8',
-        'origin': 'https://manatee.realforeclose.com',
-        'pragma': 'no-cache',
-        'priority': 'u=1, i',
-        'referer': 'https://manatee.realforeclose.com/index.cfm?zaction=AUCTION&zmethod=PREVIEW&AuctionDate=09/18/2024',
-        'sec-ch-ua': '"Chromium";v="129", "Not=A?Brand";v="8"',
-        'sec-ch-ua-mobile': '?0',
-        'sec-ch-ua-platform': '"Windows"',
-        'sec-fetch-dest': 'empty',
-        'sec-fetch-mode': 'cors',
-        'sec-fetch-site': 'same-origin',
-        'user-agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
-        'x-requested-with': 'XMLHttpRequest'
-    }
+URL = 'https://manatee.realforeclose.com/index.cfm'
+
+HEADERS = {
+    'accept': 'application/json, text/javascript, */*; q=0.01',
+    'accept-language': 'en-US,en;q=0.9',
+    'cache-control': 'no-cache',
+    'content-type': 'application/x-www-form-urlencoded; charset=UTF-8',
+    'origin': 'https://manatee.realforeclose.com',
+    'pragma': 'no-cache',
+    'priority': 'u=1, i',
+    'referer': 'https://manatee.realforeclose.com/index.cfm?zaction=AUCTION&zmethod=PREVIEW&AuctionDate=09/18/2024',
+    'sec-ch-ua': '"Chromium";v="129", "Not=A?Brand";v="8"',
+    'sec-ch-ua-mobile': '?0',
+    'sec-ch-ua-platform': '"Windows"',
+    'sec-fetch-dest': 'empty',
+    'sec-fetch-mode': 'cors',
+    'sec-fetch-site': 'same-origin',
+    'user-agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
+    'x-requested-with': 'XMLHttpRequest'
+}
 
-    site_ids = [72, 69, 77, 48, 82, 106, 100, 97, 93, 58, 78, 105, 13, 73, 29, 17, 107, 3, 35, 30, 67, 68, 2, 32, 19, 18, 53, 51, 81, 55, 95, 96, 41, 56, 38, 64, 25, 54, 101, 102, 37, 8, 7, 44, 49, 42, 79, 26, 71, 15, 27, 92, 16, 65, 90, 21, 22, 31, 34, 99, 14, 50, 23, 24, 20, 28, 57, 74, 66, 45, 52, 11, 70, 103, 84, 43, 10, 6, 108, 76, 109, 86]
+SITE_IDS = [72, 69, 77, 48, 82, 106, 100, 97, 93, 58, 78, 105, 13, 73, 29, 17, 107, 3, 35, 30, 67, 68, 2, 32, 19, 18, 53, 51, 81, 55, 95, 96, 41, 56, 38, 64, 25, 54, 101, 102, 37, 8, 7, 44, 49, 42, 79, 26, 71, 15, 27, 92, 16, 65, 90, 21, 22, 31, 34, 99, 14, 50, 23, 24, 20, 28, 57, 74, 66, 45, 52, 11, 70, 103, 84, 43, 10, 6, 108, 76, 109, 86]
 
-    proxy_host = 'shared-datacenter.geonode.com'
-    proxy_port = '9008'
+DEFAULT_COUNTIES_FILE = 'counties_websites_list.json'
+VENDOR_CACHE_FILE = 'vendor_responses_cache.json'
+# Cached LOGIN/SWITCH responses are reused for this long (vendor URLs rarely change)
+VENDOR_CACHE_TTL = int(os.getenv('VENDOR_CACHE_TTL', 7 * 86400))
+
+
+PROXY_HOST = 'shared-datacenter.geonode.com'
+PROXY_PORT = '9008'
+
+
+def get_proxy_url():
     proxy_username = os.getenv('PROXY_USERNAME')
     proxy_password = os.getenv('PROXY_PASSWORD')
+    return f"http://{proxy_username}:{proxy_password}@{PROXY_HOST}:{PROXY_PORT}"
+
 
-    logging.info(f"Using proxy: {proxy_host}:{proxy_port}")
+def make_requests_with_proxy():
+    logging.info("Starting the request process...")
+    
+    logging.info(f"Using proxy: {PROXY_HOST}:{PROXY_PORT}")
 
-    proxy_url = f"http://{proxy_username}:{proxy_password}@{proxy_host}:{proxy_port}"
+    proxy_url = get_proxy_url()
 
     proxies = {
         'http': proxy_url,
@@ -55,12 +70,12 @@ def make_requests_with_proxy():
     }
 
     results = []
-    total_requests = len(site_ids)
+    total_requests = len(SITE_IDS)
 
     session = requests.Session()
     session.proxies.update(proxies)
 
-    for index, vendor_id in enumerate(site_ids, start=1):
+    for index, vendor_id in enumerate(SITE_IDS, start=1):
         logging.info(f"Processing request {index}/{total_requests} for vendor ID: {vendor_id}")
         
         data = {
@@ -72,10 +87,10 @@ def make_requests_with_proxy():
 
         for attempt in range(3):  # 3 retry attempts without delay
             try:
-                logging.info(f"Sending request to {url}... (Attempt {attempt + 1})")
+                logging.info(f"Sending request to {URL}... (Attempt {attempt + 1})")
                 response = session.post(
-                    url,
-                    headers=headers,
+                    URL,
+                    headers=HEADERS,
                     data=data,
                     timeout=30,
                     verify=False
@@ -83,10 +98,7 @@ def make_requests_with_proxy():
                 response.raise_for_status()
                 logging.info(f"Request successful. Status code: {response.status_code}")
                 
-                # Print the full response
-                print(f"\nFull response for vendor ID {vendor_id}:")
-                print(response.text.strip())
-                print("\n" + "-"*50 + "\n")  # Separator for readability
+                logging.debug(f"Full response for vendor ID {vendor_id}: {response.text.strip()}")
                 
                 results.append({
                     'vendor_id': vendor_id,
@@ -106,6 +118,164 @@ def make_requests_with_proxy():
     return results
 
 
+def load_vendor_cache(path=VENDOR_CACHE_FILE):
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path, 'r') as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError) as e:
+        logging.warning(f"Ignoring unreadable vendor cache {path}: {str(e)}")
+        return {}
+
+
+def save_vendor_cache(cache, path=VENDOR_CACHE_FILE):
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(cache, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+async def fetch_vendor(session, vendor_id, proxy_url, semaphore, max_retries=3):
+    data = {
+        'ZACTION': 'AJAX',
+        'ZMETHOD': 'LOGIN',
+        'func': 'SWITCH',
+        'VENDOR': str(vendor_id)
+    }
+    last_error = None
+    for attempt in range(max_retries):
+        try:
+            async with semaphore:
+                async with session.post(URL, headers=HEADERS, data=data, proxy=proxy_url, ssl=False) as response:
+                    text = await response.text()
+                    response.raise_for_status()
+            logging.info(f"Vendor ID {vendor_id}: status {response.status}")
+            logging.debug(f"Full response for vendor ID {vendor_id}: {text.strip()}")
+            return {'vendor_id': vendor_id, 'status_code': response.status, 'response': text}
+        except Exception as e:
+            last_error = e
+            logging.warning(f"Vendor ID {vendor_id}: attempt {attempt + 1}/{max_retries} failed: {str(e)}")
+            if attempt < max_retries - 1:
+                # Exponential backoff with jitter so retries don't all land at once
+                await asyncio.sleep(2 ** attempt + random.uniform(0, 1))
+    return {'vendor_id': vendor_id, 'error': str(last_error)}
+
+
+async def make_requests_async(site_ids=None, concurrency=10, use_cache=True, cache_path=VENDOR_CACHE_FILE):
+    # Concurrent version of make_requests_with_proxy; fresh cached responses are reused
+    import aiohttp
+
+    site_ids = SITE_IDS if site_ids is None else site_ids
+    cache = load_vendor_cache(cache_path) if use_cache else {}
+    now = time.time()
+
+    results = {}
+    to_fetch = []
+    for vendor_id in site_ids:
+        cached = cache.get(str(vendor_id))
+        if cached and now - cached['fetched_at'] < VENDOR_CACHE_TTL:
+            results[vendor_id] = {'vendor_id': vendor_id, 'status_code': cached['status_code'],
+                                  'response': cached['response'], 'cached': True}
+        else:
+            to_fetch.append(vendor_id)
+
+    logging.info(f"Discovering {len(to_fetch)} vendors ({len(results)} from cache, concurrency {concurrency})")
+
+    semaphore = asyncio.Semaphore(concurrency)
+    timeout = aiohttp.ClientTimeout(total=30)
+    async with aiohttp.ClientSession(timeout=timeout) as session:
+        fetched = await asyncio.gather(*[
+            fetch_vendor(session, vendor_id, get_proxy_url(), semaphore) for vendor_id in to_fetch
+        ])
+
+    for result in fetched:
+        results[result['vendor_id']] = result
+        if 'response' in result:
+            cache[str(result['vendor_id'])] = {
+                'fetched_at': now,
+                'status_code': result['status_code'],
+                'response': result['response']
+            }
+    if use_cache:
+        save_vendor_cache(cache, cache_path)
+
+    # Keep the SITE_IDS order so the generated list is stable between refreshes
+    return [results[vendor_id] for vendor_id in site_ids]
+
+
+def extract_website(item):
+    # Returns the county hostname from a LOGIN/SWITCH response, '' when the vendor has no
+    # site URL, or None when the response can't be read
+    try:
+        full_url = json.loads(item['response']).get('URL', '')
+    except (json.JSONDecodeError, AttributeError):
+        logging.error(f"Failed to parse JSON for vendor ID {item['vendor_id']}")
+        return None
+    return urlparse(full_url or '').netloc
+
+
+def diff_websites(existing, discovered):
+    existing_keys = {site.lower(): site for site in existing}
+    discovered_keys = {site.lower(): site for site in discovered}
+    return {
+        'added': [site for key, site in discovered_keys.items() if key not in existing_keys],
+        'removed': [site for key, site in existing_keys.items() if key not in discovered_keys],
+        'unchanged': [site for key, site in existing_keys.items() if key in discovered_keys],
+    }
+
+
+def update_counties_list(results, path=DEFAULT_COUNTIES_FILE, dry_run=False):
+    # Merges discovered sites into the counties list. If any vendor failed, sites that were
+    # not rediscovered are kept rather than dropped, since the failure may be transient.
+    existing = []
+    if os.path.exists(path):
+        with open(path, 'r') as f:
+            existing = [entry['website'] for entry in json.load(f)]
+
+    discovered = ["manatee.realforeclose.com"]
+    failed = []
+    # Vendors that answered without a site URL: a valid answer, so they don't count as failed
+    skipped = []
+    for item in results:
+        website = extract_website(item) if 'response' in item else None
+        if website:
+            if website.lower() not in {site.lower() for site in discovered}:
+                discovered.append(website)
+        elif website == '':
+            skipped.append(item['vendor_id'])
+        else:
+            failed.append(item['vendor_id'])
+
+    diff = diff_websites(existing, discovered)
+    logging.info(f"Added: {len(diff['added'])}, removed: {len(diff['removed'])}, unchanged: {len(diff['unchanged'])}")
+    for site in diff['added']:
+        logging.info(f"  + {site}")
+    for site in diff['removed']:
+        logging.info(f"  - {site}")
+
+    websites = list(existing)
+    for site in diff['added']:
+        websites.append(site)
+    if failed:
+        logging.warning(f"{len(failed)} vendors failed ({failed}); keeping {len(diff['removed'])} sites that were not rediscovered")
+    else:
+        removed = {site.lower() for site in diff['removed']}
+        websites = [site for site in websites if site.lower() not in removed]
+    if skipped:
+        logging.info(f"{len(skipped)} vendors have no site URL, skipped: {skipped}")
+    diff['failed_vendors'] = failed
+    diff['skipped_vendors'] = skipped
+
+    if not dry_run:
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump([{"website": site} for site in websites], f, indent=2)
+        os.replace(tmp_path, path)
+        logging.info(f"Saved {len(websites)} websites to {path}")
+    return diff
+
+
 def save_to_json(data):
     counties_websites_list = [
         {
@@ -144,8 +314,18 @@ def save_to_json(data):
     for entry in counties_websites_list[:6]:  # Increased to 6 to show the added entry plus 5 others
         print(f"Website: {entry['website']}")
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Refresh counties_websites_list.json from the vendor switch endpoint")
+    parser.add_argument('--sync', action='store_true', help="Use the original sequential requests and overwrite the list")
+    parser.add_argument('--concurrency', type=int, default=10)
+    parser.add_argument('--no-cache', action='store_true', help="Ignore cached vendor responses")
+    parser.add_argument('--dry-run', action='store_true', help="Only report the diff, don't write the list")
+    args = parser.parse_args()
+
     logging.info("Starting the script...")
-    responses = make_requests_with_proxy()
+    if args.sync:
+        responses = make_requests_with_proxy()
+    else:
+        responses = asyncio.run(make_requests_async(concurrency=args.concurrency, use_cache=not args.no_cache))
     logging.info("\nSummary of results:")
     for response in responses:
         if 'error' in response:
@@ -153,5 +333,8 @@ if __name__ == "__main__":
         else:
             logging.info(f"Vendor ID {response['vendor_id']}: Status {response['status_code']}, Response preview: {response['response'][:100]}...")
     
-    save_to_json(responses)
-    logging.info("Script execution completed.")
\ No newline at end of file
+    if args.sync:
+        save_to_json(responses)
+    else:
+        update_counties_list(responses, dry_run=args.dry_run)
+    logging.info("Script execution completed.")
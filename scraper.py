@@ -9,10 +9,16 @@ import csv
 import requests
 from dotenv import load_dotenv
 import time
+from collections import deque
 
 # Load environment variables
 load_dotenv()
 
+# SCRAPER_FAST=1: no random delays or per-page screenshots, and pages are jumped to directly
+FAST_MODE = os.getenv('SCRAPER_FAST', '0') == '1'
+# Screenshots kept in memory for the failure dump
+DIAGNOSTICS_RING_SIZE = int(os.getenv('DIAGNOSTICS_RING_SIZE', 5))
+
 SPREADSHEET_APPS_SCRIPT_URL = os.getenv('SPREADSHEET_APPS_SCRIPT_URL')
 
 def send_auction_data(auction_date, auction_items):
@@ -198,12 +204,89 @@ def process_and_save_auction_data(all_auction_info, auction_date, json_filename,
 
     print(f"Auction data saved to {json_filename} and {csv_filename}")
 
-async def run_scraper(auction_date=None):
+class DiagnosticsRing:
+    # Keeps the last DIAGNOSTICS_RING_SIZE screenshots and response summaries in memory and
+    # only writes them to screenshots/ when the run fails
+    def __init__(self, name, size=None, fast=False):
+        size = size or DIAGNOSTICS_RING_SIZE
+        self.name = name
+        self.fast = fast
+        self.screenshots = deque(maxlen=size)
+        self.responses = deque(maxlen=size * 10)
+
+    def attach(self, page):
+        page.on('response', self._on_response)
+
+    def _on_response(self, response):
+        request = response.request
+        self.responses.append({
+            'time': datetime.now().isoformat(),
+            'method': request.method,
+            'url': response.url,
+            'status': response.status,
+            'resource_type': request.resource_type,
+            'content_type': response.headers.get('content-type', ''),
+        })
+
+    async def capture(self, page, label):
+        # Fast mode only screenshots at failure time
+        if self.fast:
+            return
+        await self._screenshot(page, label)
+
+    async def _screenshot(self, page, label):
+        try:
+            self.screenshots.append((label, await page.screenshot(type='jpeg', quality=60)))
+        except Exception as e:
+            print(f"Could not capture screenshot {label}: {str(e)}")
+
+    async def fail(self, page, label):
+        await self._screenshot(page, label)
+        return self.dump(label)
+
+    def dump(self, reason):
+        directory = os.path.join('screenshots', f"{self.name}_{datetime.now().strftime('%Y%m%d-%H%M%S')}_{reason}")
+        os.makedirs(directory, exist_ok=True)
+        for index, (label, image) in enumerate(self.screenshots):
+            with open(os.path.join(directory, f"{index:02d}_{label}.jpg"), 'wb') as f:
+                f.write(image)
+        with open(os.path.join(directory, 'responses.json'), 'w') as f:
+            json.dump(list(self.responses), f, indent=2)
+        print(f"Diagnostics saved: {directory}")
+        return directory
+
+
+async def pause(fast, low, high):
+    # The random delays are skipped in fast mode
+    if not fast:
+        await asyncio.sleep(random.uniform(low, high))
+
+
+async def go_to_page(page, page_number, fast):
+    # Fast mode types the page number into the pager box (#curPCA) instead of clicking
+    # PageRight and waiting for the network to go idle
+    if fast:
+        try:
+            await page.fill('#curPCA', str(page_number))
+            await page.press('#curPCA', 'Enter')
+            await page.wait_for_function(f'document.querySelector("#curPCA").getAttribute("curpg") == "{page_number}"', timeout=10000)
+            return
+        except TimeoutError:
+            print(f"Jump to page {page_number} failed, falling back to PageRight")
+    next_page_button = await page.wait_for_selector('#BID_WINDOW_CONTAINER > div.Head_C > div:nth-child(3) > span.PageRight', timeout=5000)
+    await next_page_button.click()
+    if not fast:
+        await page.wait_for_load_state('networkidle')
+    await page.wait_for_function(f'document.querySelector("#curPCA").getAttribute("curpg") == "{page_number}"', timeout=10000)
+
+
+async def run_scraper(auction_date=None, fast=None):
     start_time = time.time()
 
     if auction_date is None:
         auction_date = datetime(2024, 9, 16)
     formatted_date = auction_date.strftime("%m/%d/%Y")
+    fast = FAST_MODE if fast is None else fast
 
     proxy_host = 'shared-datacenter.geonode.com'
     proxy_port = '9008'
@@ -214,6 +297,8 @@ async def run_scraper(auction_date=None):
     os.makedirs('screenshots', exist_ok=True)
     os.makedirs('results', exist_ok=True)
 
+    diagnostics = DiagnosticsRing('manatee', fast=fast)
+
     async with async_playwright() as p:
         browser = await p.chromium.launch(
             headless=True,
@@ -246,91 +331,87 @@ async def run_scraper(auction_date=None):
             )
 
         page = await context.new_page()
+        diagnostics.attach(page)
 
-        url = f'https://manatee.realforeclose.com/index.cfm?zaction=AUCTION&zmethod=PREVIEW&AuctionDate={formatted_date}'
-        
         try:
-            await page.goto(url, wait_until='networkidle', timeout=60000)
-            await asyncio.sleep(random.uniform(2, 5))  # Random delay
-            await page.screenshot(path='screenshots/initial_load.png', full_page=True)
-            print("Screenshot saved: screenshots/initial_load.png")
-
-            # Check for 403 Forbidden
-            page_content = await page.content()
-            if '403 Forbidden' in page_content:
-                print("Error: 403 Forbidden. Access denied.")
-                await page.screenshot(path='screenshots/403_forbidden_error.png', full_page=True)
-                print("Screenshot saved: screenshots/403_forbidden_error.png")
+            url = f'https://manatee.realforeclose.com/index.cfm?zaction=AUCTION&zmethod=PREVIEW&AuctionDate={formatted_date}'
+        
+            try:
+                await page.goto(url, wait_until='domcontentloaded' if fast else 'networkidle', timeout=60000)
+                await pause(fast, 2, 5)  # Random delay
+                await diagnostics.capture(page, 'initial_load')
+
+                # Check for 403 Forbidden
+                page_content = await page.content()
+                if '403 Forbidden' in page_content:
+                    print("Error: 403 Forbidden. Access denied.")
+                    await diagnostics.fail(page, '403_forbidden_error')
+                    await browser.close()
+                    return
+
+            except TimeoutError:
+                print(f"Timeout while loading the page. URL: {url}")
+                await diagnostics.fail(page, 'timeout_error')
                 await browser.close()
                 return
 
-        except TimeoutError:
-            print(f"Timeout while loading the page. URL: {url}")
-            await page.screenshot(path='screenshots/timeout_error.png', full_page=True)
-            print("Screenshot saved: screenshots/timeout_error.png")
-            await browser.close()
-            return
+            all_auction_info = []
+            current_page = 0
 
-        all_auction_info = []
-        current_page = 0
-
-        while True:
-            current_page += 1
+            while True:
+                current_page += 1
             
-            try:
-                await page.wait_for_selector('div.AUCTION_ITEM', timeout=30000)
-                await asyncio.sleep(random.uniform(1, 3))  # Random delay
-                await page.screenshot(path=f'screenshots/page_{current_page}_items_loaded.png', full_page=True)
-                print(f"Screenshot saved: screenshots/page_{current_page}_items_loaded.png")
-            except TimeoutError:
-                print(f"No auction items found on page {current_page}. Ending pagination.")
-                await page.screenshot(path=f'screenshots/page_{current_page}_no_items.png', full_page=True)
-                print(f"Screenshot saved: screenshots/page_{current_page}_no_items.png")
-                break
-
-            area_c_content = await page.inner_html('#Area_C')
-            soup = BeautifulSoup(area_c_content, 'html.parser')
-            auction_items = soup.select('div.AUCTION_ITEM')
-
-            if not auction_items:
-                print(f"No auction items found on page {current_page} after parsing. Ending pagination.")
-                await page.screenshot(path=f'screenshots/page_{current_page}_no_items_after_parsing.png', full_page=True)
-                print(f"Screenshot saved: screenshots/page_{current_page}_no_items_after_parsing.png")
-                break
-
-            for item in auction_items:
-                info = await extract_auction_info(item)
-                if info:  # Only add items sold to 3rd Party Bidder
-                    all_auction_info.append(info)
+                try:
+                    await page.wait_for_selector('div.AUCTION_ITEM', timeout=30000)
+                    await pause(fast, 1, 3)  # Random delay
+                    await diagnostics.capture(page, f'page_{current_page}_items_loaded')
+                except TimeoutError:
+                    print(f"No auction items found on page {current_page}. Ending pagination.")
+                    await diagnostics.fail(page, f'page_{current_page}_no_items')
+                    break
 
-            try:
-                max_page_element = await page.wait_for_selector('#maxCA', timeout=5000)
-                max_page = await max_page_element.inner_text()
-                max_page = int(max_page)
-            except TimeoutError:
-                print("Couldn't find max page number. Ending pagination.")
-                await page.screenshot(path=f'screenshots/page_{current_page}_no_max_page.png', full_page=True)
-                print(f"Screenshot saved: screenshots/page_{current_page}_no_max_page.png")
-                break
+                area_c_content = await page.inner_html('#Area_C')
+                soup = BeautifulSoup(area_c_content, 'html.parser')
+                auction_items = soup.select('div.AUCTION_ITEM')
+
+                if not auction_items:
+                    print(f"No auction items found on page {current_page} after parsing. Ending pagination.")
+                    await diagnostics.fail(page, f'page_{current_page}_no_items_after_parsing')
+                    break
 
-            print(f"Processed page {current_page} of {max_page}")
+                for item in auction_items:
+                    info = await extract_auction_info(item)
+                    if info:  # Only add items sold to 3rd Party Bidder
+                        all_auction_info.append(info)
 
-            if current_page < max_page:
                 try:
-                    next_page_button = await page.wait_for_selector('#BID_WINDOW_CONTAINER > div.Head_C > div:nth-child(3) > span.PageRight', timeout=5000)
-                    await next_page_button.click()
-                    await page.wait_for_load_state('networkidle')
-                    await page.wait_for_function(f'document.querySelector("#curPCA").getAttribute("curpg") == "{current_page + 1}"', timeout=10000)
-                    await asyncio.sleep(random.uniform(2, 4))  # Random delay
-                    await page.screenshot(path=f'screenshots/page_{current_page + 1}_after_navigation.png', full_page=True)
-                    print(f"Screenshot saved: screenshots/page_{current_page + 1}_after_navigation.png")
+                    max_page_element = await page.wait_for_selector('#maxCA', timeout=5000)
+                    max_page = await max_page_element.inner_text()
+                    max_page = int(max_page)
                 except TimeoutError:
-                    print(f"Timeout while navigating to page {current_page + 1}. Ending pagination.")
-                    await page.screenshot(path=f'screenshots/page_{current_page + 1}_navigation_error.png', full_page=True)
-                    print(f"Screenshot saved: screenshots/page_{current_page + 1}_navigation_error.png")
+                    print("Couldn't find max page number. Ending pagination.")
+                    await diagnostics.fail(page, f'page_{current_page}_no_max_page')
+                    break
+
+                print(f"Processed page {current_page} of {max_page}")
+
+                if current_page < max_page:
+                    try:
+                        await go_to_page(page, current_page + 1, fast)
+                        await pause(fast, 2, 4)  # Random delay
+                        await diagnostics.capture(page, f'page_{current_page + 1}_after_navigation')
+                    except TimeoutError:
+                        print(f"Timeout while navigating to page {current_page + 1}. Ending pagination.")
+                        await diagnostics.fail(page, f'page_{current_page + 1}_navigation_error')
+                        break
+                else:
                     break
-            else:
-                break
+        except Exception as e:
+            # The handled timeouts dump above; anything else (a failed fill or press, a closed
+            # page, ...) is dumped here before it propagates
+            print(f"Scraper failed: {type(e).__name__}: {str(e)}")
+            await diagnostics.fail(page, f'unexpected_{type(e).__name__}')
+            raise
 
         for item in all_auction_info:
             item["Auction Date"] = formatted_date
@@ -359,4 +440,5 @@ async def run_scraper(auction_date=None):
     print(f"\nTotal execution time: {execution_time:.2f} seconds")
 
 if __name__ == "__main__":
-    asyncio.run(run_scraper())
\ No newline at end of file
+    import sys
+    asyncio.run(run_scraper(fast=True if '--fast' in sys.argv[1:] else None))
\ No newline at end of file
@@ -0,0 +1,49 @@
+# slots.py
+#
+# Builds per-timezone run slots from the county registry: every county is scraped
+# SLOT_DELAY_MINUTES after its local auction close time instead of all at 18:00 US/Eastern.
+# Counties sharing a timezone and close time run together as one scheduler job.
+
+import os
+from collections import defaultdict
+from datetime import datetime
+
+import pytz
+
+import county_registry
+from scheduler import CronSchedule
+
+# Margin after the close time for the last auctions to settle
+SLOT_DELAY_MINUTES = int(os.getenv('SLOT_DELAY_MINUTES', 30))
+
+
+def slot_time(close_time, delay_minutes=SLOT_DELAY_MINUTES):
+    hour, minute = (int(part) for part in close_time.split(':'))
+    total = hour * 60 + minute + delay_minutes
+    if total >= 24 * 60:
+        raise ValueError(f"Slot for close time {close_time} would run the next day")
+    return total // 60, total % 60
+
+
+def slot_name(timezone, hour, minute):
+    return f"slot-{timezone.split('/')[-1].lower()}-{hour:02d}{minute:02d}"
+
+
+def build_slots(entries=None, delay_minutes=SLOT_DELAY_MINUTES):
+    # Returns [{'name', 'timezone', 'schedule', 'websites'}], earliest (in UTC terms) first
+    entries = county_registry.list_counties() if entries is None else entries
+    groups = defaultdict(list)
+    for entry in entries:
+        hour, minute = slot_time(entry.get('close_time') or county_registry.DEFAULT_CLOSE_TIME, delay_minutes)
+        groups[(entry['timezone'], hour, minute)].append(entry['website'])
+
+    slots = []
+    for (timezone, hour, minute), websites in groups.items():
+        slots.append({
+            'name': slot_name(timezone, hour, minute),
+            'timezone': timezone,
+            'schedule': CronSchedule(f"{minute} {hour} * * *", timezone),
+            'websites': sorted(websites),
+        })
+    now = datetime.now(pytz.utc)
+    return sorted(slots, key=lambda slot: slot['schedule'].next_after(now))
@@ -0,0 +1,75 @@
+import random
+
+from clean_batch import clean_auctions_batch, clean_merged_pages_batch, parse_float_column
+from parsing import clean_auction_page
+
+
+def merged_auction(aid, auction_type='FORECLOSURE', sold_to='3rd Party Bidder', sold='$250,000.00',
+                   judgment='$180,500.25', opening='$100.00', case_number='2023-CA-001234'):
+    return {
+        'id': aid,
+        'status': {'message': 'Auction Sold', 'timestamp': '01/02/2025 11:05 AM ET'},
+        'amount': {'value': sold},
+        'soldTo': {'value': sold_to},
+        'details': {
+            'auctionType': auction_type, 'caseNumber': case_number, 'openingBid': opening,
+            'finalJudgmentAmount': judgment, 'parcelId': f'12-{aid}', 'propertyAddress': '123 MAIN ST',
+            'propertyCity': 'BRADENTON', 'propertyState': 'FL', 'propertyZip': '34205', 'assessedValue': '$95,000',
+        },
+    }
+
+
+def test_regular_rows_match_the_per_row_cleaner():
+    auctions = [
+        merged_auction('1'),
+        merged_auction('2', auction_type='TAXDEED', judgment=''),
+        merged_auction('3', sold_to='Plaintiff'),
+        merged_auction('4', case_number='  2023-CA-9  '),
+        merged_auction('5', sold='', opening=''),
+    ]
+    rows = clean_auctions_batch(auctions, '01/02/2025', 'Manatee')
+    assert rows == clean_auction_page(auctions, '01/02/2025', 'Manatee')
+    assert [row['Excess Amount'] for row in rows] == [69499.75, 249900.0, 69499.75, None]
+    assert rows[2]['Case #'] == '2023-CA-9'
+
+
+def test_malformed_rows_match_the_per_row_cleaner():
+    missing_details = merged_auction('2')
+    del missing_details['details']
+    auctions = [
+        merged_auction('1', sold='Hidden'),
+        missing_details,
+        merged_auction('3', opening=1500),
+        merged_auction('4', case_number=None),
+        merged_auction('5', judgment='$1,000.00.00'),
+        {**merged_auction('6'), 'status': {}},
+        merged_auction('7'),
+    ]
+    rows = clean_auctions_batch(auctions, '01/02/2025', 'Manatee')
+    assert rows == clean_auction_page(auctions, '01/02/2025', 'Manatee')
+    # Rows the per-row cleaner rejects are dropped, the rest keep their order
+    assert [row['Parcel ID'] for row in rows] == ['12-1', '12-5', '12-6', '12-7']
+
+
+def test_random_mix_matches_the_per_row_cleaner():
+    rng = random.Random(7)
+    amounts = ['$1,234.56', '$0.00', '', None, 'Hidden', '$12', '1e3', ' $5 ']
+    auctions = [
+        merged_auction(str(index), auction_type=rng.choice(['FORECLOSURE', 'TAXDEED', '']),
+                       sold_to=rng.choice(['3rd Party Bidder', 'Plaintiff', '']), sold=rng.choice(amounts),
+                       judgment=rng.choice(amounts), opening=rng.choice(amounts))
+        for index in range(500)
+    ]
+    pages = [{'auctions': auctions[:250]}, {'auctions': auctions[250:]}]
+    assert clean_merged_pages_batch(pages, '01/02/2025', 'Manatee') == clean_auction_page(auctions, '01/02/2025', 'Manatee')
+
+
+def test_no_auctions():
+    assert clean_auctions_batch([], '01/02/2025', 'Manatee') == []
+    assert clean_auctions_batch([merged_auction('1', sold_to='Plaintiff')], '01/02/2025', 'Manatee') == []
+
+
+def test_parse_float_column_marks_missing_values():
+    numbers, has_value = parse_float_column(['$1,000.50', '', None, 'Hidden', '-2'])
+    assert has_value.tolist() == [True, False, False, False, True]
+    assert numbers[[0, 4]].tolist() == [1000.5, -2.0]
@@ -0,0 +1,29 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def heavy_modules_loaded(code):
+    # A fresh interpreter, since this one has already imported whatever earlier tests needed
+    result = subprocess.run([sys.executable, '-c', f"import sys\n{code}\n"
+                             "print(','.join(name for name in cli.HEAVY_MODULES if name in sys.modules))"],
+                            capture_output=True, text=True, cwd=HERE, check=True)
+    return [name for name in result.stdout.strip().split(',') if name]
+
+
+def test_importing_cli_loads_no_heavy_modules():
+    assert heavy_modules_loaded('import cli') == []
+
+
+@pytest.mark.parametrize('argv', [['counties'], ['scrape', 'manatee.realforeclose.com'], ['backfill', '2025-01-02'],
+                                  ['compact', '--dry-run'], ['bench', '--imports']])
+def test_parsing_a_subcommand_loads_no_heavy_modules(argv):
+    assert heavy_modules_loaded(f"import cli\ncli.build_parser().parse_args({argv!r})") == []
+
+
+def test_heavy_modules_are_seen_once_imported():
+    assert 'requests' in heavy_modules_loaded('import cli\nimport requests')
@@ -0,0 +1,140 @@
+import os
+import zipfile
+from datetime import date
+
+import pytest
+
+import compaction
+
+TODAY = date(2025, 3, 20)
+
+
+@pytest.fixture
+def dirs(tmp_path, monkeypatch):
+    # compact() also prunes incremental state files, which live outside these directories
+    monkeypatch.setattr(compaction, 'prune_states', lambda before: 0)
+    results_dir = tmp_path / 'results'
+    results_dir.mkdir()
+    return results_dir, tmp_path / 'results' / 'archive'
+
+
+def write(directory, name, text):
+    (directory / name).write_text(text)
+
+
+def compact(dirs, **kwargs):
+    results_dir, archive_dir = dirs
+    return compaction.compact(str(results_dir), str(archive_dir), after_days=7, today=TODAY, **kwargs)
+
+
+def test_parse_daily_file():
+    assert compaction.parse_daily_file('manatee_01-10-2025_final.json') == ('manatee', date(2025, 1, 10), 'final')
+    assert compaction.parse_daily_file('st_lucie_02-05-2025_events.ndjson') == ('st_lucie', date(2025, 2, 5), 'events')
+    assert compaction.parse_daily_file('manatee_13-40-2025.csv') is None
+    assert compaction.parse_daily_file('export_2025-01-02.csv') is None
+
+
+def test_old_files_are_archived_by_month_and_listed(dirs):
+    results_dir, archive_dir = dirs
+    write(results_dir, 'manatee_01-10-2025.csv', 'Case #\n2023-CA-1\n')
+    write(results_dir, 'manatee_01-10-2025_final.json', '{"auctions": []}')
+    write(results_dir, 'bay_02-05-2025_events.ndjson', '{"aid": "1"}\n')
+    write(results_dir, 'manatee_03-18-2025.csv', 'Case #\n')
+    write(results_dir, 'notes.txt', 'keep me')
+
+    stats = compact(dirs, retention_days=0)
+    assert (stats['archived'], stats['expired'], stats['archives']) == (3, 0, 2)
+    assert sorted(os.listdir(results_dir)) == ['archive', 'manatee_03-18-2025.csv', 'notes.txt']
+    assert sorted(os.listdir(archive_dir)) == ['2025-01.zip', '2025-02.zip', 'manifest.json']
+    with zipfile.ZipFile(archive_dir / '2025-01.zip') as archive:
+        assert sorted(archive.namelist()) == ['manatee_01-10-2025.csv', 'manatee_01-10-2025_final.json']
+        assert archive.read('manatee_01-10-2025.csv') == b'Case #\n2023-CA-1\n'
+
+    manifest = compaction.load_manifest(str(archive_dir))
+    assert sorted(manifest) == ['2025-01', '2025-02']
+    entry = manifest['2025-02']['bay_02-05-2025_events.ndjson']
+    assert (entry['county'], entry['date'], entry['kind'], entry['size']) == ('bay', '2025-02-05', 'events', 13)
+
+
+def test_dry_run_changes_nothing(dirs):
+    results_dir, archive_dir = dirs
+    write(results_dir, 'manatee_01-10-2025.csv', 'Case #\n')
+    assert compact(dirs, dry_run=True)['archived'] == 1
+    assert os.listdir(results_dir) == ['manatee_01-10-2025.csv']
+    assert not archive_dir.exists()
+
+
+def test_a_file_archived_again_replaces_its_member(dirs):
+    results_dir, archive_dir = dirs
+    write(results_dir, 'manatee_01-10-2025.csv', 'old\n')
+    write(results_dir, 'bay_01-11-2025.csv', 'bay\n')
+    compact(dirs, retention_days=0)
+    # e.g. a backfill rewrote the day after it was archived
+    write(results_dir, 'manatee_01-10-2025.csv', 'new rows\n')
+    compact(dirs, retention_days=0)
+
+    with zipfile.ZipFile(archive_dir / '2025-01.zip') as archive:
+        assert sorted(archive.namelist()) == ['bay_01-11-2025.csv', 'manatee_01-10-2025.csv']
+        assert archive.read('manatee_01-10-2025.csv') == b'new rows\n'
+        assert archive.read('bay_01-11-2025.csv') == b'bay\n'
+    assert compaction.load_manifest(str(archive_dir))['2025-01']['manatee_01-10-2025.csv']['size'] == 9
+
+
+def test_raw_dumps_past_retention_are_deleted_loose_or_archived(dirs):
+    results_dir, archive_dir = dirs
+    write(results_dir, 'manatee_01-10-2025.csv', 'Case #\n')
+    write(results_dir, 'manatee_01-10-2025_final.json', '{}')
+    compact(dirs, retention_days=0)
+    write(results_dir, 'bay_01-12-2025_final.json', '{}')
+
+    stats = compact(dirs, retention_days=30)
+    assert stats['expired'] == 2
+    assert not os.path.exists(results_dir / 'bay_01-12-2025_final.json')
+    with zipfile.ZipFile(archive_dir / '2025-01.zip') as archive:
+        assert archive.namelist() == ['manatee_01-10-2025.csv']
+    assert list(compaction.load_manifest(str(archive_dir))['2025-01']) == ['manatee_01-10-2025.csv']
+
+
+def test_a_month_left_empty_loses_its_archive(dirs):
+    results_dir, archive_dir = dirs
+    write(results_dir, 'manatee_01-10-2025_final.json', '{}')
+    compact(dirs, retention_days=0)
+    compact(dirs, retention_days=30)
+    assert os.listdir(archive_dir) == ['manifest.json']
+    assert compaction.load_manifest(str(archive_dir)) == {}
+
+
+def test_find_files_and_read_file_cover_archives_and_results(dirs):
+    results_dir, archive_dir = dirs
+    write(results_dir, 'manatee_01-10-2025.csv', 'archived\n')
+    compact(dirs, retention_days=0)
+    write(results_dir, 'manatee_03-18-2025.csv', 'loose\n')
+    write(results_dir, 'bay_03-18-2025.csv', 'bay\n')
+
+    found = compaction.find_files('manatee', results_dir=str(results_dir), archive_dir=str(archive_dir))
+    assert [(entry['name'], entry['archive'] is None) for entry in found] == [
+        ('manatee_01-10-2025.csv', False), ('manatee_03-18-2025.csv', True)]
+    assert [compaction.read_file(entry, str(results_dir)) for entry in found] == [b'archived\n', b'loose\n']
+    by_date = compaction.find_files(auction_date=date(2025, 3, 18), kind='csv', results_dir=str(results_dir),
+                                    archive_dir=str(archive_dir))
+    assert [entry['county'] for entry in by_date] == ['bay', 'manatee']
+
+
+def test_nothing_is_deleted_when_the_archive_cannot_be_written(dirs, monkeypatch):
+    results_dir, archive_dir = dirs
+    write(results_dir, 'manatee_01-10-2025.csv', 'first\n')
+    compact(dirs, retention_days=0)
+    archive_before = (archive_dir / '2025-01.zip').read_bytes()
+    manifest_before = compaction.load_manifest(str(archive_dir))
+    write(results_dir, 'bay_01-11-2025.csv', 'bay\n')
+    write(results_dir, 'bay_01-11-2025_final.json', '{}')
+
+    def write_fails(self, *args, **kwargs):
+        raise OSError('No space left on device')
+
+    monkeypatch.setattr(zipfile.ZipFile, 'write', write_fails)
+    with pytest.raises(OSError):
+        compact(dirs, retention_days=0)
+    assert sorted(os.listdir(results_dir)) == ['archive', 'bay_01-11-2025.csv', 'bay_01-11-2025_final.json']
+    assert (archive_dir / '2025-01.zip').read_bytes() == archive_before
+    assert compaction.load_manifest(str(archive_dir)) == manifest_before
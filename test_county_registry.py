@@ -0,0 +1,96 @@
+import json
+
+import pytest
+
+import county_registry
+
+
+@pytest.fixture
+def registry_file(tmp_path, monkeypatch):
+    counties_file = tmp_path / 'counties_websites_list.json'
+    counties_file.write_text(json.dumps([{'website': 'manatee.realforeclose.com'},
+                                         {'website': 'escambia.realtaxdeed.com'}]))
+    registry_file = tmp_path / 'county_registry.json'
+    registry_file.write_text(json.dumps({
+        'manatee.realforeclose.com': {'timezone': 'America/Chicago', 'runs': 3, 'avg_duration': 100.0},
+    }))
+    monkeypatch.setattr(county_registry, 'REGISTRY_FILE', str(registry_file))
+    monkeypatch.setattr(county_registry, '_registry', None)
+    monkeypatch.setattr(county_registry, '_overrides', {})
+    county_registry.load_registry(str(counties_file), str(registry_file))
+    return registry_file
+
+
+def test_build_entry_derives_site_metadata():
+    escambia = county_registry.build_entry('escambia.realtaxdeed.com')
+    assert (escambia['kind'], escambia['state'], escambia['timezone']) == ('realtaxdeed', 'FL', 'America/Chicago')
+    summit = county_registry.build_entry('summit.realforeclose.com')
+    assert (summit['kind'], summit['state'], summit['timezone']) == ('realforeclose', 'CO', 'America/Denver')
+    assert county_registry.get_county_prefix('https://miamidade.realforeclose.com') == 'miamidade_realforeclose'
+
+
+def test_stored_stats_and_overrides_win_over_derived_values(registry_file):
+    manatee = county_registry.get_county('Manatee.realforeclose.com')
+    assert manatee['timezone'] == 'America/Chicago'
+    assert manatee['runs'] == 3
+    assert county_registry.get_county('escambia.realtaxdeed.com')['runs'] == 0
+
+
+def test_unlisted_site_is_derived_but_not_registered(registry_file):
+    assert county_registry.get_county('summit.realforeclose.com')['state'] == 'CO'
+    assert len(county_registry.list_counties()) == 2
+
+
+def test_success_updates_the_moving_averages(registry_file):
+    record = {'website': 'manatee.realforeclose.com', 'outcome': 'success', 'duration': 200.0,
+              'pages': 10, 'ended_at': 1735830000.0}
+    entry = county_registry.record_county_result(record, save=False)
+    # STATS_ALPHA of the new run, the rest from the stored average
+    assert entry['avg_duration'] == 130.0
+    assert entry['typical_pages'] == 10
+    assert entry['runs'] == 4
+    assert entry['last_success'].startswith('2025-01-02')
+
+
+def test_failure_counts_the_run_only(registry_file):
+    record = {'website': 'manatee.realforeclose.com', 'outcome': 'failed', 'duration': 3.0,
+              'pages': 0, 'ended_at': 1735830000.0}
+    entry = county_registry.record_county_result(record, save=False)
+    assert entry['avg_duration'] == 100.0
+    assert entry['last_success'] is None
+    assert (entry['runs'], entry['last_outcome']) == (4, 'failed')
+
+
+def test_saved_registry_keeps_overrides_and_learned_fields_only(registry_file):
+    record = {'website': 'manatee.realforeclose.com', 'outcome': 'no_data', 'duration': 40.0,
+              'pages': 0, 'ended_at': 1735830000.0}
+    county_registry.record_county_result(record)
+    saved = json.loads(registry_file.read_text())
+    assert saved['manatee.realforeclose.com']['timezone'] == 'America/Chicago'
+    assert saved['manatee.realforeclose.com']['runs'] == 4
+    assert 'prefix' not in saved['manatee.realforeclose.com']
+    # Derived values are not frozen into the file
+    assert 'timezone' not in saved['escambia.realtaxdeed.com']
+
+
+def test_timeout_raises_avg_duration_to_the_deadline(registry_file):
+    record = {'website': 'manatee.realforeclose.com', 'outcome': 'timeout', 'duration': 600.0,
+              'pages': 3, 'ended_at': 1735830000.0}
+    assert county_registry.record_county_result(record, save=False)['avg_duration'] == 600.0
+    # A shorter deadline later doesn't pull the estimate back down
+    record['duration'] = 300.0
+    entry = county_registry.record_county_result(record, save=False)
+    assert entry['avg_duration'] == 600.0
+    assert entry['last_success'] is None
+
+
+def test_typical_pages_ignores_partial_runs(registry_file):
+    website = 'manatee.realforeclose.com'
+    county_registry.record_county_result({'website': website, 'outcome': 'success', 'duration': 100.0,
+                                          'pages': 10, 'ended_at': 1735830000.0}, save=False)
+    entry = county_registry.record_county_result({'website': website, 'outcome': 'timeout', 'duration': 600.0,
+                                                  'pages': 2, 'ended_at': 1735830600.0}, save=False)
+    assert entry['typical_pages'] == 10
+    entry = county_registry.record_county_result({'website': website, 'outcome': 'no_data', 'duration': 20.0,
+                                                  'pages': 0, 'ended_at': 1735831200.0}, save=False)
+    assert entry['typical_pages'] == 10
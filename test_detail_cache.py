@@ -0,0 +1,67 @@
+import time
+
+import pytest
+
+import detail_cache
+
+
+def item_html(case_number='2023-CA-001', parcel_id='12-3456-789', address='123 MAIN ST', aid='1001'):
+    rows = [('Case #:', f'<a href="/index.cfm?zaction=AUCTION&amp;AID={aid}">{case_number}</a>'),
+            ('Parcel ID:', parcel_id), ('Property Address:', address), ('', 'BRADENTON, FL- 34205')]
+    return ''.join(f'<tr><th class="AD_LBL">{label}</th><td class="AD_DTA">{value}</td></tr>' for label, value in rows)
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    return str(tmp_path / 'detail_cache.db')
+
+
+def test_item_key_keys_on_case_and_parcel():
+    case_number, parcel_id, fingerprint = detail_cache.item_key(item_html())
+    assert (case_number, parcel_id) == ('2023-CA-001', '12-3456-789')
+    assert detail_cache.item_key(item_html(parcel_id=''))[1] == ''
+
+
+def test_fingerprint_ignores_the_aid_in_links():
+    # The same case listed on a later auction date gets a new AID
+    assert detail_cache.item_key(item_html(aid='2002')) == detail_cache.item_key(item_html())
+
+
+def test_fingerprint_changes_with_any_detail_row():
+    fingerprint = detail_cache.item_key(item_html())[2]
+    assert detail_cache.item_key(item_html(address='456 OAK AVE'))[2] != fingerprint
+
+
+def test_items_without_a_case_number_are_not_cached():
+    assert detail_cache.item_key(item_html(case_number='')) is None
+    assert detail_cache.item_key('<div class="AUCTION_ITEM"></div>') is None
+
+
+def test_get_many_is_per_county_and_per_fingerprint(db_path):
+    key = detail_cache.item_key(item_html())
+    details = {'Case #': '2023-CA-001', 'Property City': 'BRADENTON', 'Property Zip': '34205'}
+    detail_cache.put_many('manatee.realforeclose.com', [(key, details)], db_path)
+    moved = detail_cache.item_key(item_html(address='456 OAK AVE'))
+    assert detail_cache.get_many('manatee.realforeclose.com', [key, moved], db_path) == {key: details}
+    assert detail_cache.get_many('sarasota.realforeclose.com', [key], db_path) == {}
+
+
+def test_a_changed_item_replaces_its_entry(db_path):
+    old_key = detail_cache.item_key(item_html())
+    new_key = detail_cache.item_key(item_html(address='456 OAK AVE'))
+    detail_cache.put_many('manatee.realforeclose.com', [(old_key, {'Property Address': '123 MAIN ST'})], db_path)
+    detail_cache.put_many('manatee.realforeclose.com', [(new_key, {'Property Address': '456 OAK AVE'})], db_path)
+    assert detail_cache.get_many('manatee.realforeclose.com', [old_key], db_path) == {}
+    assert detail_cache.stats(db_path) == {'entries': 1, 'counties': 1}
+
+
+def test_expired_entries_are_misses_and_pruned(db_path):
+    key = detail_cache.item_key(item_html())
+    detail_cache.put_many('manatee.realforeclose.com', [(key, {'Case #': '2023-CA-001'})], db_path)
+    expired = time.time() - (detail_cache.DETAIL_CACHE_TTL_DAYS + 1) * 86400
+    with detail_cache._connect(db_path) as conn:
+        conn.execute("UPDATE details SET created_at = ?", (expired,))
+    assert detail_cache.get_many('manatee.realforeclose.com', [key], db_path) == {}
+    with detail_cache._connect(db_path) as conn:
+        detail_cache.prune(conn)
+    assert detail_cache.stats(db_path)['entries'] == 0
@@ -0,0 +1,100 @@
+import asyncio
+import csv
+import gzip
+import io
+import json
+import multiprocessing
+import os
+
+import pytest
+
+from export_writer import ExportWriter, encode_csv_rows
+
+FIELDS = ['County', 'Case #', 'Property Address', 'Excess Amount']
+
+
+def export_run(directory, rows, run_id, formats=('csv',), compression='none', abort=False):
+    async def run():
+        writer = ExportWriter('export_2025-01-02', FIELDS, formats=list(formats), compression=compression,
+                              directory=str(directory), run_id=run_id)
+        await writer.add_rows(rows)
+        if abort:
+            await writer.abort()
+        else:
+            await writer.close()
+        return writer.paths
+
+    return asyncio.run(run())
+
+
+def county_rows(county, count=2):
+    return [{'County': county, 'Case #': f'{county}-{index}', 'Property Address': '1 MAIN ST', 'Excess Amount': 10.5 * index}
+            for index in range(count)]
+
+
+def test_csv_quotes_commas_quotes_and_newlines():
+    row = {'County': 'Lee', 'Case #': '2023-CA-1', 'Property Address': '12 "A" ST, UNIT 4\nFORT MYERS',
+           'Excess Amount': None}
+    text = encode_csv_rows([row], FIELDS, header=True)
+    assert list(csv.reader(io.StringIO(text))) == [FIELDS, ['Lee', '2023-CA-1', '12 "A" ST, UNIT 4\nFORT MYERS', '']]
+
+
+def test_runs_append_to_the_night_file_with_one_header(tmp_path):
+    export_run(tmp_path, county_rows('Lee'), 'run1', formats=('csv', 'ndjson'))
+    csv_path, ndjson_path = export_run(tmp_path, county_rows('Bay'), 'run2', formats=('csv', 'ndjson'))
+    with open(csv_path, newline='') as f:
+        records = list(csv.reader(f))
+    assert records[0] == FIELDS
+    assert [record[1] for record in records[1:]] == ['Lee-0', 'Lee-1', 'Bay-0', 'Bay-1']
+    with open(ndjson_path) as f:
+        assert [json.loads(line)['Excess Amount'] for line in f] == [0.0, 10.5, 0.0, 10.5]
+    assert sorted(os.listdir(tmp_path)) == ['export_2025-01-02.csv', 'export_2025-01-02.csv.lock',
+                                            'export_2025-01-02.ndjson', 'export_2025-01-02.ndjson.lock']
+
+
+def test_gzip_members_of_several_runs_read_as_one_file(tmp_path):
+    export_run(tmp_path, county_rows('Lee'), 'run1', compression='gzip')
+    [path] = export_run(tmp_path, county_rows('Bay', 3), 'run2', compression='gzip')
+    assert path.endswith('.csv.gz')
+    with gzip.open(path, 'rt', newline='') as f:
+        records = list(csv.reader(f))
+    assert records[0] == FIELDS
+    assert len(records) == 6
+
+
+def test_zstd_frames_of_several_runs_read_as_one_file(tmp_path):
+    zstandard = pytest.importorskip('zstandard')
+    export_run(tmp_path, county_rows('Lee'), 'run1', compression='zstd')
+    [path] = export_run(tmp_path, county_rows('Bay'), 'run2', compression='zstd')
+    with open(path, 'rb') as f:
+        data = zstandard.ZstdDecompressor().stream_reader(f, read_across_frames=True).read()
+    assert data.decode('utf-8').count('\n') == 5
+
+
+def test_aborted_run_leaves_the_night_file_untouched(tmp_path):
+    [path] = export_run(tmp_path, county_rows('Lee'), 'run1', compression='gzip')
+    with open(path, 'rb') as f:
+        before = f.read()
+    export_run(tmp_path, county_rows('Bay'), 'run2', compression='gzip', abort=True)
+    with open(path, 'rb') as f:
+        assert f.read() == before
+    assert not [name for name in os.listdir(tmp_path) if name.endswith('.part')]
+
+
+def export_runs_in_process(directory, worker, runs):
+    for run in range(runs):
+        export_run(directory, county_rows(f'W{worker}R{run}', 50), f'w{worker}-{run}')
+
+
+def test_runs_in_other_processes_do_not_lose_rows(tmp_path):
+    context = multiprocessing.get_context('spawn')
+    processes = [context.Process(target=export_runs_in_process, args=(str(tmp_path), worker, 40)) for worker in range(4)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join(60)
+        assert process.exitcode == 0
+    with open(tmp_path / 'export_2025-01-02.csv', newline='') as f:
+        records = list(csv.reader(f))
+    assert records.count(FIELDS) == 1
+    assert len(records) == 1 + 4 * 40 * 50
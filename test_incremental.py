@@ -0,0 +1,103 @@
+from datetime import date
+
+import incremental
+from incremental import ScrapeState, is_closed, row_hash
+
+
+def auction(aid, message='Auction Starts 01/02/2025 11:00 AM ET', sold_to=None, opening_bid='$1,000.00'):
+    return {'id': aid, 'status': {'message': message}, 'soldTo': {'value': sold_to},
+            'amount': {'Opening Bid': opening_bid}, 'details': {'Case #': f'2023-CA-{aid}'}}
+
+
+def test_is_closed_on_sale_or_final_status():
+    assert is_closed(auction('1', sold_to='3rd Party Bidder'))
+    assert is_closed(auction('2', message='Canceled per County'))
+    assert is_closed(auction('3', message='REDEEMED'))
+    assert not is_closed(auction('4'))
+    assert not is_closed(auction('5', message=None))
+
+
+def items(*rows):
+    return [(aid, {'Case #': f'2023-CA-{aid}', 'Sold Amount': amount}) for aid, amount in rows]
+
+
+def record(state, rows):
+    state.update_page({'pageInfo': {'total': len(rows)}, 'auctions': [auction(aid) for aid, _ in rows]},
+                      [aid for aid, _ in rows])
+    state.record_rows(items(*rows))
+    return state
+
+
+def recorded_state(tmp_path, rows):
+    return record(ScrapeState('manatee.realforeclose.com', '01/02/2025', str(tmp_path)), rows)
+
+
+def test_row_hash_follows_the_cleaned_row():
+    [(_, row)] = items(('1', 100.0))
+    assert row_hash(dict(reversed(list(row.items())))) == row_hash(row)
+    assert row_hash({**row, 'Sold Amount': 200.0}) != row_hash(row)
+
+
+def test_only_rows_a_sink_has_not_received_are_pending(tmp_path):
+    state = recorded_state(tmp_path, [('1', 100.0), ('2', 100.0)])
+    assert [aid for aid, _ in state.pending(items(('1', 100.0), ('2', 100.0)), 'sheets')] == ['1', '2']
+    state.mark_emitted('sheets', ['1', '2'])
+    state.save()
+
+    rerun = record(ScrapeState('manatee.realforeclose.com', '01/02/2025', str(tmp_path)), [('1', 200.0), ('2', 100.0)])
+    assert [aid for aid, _ in rerun.pending(items(('1', 200.0), ('2', 100.0)), 'sheets')] == ['1']
+
+
+def test_sinks_are_tracked_separately(tmp_path):
+    # e.g. the Sheets post went through, then the export raised and the county is retried
+    state = recorded_state(tmp_path, [('1', 100.0)])
+    state.mark_emitted('sheets', ['1'])
+    state.save()
+    retry = ScrapeState('manatee.realforeclose.com', '01/02/2025', str(tmp_path))
+    assert retry.pending(items(('1', 100.0)), 'sheets') == []
+    assert [aid for aid, _ in retry.pending(items(('1', 100.0)), 'export')] == ['1']
+
+
+def test_unsent_rows_survive_a_restart(tmp_path):
+    recorded_state(tmp_path, [('1', 100.0)]).save()
+    reloaded = ScrapeState('manatee.realforeclose.com', '01/02/2025', str(tmp_path))
+    assert [aid for aid, _ in reloaded.pending(items(('1', 100.0)), 'sheets')] == ['1']
+
+
+def test_rows_of_auctions_missing_from_the_state_are_pending(tmp_path):
+    state = recorded_state(tmp_path, [('1', 100.0)])
+    state.mark_emitted('store', ['1', '9'])
+    assert [aid for aid, _ in state.pending(items(('1', 100.0), ('9', 5.0)), 'store')] == ['9']
+
+
+def test_final_auctions_are_filled_in_from_state_in_page_order(tmp_path):
+    state = ScrapeState('manatee.realforeclose.com', '01/02/2025', str(tmp_path))
+    state.update_page({'pageInfo': {'total': 3}, 'auctions': [auction('1', sold_to='3rd Party Bidder'), auction('2'),
+                                                              auction('3', message='Canceled')]}, ['1', '2', '3'])
+    state.save()
+
+    rerun = ScrapeState('manatee.realforeclose.com', '01/02/2025', str(tmp_path))
+    assert rerun.final_aids() == {'1', '3'}
+    page = rerun.update_page({'pageInfo': {}, 'auctions': [auction('2')]}, ['1', '2', '3'])
+    assert [item['id'] for item in page['auctions']] == ['1', '2', '3']
+    assert rerun.reused == 2
+    assert rerun.page_info == {'total': 3}
+
+
+def test_no_final_aids_without_page_info(tmp_path):
+    state = ScrapeState('manatee.realforeclose.com', '01/02/2025', str(tmp_path))
+    state.update_page({'pageInfo': {}, 'auctions': [auction('1', sold_to='Plaintiff')]}, ['1'])
+    assert state.final_aids() == set()
+
+
+def test_damaged_state_file_means_a_full_scrape(tmp_path):
+    (tmp_path / 'manatee_realforeclose_01-02-2025.json').write_text('{"auctions": ')
+    state = ScrapeState('manatee.realforeclose.com', '01/02/2025', str(tmp_path))
+    assert (state.auctions, state.page_info) == ({}, None)
+
+
+def test_prune_states_removes_older_dates_only(tmp_path):
+    for name in ('manatee_realforeclose_01-02-2025.json', 'manatee_realforeclose_03-04-2025.json', 'notes.txt'):
+        (tmp_path / name).write_text('{}')
+    assert incremental.prune_states(date(2025, 2, 1), str(tmp_path)) == 1
+    assert sorted(path.name for path in tmp_path.iterdir()) == ['manatee_realforeclose_03-04-2025.json', 'notes.txt']
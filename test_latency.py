@@ -0,0 +1,123 @@
+import asyncio
+import bisect
+
+import pytest
+
+import latency
+from latency import BUCKETS, LatencyHistogram
+
+
+@pytest.fixture(autouse=True)
+def fresh_histograms(monkeypatch):
+    monkeypatch.setattr(latency, '_histograms', {})
+
+
+def warmed(key, seconds=0.01, samples=latency.MIN_SAMPLES):
+    # p95 of a histogram of fast answers is the first bucket, 50 ms
+    histogram = latency.get_histogram(key)
+    for _ in range(samples):
+        histogram.observe(seconds)
+    return histogram
+
+
+def answer(value, delay, calls=None):
+    async def request():
+        if calls is not None:
+            calls.append(value)
+        await asyncio.sleep(delay)
+        return value
+    return request
+
+
+def test_percentiles_need_enough_samples():
+    histogram = LatencyHistogram()
+    for _ in range(latency.MIN_SAMPLES - 1):
+        histogram.observe(1.0)
+    assert histogram.percentile(0.5) is None
+    histogram.observe(1.0)
+    assert histogram.percentile(0.5) == BUCKETS[bisect.bisect_left(BUCKETS, 1.0)]
+
+
+def test_timeout_follows_p99_between_the_floor_and_the_default():
+    assert LatencyHistogram().timeout(30) == 30
+    assert warmed('fast').timeout(30) == latency.MIN_TIMEOUT
+    assert warmed('slow', seconds=120).timeout(30) == 30
+    expected = BUCKETS[bisect.bisect_left(BUCKETS, 2.5)] * latency.LATENCY_TIMEOUT_FACTOR
+    assert warmed('normal', seconds=2.5).timeout(30) == pytest.approx(expected)
+
+
+def test_retry_delay_scales_with_p50():
+    assert [LatencyHistogram().retry_delay(attempt) for attempt in range(3)] == [1.0, 2.0, 4.0]
+    # Fast endpoints still wait half a second, and no endpoint waits more than 30
+    assert warmed('fast').retry_delay(0) == 0.5
+    assert warmed('slow', seconds=20).retry_delay(3) == 30
+
+
+def test_hedge_wins_over_a_slow_primary():
+    histogram = warmed('page')
+    aborted = []
+
+    async def abort():
+        aborted.append(True)
+
+    result = asyncio.run(latency.hedged('page', answer('primary', 5), answer('hedge', 0), abort_primary=abort))
+    assert result == 'hedge'
+    assert (histogram.hedges, histogram.hedge_wins, aborted) == (1, 1, [True])
+    assert histogram.samples == latency.MIN_SAMPLES + 1
+
+
+def test_primary_wins_when_it_answers_before_the_hedge():
+    histogram = warmed('page')
+    aborted = []
+
+    async def abort():
+        aborted.append(True)
+
+    result = asyncio.run(latency.hedged('page', answer('primary', 0.1), answer('hedge', 5), abort_primary=abort))
+    assert result == 'primary'
+    assert (histogram.hedges, histogram.hedge_wins, aborted) == (1, 0, [])
+
+
+def test_no_hedge_without_a_p95_or_for_fast_answers():
+    calls = []
+    assert asyncio.run(latency.hedged('new', answer('primary', 0.1), answer('hedge', 0, calls))) == 'primary'
+    warmed('page')
+    assert asyncio.run(latency.hedged('page', answer('primary', 0), answer('hedge', 0, calls))) == 'primary'
+    assert calls == []
+
+
+def test_hedges_stop_when_the_budget_runs_out():
+    histogram = warmed('page')
+    calls = []
+
+    async def run():
+        return [await latency.hedged('page', answer('primary', 0.1), answer('hedge', 0, calls)) for _ in range(3)]
+
+    # One token to start with; each request only earns HEDGE_BUDGET more
+    assert asyncio.run(run()) == ['hedge', 'primary', 'primary']
+    assert (len(calls), histogram.hedges, histogram.requests) == (1, 1, 3)
+    assert histogram.hedge_tokens < 1
+
+
+def test_a_failed_hedge_leaves_the_primary_answer():
+    warmed('page')
+
+    async def failing():
+        raise ConnectionError('reset')
+
+    assert asyncio.run(latency.hedged('page', answer('primary', 0.1), failing)) == 'primary'
+
+
+def test_both_failing_raises_the_primarys_error():
+    histogram = warmed('page')
+
+    async def primary():
+        await asyncio.sleep(0.1)
+        raise TimeoutError('primary')
+
+    async def backup():
+        raise ConnectionError('hedge')
+
+    with pytest.raises(TimeoutError):
+        asyncio.run(latency.hedged('page', primary, backup))
+    assert histogram.samples == latency.MIN_SAMPLES + 1
@@ -0,0 +1,58 @@
+import asyncio
+import os
+import threading
+
+import parse_cache
+from parse_cache import ParseCache, payload_key
+from parsing import parse_auction_payload, parse_page_payload
+
+
+def test_payload_key_depends_on_the_body_and_the_parser():
+    assert payload_key(parse_auction_payload, '{"a": 1}') == payload_key(parse_auction_payload, b'{"a": 1}')
+    assert payload_key(parse_auction_payload, '{"a": 1}') != payload_key(parse_page_payload, '{"a": 1}')
+
+
+def test_disk_tier_is_opt_in():
+    assert ParseCache().directory == parse_cache.PARSE_CACHE_DIR == ''
+
+    async def run():
+        cache = ParseCache(max_entries=2)
+        await cache.put('a', {'rlist': ['1']})
+        await cache.put('b', {})
+        await cache.put('c', {})
+        return await cache.get('a'), await cache.get('c'), cache.stats()
+
+    evicted, kept, stats = asyncio.run(run())
+    assert (evicted, kept) == (None, {})
+    assert (stats['memory_hits'], stats['misses'], stats['entries']) == (1, 1, 2)
+
+
+def test_disk_tier_survives_a_restart_and_stays_off_the_loop_thread(tmp_path, monkeypatch):
+    disk_threads = []
+    load = ParseCache._load
+
+    def recording_load(self, key):
+        disk_threads.append(threading.get_ident())
+        return load(self, key)
+
+    monkeypatch.setattr(ParseCache, '_load', recording_load)
+
+    async def run():
+        await ParseCache(directory=str(tmp_path)).put('ab12', {'auctions': {'1': {}}})
+        restarted = ParseCache(directory=str(tmp_path))
+        return await restarted.get('ab12'), await restarted.get('ab12'), restarted.stats(), threading.get_ident()
+
+    value, again, stats, loop_thread = asyncio.run(run())
+    assert value == again == {'auctions': {'1': {}}}
+    assert (stats['disk_hits'], stats['memory_hits']) == (1, 1)
+    assert os.path.exists(tmp_path / 'ab' / 'ab12.json')
+    assert disk_threads and loop_thread not in disk_threads
+
+
+def test_prune_disk_keeps_the_newest_files(tmp_path):
+    cache = ParseCache(directory=str(tmp_path), disk_max=2)
+    for index, key in enumerate(['aa01', 'aa02', 'bb03']):
+        cache._store(key, {})
+        os.utime(cache._disk_path(key), (1000 + index, 1000 + index))
+    cache.prune_disk()
+    assert sorted(os.listdir(tmp_path / 'aa')) + os.listdir(tmp_path / 'bb') == ['aa02.json', 'bb03.json']
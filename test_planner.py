@@ -0,0 +1,63 @@
+import asyncio
+
+import county_registry
+import planner
+
+
+def test_estimate_durations_falls_back_to_the_median(monkeypatch):
+    learned = {'a.realforeclose.com': 100.0, 'b.realforeclose.com': 300.0, 'c.realforeclose.com': 200.0}
+    monkeypatch.setattr(county_registry, 'get_county', lambda website: {'avg_duration': learned.get(website)})
+    durations = planner.estimate_durations([*learned, 'new.realforeclose.com'])
+    assert durations['new.realforeclose.com'] == 200.0
+    assert durations['b.realforeclose.com'] == 300.0
+
+
+def test_estimate_durations_without_history(monkeypatch):
+    monkeypatch.setattr(county_registry, 'get_county', lambda website: {'avg_duration': None})
+    assert planner.estimate_durations(['a.realforeclose.com']) == {'a.realforeclose.com': planner.DEFAULT_DURATION}
+
+
+def test_plan_lpt_packs_longest_first():
+    plan = planner.plan_lpt({'a': 10, 'b': 30, 'c': 20, 'd': 20}, workers=2)
+    # Equal durations are ordered by website so plans are reproducible
+    assert plan['order'] == ['b', 'c', 'd', 'a']
+    assert plan['assignments'] == {0: ['b', 'a'], 1: ['c', 'd']}
+    assert plan['predicted_makespan'] == 40
+
+
+def test_plan_lpt_beats_the_listed_order():
+    # In the listed order c would start after a and end at 16
+    plan = planner.plan_lpt({'a': 6, 'b': 6, 'c': 10, 'd': 4}, workers=2)
+    assert plan['predicted_makespan'] == 14
+    assert sorted(map(sorted, plan['assignments'].values())) == [['a', 'b'], ['c', 'd']]
+
+
+def test_plan_lpt_single_worker_is_the_total():
+    plan = planner.plan_lpt({'a': 10, 'b': 5}, workers=0)
+    assert plan['workers'] == 1
+    assert plan['predicted_makespan'] == 15
+
+
+def test_run_plan_starts_counties_in_plan_order_under_the_limit():
+    plan = planner.plan_lpt({'a': 10, 'b': 30, 'c': 20, 'd': 20, 'e': 5}, workers=2)
+    started = []
+    running = []
+
+    async def run_county(website):
+        started.append(website)
+        running.append(website)
+        assert len(running) <= 2
+        await asyncio.sleep(0.01)
+        running.remove(website)
+
+    makespan = asyncio.run(planner.run_plan(plan, run_county))
+    assert started == plan['order']
+    assert makespan >= 0.03
+
+
+def test_plan_lpt_runs_unhealthy_websites_last():
+    plan = planner.plan_lpt({'a': 10, 'b': 30, 'c': 20}, workers=2, last={'b'})
+    assert plan['order'] == ['c', 'a', 'b']
+    # b still goes to the worker that frees up first
+    assert plan['assignments'] == {0: ['c'], 1: ['a', 'b']}
+    assert plan['predicted_makespan'] == 40
@@ -0,0 +1,132 @@
+import asyncio
+import time
+
+import planner
+import resource_watchdog
+from resource_watchdog import AdaptiveLimiter, Watchdog
+
+
+def resource_sample(memory_mb=100, cpu=10.0, browsers=()):
+    return {'sampled_at': 0.0, 'python_rss': memory_mb * 2 ** 20, 'browser_rss': 0, 'other_rss': 0,
+            'total_rss': memory_mb * 2 ** 20, 'process_cpu_percent': cpu, 'system_cpu_percent': cpu,
+            'system_memory_percent': 10.0, 'browsers': list(browsers)}
+
+
+def test_limiter_halves_and_adds_one_within_bounds():
+    async def steps():
+        limiter = AdaptiveLimiter(5, maximum=6)
+        assert await limiter.decrease() and limiter.limit == 2
+        assert await limiter.decrease() and limiter.limit == 1
+        assert not await limiter.decrease()
+        for _ in range(10):
+            await limiter.increase()
+        return limiter.limit
+
+    assert asyncio.run(steps()) == 6
+
+
+def test_shrinking_the_limit_lets_running_holders_finish():
+    async def run():
+        limiter = AdaptiveLimiter(4)
+        inside = []
+        seen = []
+
+        async def county():
+            async with limiter:
+                inside.append(1)
+                seen.append((len(inside), limiter.limit))
+                await asyncio.sleep(0.01)
+                inside.pop()
+
+        counties = [asyncio.create_task(county()) for _ in range(12)]
+        await asyncio.sleep(0.005)
+        await limiter.set_limit(2)
+        await asyncio.gather(*counties)
+        return seen, limiter.active
+
+    seen, active = asyncio.run(run())
+    assert active == 0
+    # The first four were already in; everything after waited for the lower limit
+    assert [count for count, _ in seen[:4]] == [1, 2, 3, 4]
+    assert all(count <= 2 for count, _ in seen[4:])
+
+
+def test_raising_the_limit_wakes_a_waiting_county():
+    async def run():
+        limiter = AdaptiveLimiter(1, maximum=2)
+        release = asyncio.Event()
+
+        async def holder():
+            async with limiter:
+                await release.wait()
+
+        held = asyncio.create_task(holder())
+        await asyncio.sleep(0)
+        waiting = asyncio.create_task(limiter.__aenter__())
+        await asyncio.sleep(0.01)
+        blocked = not waiting.done()
+        await limiter.increase()
+        await asyncio.wait_for(waiting, timeout=1)
+        release.set()
+        await held
+        return blocked, limiter.active
+
+    assert asyncio.run(run()) == (True, 1)
+
+
+def test_watchdog_aimd_steps(monkeypatch):
+    monkeypatch.setattr(resource_watchdog, 'MEMORY_CEILING_MB', 1000)
+    monkeypatch.setattr(resource_watchdog, 'CPU_CEILING_PERCENT', 80)
+    monkeypatch.setattr(resource_watchdog, 'DECREASE_COOLDOWN', 60)
+
+    async def run():
+        limiter = AdaptiveLimiter(4, maximum=8)
+        watchdog = Watchdog(limiter)
+        watchdog._last_decrease = time.monotonic() - 60
+        limits = []
+        for sample in (resource_sample(memory_mb=1200), resource_sample(cpu=95.0),
+                       resource_sample(memory_mb=900), resource_sample(memory_mb=100)):
+            await watchdog.check(sample)
+            limits.append(limiter.limit)
+        return limits, watchdog.decreases, watchdog.increases
+
+    # Over the ceiling: halved once, then the cooldown holds it; between headroom and the
+    # ceiling: unchanged; well below: one more
+    assert asyncio.run(run()) == ([2, 2, 2, 3], 1, 1)
+
+
+def test_watchdog_recycles_only_the_pools_current_browser(monkeypatch):
+    monkeypatch.setattr(resource_watchdog, 'BROWSER_MEMORY_CAP_MB', 500)
+
+    class Pool:
+        launched_at = 1000.0
+        recycled = 0
+
+        async def recycle(self):
+            self.recycled += 1
+            return True
+
+    pool = Pool()
+    watchdog = Watchdog(browser_pool=pool)
+    draining = {'pid': 1, 'rss': 900 * 2 ** 20, 'processes': 4, 'started_at': 500.0}
+    small = {'pid': 2, 'rss': 100 * 2 ** 20, 'processes': 2, 'started_at': 1000.5}
+    asyncio.run(watchdog.check(resource_sample(browsers=[draining, small])))
+    assert pool.recycled == 0
+    current = {**small, 'rss': 800 * 2 ** 20}
+    asyncio.run(watchdog.check(resource_sample(browsers=[draining, current])))
+    assert (pool.recycled, watchdog.recycles) == (1, 1)
+
+
+def test_the_default_limit_has_room_to_grow(monkeypatch):
+    monkeypatch.setattr(resource_watchdog, 'MEMORY_CEILING_MB', 1000)
+    monkeypatch.setattr(resource_watchdog, 'CPU_CEILING_PERCENT', 80)
+
+    async def run():
+        limiter = AdaptiveLimiter(planner.SCRAPE_CONCURRENCY, maximum=planner.SCRAPE_CONCURRENCY_MAX)
+        watchdog = Watchdog(limiter)
+        for _ in range(10):
+            await watchdog.check(resource_sample())
+        return limiter.limit
+
+    assert planner.SCRAPE_CONCURRENCY_MAX > planner.SCRAPE_CONCURRENCY
+    assert asyncio.run(run()) == planner.SCRAPE_CONCURRENCY_MAX
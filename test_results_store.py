@@ -0,0 +1,79 @@
+import pytest
+
+import results_store
+
+
+def auction_row(case_number, excess, auction_type='FORECLOSURE', auction_date='01/02/2025'):
+    return {'Auction Date': auction_date, 'County': 'Manatee', 'Auction Type': auction_type,
+            'Excess Amount': excess, 'Case #': case_number, 'Parcel ID': ''}
+
+
+def day_rollups(db_path):
+    return {(row['Period'], row['Auction Type']): (row['Auctions'], row['Excess Count'], row['Excess Total'])
+            for row in results_store.query_rollups('day', db_path=db_path)}
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    return str(tmp_path / 'results.db')
+
+
+def test_rollups_count_auctions_and_excess_separately(db_path):
+    results_store.store_county_results('manatee.realforeclose.com', [
+        auction_row('C1', 100.0), auction_row('C2', None), auction_row('C3', 50.5, 'TAXDEED'),
+    ], db_path)
+    assert day_rollups(db_path) == {
+        ('2025-01-02', 'FORECLOSURE'): (2, 1, 100.0),
+        ('2025-01-02', 'TAXDEED'): (1, 1, 50.5),
+    }
+
+
+def test_rescraping_a_county_replaces_its_contribution(db_path):
+    results_store.store_county_results('manatee.realforeclose.com', [auction_row('C1', 100.0), auction_row('C2', None)], db_path)
+    results_store.store_county_results('manatee.realforeclose.com', [auction_row('C1', 80.0), auction_row('C2', 20.0)], db_path)
+    assert day_rollups(db_path) == {('2025-01-02', 'FORECLOSURE'): (2, 2, 100.0)}
+
+
+def test_auction_type_change_moves_the_row_between_rollups(db_path):
+    results_store.store_county_results('manatee.realforeclose.com', [auction_row('C1', 100.0), auction_row('C2', 5.0)], db_path)
+    results_store.store_county_results('manatee.realforeclose.com', [auction_row('C1', 100.0, 'TAXDEED')], db_path)
+    assert day_rollups(db_path) == {
+        ('2025-01-02', 'FORECLOSURE'): (1, 1, 5.0),
+        ('2025-01-02', 'TAXDEED'): (1, 1, 100.0),
+    }
+
+
+def test_emptied_rollup_rows_are_removed(db_path):
+    results_store.store_county_results('manatee.realforeclose.com', [auction_row('C1', 100.0)], db_path)
+    results_store.store_county_results('manatee.realforeclose.com', [auction_row('C1', 100.0, 'TAXDEED')], db_path)
+    with results_store._connect(db_path) as conn:
+        assert conn.execute("SELECT COUNT(*) FROM rollups WHERE auction_type = 'FORECLOSURE'").fetchone()[0] == 0
+
+
+def test_month_and_year_periods_sum_the_day_rows(db_path):
+    results_store.store_county_results('manatee.realforeclose.com', [
+        auction_row('C1', 10.0, auction_date='01/02/2025'),
+        auction_row('C2', 20.0, auction_date='01/15/2025'),
+        auction_row('C3', 30.0, auction_date='02/03/2025'),
+    ], db_path)
+    months = results_store.query_rollups('month', db_path=db_path)
+    assert [(row['Period'], row['Auctions'], row['Excess Total']) for row in months] == [('2025-02', 1, 30.0), ('2025-01', 2, 30.0)]
+    assert results_store.query_rollups('year', date_from='2025-01-10', db_path=db_path)[0]['Excess Total'] == 50.0
+    with pytest.raises(ValueError):
+        results_store.query_rollups('week', db_path=db_path)
+
+
+def test_rebuild_gives_the_trigger_totals(db_path):
+    results_store.store_county_results('manatee.realforeclose.com', [auction_row('C1', 100.0), auction_row('C2', None)], db_path)
+    results_store.store_county_results('manatee.realforeclose.com', [auction_row('C1', 60.0, 'TAXDEED')], db_path)
+    incremental = day_rollups(db_path)
+    with results_store._connect(db_path) as conn:
+        conn.execute("DELETE FROM rollups")
+        results_store.rebuild_rollups(conn)
+    assert day_rollups(db_path) == incremental
+
+
+def test_rows_without_case_or_parcel_are_not_stored(db_path):
+    rows = [auction_row('', 10.0), auction_row(None, 20.0), {**auction_row('', 30.0), 'Parcel ID': 'P1'}]
+    assert results_store.store_county_results('manatee.realforeclose.com', rows, db_path) == 1
+    assert day_rollups(db_path) == {('2025-01-02', 'FORECLOSURE'): (1, 1, 30.0)}
@@ -0,0 +1,75 @@
+from datetime import datetime
+
+import pytest
+import pytz
+
+import log_viewer
+from scheduler import CronSchedule, Scheduler, parse_cron_field
+
+EASTERN = pytz.timezone('US/Eastern')
+
+
+def test_parse_cron_field_forms():
+    assert parse_cron_field('*', 0, 6) == [0, 1, 2, 3, 4, 5, 6]
+    assert parse_cron_field('5', 0, 59) == [5]
+    assert parse_cron_field('1-5', 0, 6) == [1, 2, 3, 4, 5]
+    assert parse_cron_field('*/15', 0, 59) == [0, 15, 30, 45]
+    assert parse_cron_field('10-20/5', 0, 59) == [10, 15, 20]
+    assert parse_cron_field('0,30,15', 0, 59) == [0, 15, 30]
+
+
+def test_start_with_step_runs_to_the_end_of_the_range():
+    assert parse_cron_field('5/1', 0, 9) == [5, 6, 7, 8, 9]
+    assert parse_cron_field('20/2', 0, 23) == [20, 22]
+
+
+@pytest.mark.parametrize('field, low, high', [('60', 0, 59), ('5-2', 0, 59), ('*/0', 0, 59), ('0-24', 0, 23),
+                                             ('0', 1, 31), ('x', 0, 59)])
+def test_invalid_cron_fields(field, low, high):
+    with pytest.raises(ValueError):
+        parse_cron_field(field, low, high)
+
+
+def test_cron_expression_needs_five_fields():
+    with pytest.raises(ValueError):
+        CronSchedule('30 15 * *')
+
+
+def test_next_after_is_strictly_later_in_the_schedule_timezone():
+    schedule = CronSchedule('30 15 * * 1-5', 'US/Eastern')
+    friday = EASTERN.localize(datetime(2025, 1, 3, 15, 30))
+    assert schedule.next_after(friday) == EASTERN.localize(datetime(2025, 1, 6, 15, 30))
+    assert schedule.next_after(friday.astimezone(pytz.utc)).utcoffset() == friday.utcoffset()
+
+
+def test_restricted_day_and_weekday_match_either():
+    # The 1st of the month or any Sunday
+    schedule = CronSchedule('0 0 1 * 0', 'US/Eastern')
+    start = EASTERN.localize(datetime(2025, 1, 1, 12, 0))
+    assert schedule.next_after(start) == EASTERN.localize(datetime(2025, 1, 5, 0, 0))
+
+
+def test_impossible_date_has_no_next_run():
+    assert CronSchedule('0 0 31 2 *').next_after(datetime(2025, 1, 1, tzinfo=pytz.utc)) is None
+
+
+def test_trigger_threadsafe_before_run_is_refused():
+    async def job():
+        pass
+
+    scheduler = Scheduler()
+    scheduler.add_job('nightly', job)
+    with pytest.raises(RuntimeError):
+        scheduler.trigger_threadsafe('nightly')
+
+
+def test_trigger_endpoint_answers_503_until_the_scheduler_runs(monkeypatch):
+    async def job():
+        pass
+
+    scheduler = Scheduler()
+    scheduler.add_job('nightly', job)
+    monkeypatch.setitem(log_viewer.app.config, 'SCHEDULER', scheduler)
+    monkeypatch.setattr(log_viewer, 'JOBS_API_TOKEN', '')
+    response = log_viewer.app.test_client().post('/api/jobs/nightly/trigger')
+    assert response.status_code == 503